@@ -0,0 +1,84 @@
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from config import ACTION_WORKERS, ACTION_QUEUE_MAX
+
+
+class ActionQueue:
+    """
+    Runs the work behind Slack button clicks (DB writes, chat.update,
+    notifications) off Bolt's listener threads, so handlers can ack() in
+    milliseconds.
+
+    A bounded queue drained by `workers` daemon threads. Jobs carry a key;
+    a job whose key is already queued or running is dropped, which absorbs
+    double clicks. submit() returns False when the queue is full so the
+    caller can tell the user instead of silently losing the click.
+    """
+
+    def __init__(self, workers=4, max_queued=500):
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._metrics = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "deduplicated": 0}
+        self._waits = deque(maxlen=200)
+        self._runs = deque(maxlen=200)
+
+    def _ensure_started(self):
+        if not self._threads:
+            with self._lock:
+                if not self._threads:
+                    for i in range(self.workers):
+                        thread = threading.Thread(target=self._work_loop, daemon=True, name=f"slack-action-{i}")
+                        thread.start()
+                        self._threads.append(thread)
+
+    def submit(self, key, fn, *args):
+        """Queues fn(*args) unless `key` is already in flight; False if the queue is full."""
+        self._ensure_started()
+        with self._lock:
+            if key in self._pending:
+                self._metrics["deduplicated"] += 1
+                return True
+            try:
+                self._queue.put_nowait((key, fn, args, time.monotonic()))
+            except queue.Full:
+                self._metrics["rejected"] += 1
+                return False
+            self._pending.add(key)
+            self._metrics["submitted"] += 1
+        return True
+
+    def _work_loop(self):
+        while True:
+            key, fn, args, queued_at = self._queue.get()
+            started = time.monotonic()
+            failed = False
+            try:
+                fn(*args)
+            except Exception:
+                failed = True
+                logging.exception(f"Slack action {key} failed")
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+                    self._metrics["failed" if failed else "completed"] += 1
+                    self._waits.append(started - queued_at)
+                    self._runs.append(time.monotonic() - started)
+
+    def metrics(self):
+        with self._lock:
+            m = dict(self._metrics)
+            waits, runs = sorted(self._waits), sorted(self._runs)
+        m["queued"] = self._queue.qsize()
+        for name, samples in (("wait", waits), ("run", runs)):
+            m[f"{name}_p50_ms"] = round(samples[len(samples) // 2] * 1000, 1) if samples else None
+            m[f"{name}_p95_ms"] = round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 1) if samples else None
+        return m
+
+
+action_queue = ActionQueue(workers=ACTION_WORKERS, max_queued=ACTION_QUEUE_MAX)
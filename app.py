@@ -1,8 +1,11 @@
 import threading
 from slack_bolt.adapter.socket_mode import SocketModeHandler
 from config import flask_app, socketio, slack_app, SLACK_APP_TOKEN, PUBLIC_HOST, FLASK_PORT
-from database import init_db
-from helpers import reminder_loop
+from database import init_db, store
+from helpers import reminder_loop, archive_loop, recurrence_loop, escalation_loop
+from task_cache import invalidation_listener
+from membership import membership_refresh_loop
+from config import TASK_CACHE_NOTIFY
 import slack_handlers
 import web_routes # Triggers route registration
 
@@ -21,6 +24,23 @@ if __name__ == "__main__":
     
     # Start Reminder Background Thread
     threading.Thread(target=reminder_loop, daemon=True).start()
+
+    # Start Due-Time Escalation Thread
+    threading.Thread(target=escalation_loop, daemon=True).start()
+
+    # Start Recurring Task Scheduler Thread
+    threading.Thread(target=recurrence_loop, daemon=True).start()
+
+    # Start User-Group / Channel Membership Refresh Thread
+    threading.Thread(target=membership_refresh_loop, daemon=True).start()
+
+    # Start Archival Background Thread
+    if store.supports("archive"):
+        threading.Thread(target=archive_loop, daemon=True).start()
+
+    # Start Cross-Process Cache Invalidation Listener
+    if TASK_CACHE_NOTIFY:
+        threading.Thread(target=invalidation_listener, daemon=True).start()
     
     print(f"⚡ Running Slack Bot with Dashboard at {PUBLIC_HOST}")
     
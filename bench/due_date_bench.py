@@ -0,0 +1,257 @@
+"""
+Accuracy and latency benchmark for due-date extraction.
+
+Runs an extractor over the labelled corpus (due_date_corpus.jsonl), each
+case at its own pinned "now", timezone and working hours, and reports how
+many deadlines come out right, p50/p99 latency per case and throughput.
+The deadline is scored end to end on the datetime the extractor returns,
+which /addtask stores as is, so losing the year counts.
+
+Extractors:
+  local     the no-LLM path (due_date_parser.local_due_date)
+  recorded  replays LLM replies saved by `--extractor llm --record FILE`
+            through resolve_due_date, so a prompt change can be re-graded
+            without calling the LLM again
+  llm       the live batch prompt through helpers.llm_router, one case per
+            request (needs the API keys and every dependency of helpers.py)
+
+With --min-accuracy / --min-category-accuracy / --max-p99-ms it exits
+non-zero when the run is worse, so it can gate changes to the prompt or the
+parser. The local extractor is deterministic, so it is gated by default
+(LOCAL_GATES): a category that regresses fails the run even when the
+overall figure still looks fine.
+
+  python bench/due_date_bench.py
+  python bench/due_date_bench.py --category sloppy_time --failures 20
+  python bench/due_date_bench.py --extractor llm --limit 300 --workers 8 --record bench/llm_replies.jsonl
+  python bench/due_date_bench.py --extractor recorded --replies bench/llm_replies.jsonl
+  python bench/due_date_bench.py --min-accuracy 0.95 --max-p99-ms 2 --json bench_output.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import pytz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from due_date_parser import resolve_due_date, local_due_date  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "due_date_corpus.jsonl")
+
+# Default --min-accuracy / --min-category-accuracy for --extractor local
+LOCAL_GATES = {"min_accuracy": 0.99, "min_category_accuracy": 0.97}
+
+
+def load_corpus(path, categories=None, limit=None):
+    cases = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            case = json.loads(line)
+            if categories and case["category"] not in categories:
+                continue
+            tz = pytz.timezone(case["tz"])
+            case["now_dt"] = datetime.fromisoformat(case["now"]).astimezone(tz)
+            cases.append(case)
+    return cases[:limit] if limit else cases
+
+
+def deadline_of(result, now):
+    """(due, text) -> 'YYYY-MM-DD HH:MM' in the case's timezone."""
+    return result[0].astimezone(now.tzinfo).strftime("%Y-%m-%d %H:%M")
+
+
+# --- Extractors ---
+# Each is fn(case) -> the (due, text) tuple of extract_due_date.
+
+def local_extractor(case):
+    return local_due_date(case["text"], case["now_dt"], office_start=case["work_start"], office_end=case["work_end"])
+
+
+def recorded_extractor(path):
+    with open(path, encoding="utf-8") as f:
+        replies = {r["id"]: r["reply"] for r in map(json.loads, f) if r.get("reply") is not None}
+
+    def extract(case):
+        if case["id"] not in replies:
+            raise KeyError(f"no recorded reply for {case['id']}")
+        return resolve_due_date(replies[case["id"]], case["text"], case["now_dt"], office_start=case["work_start"])
+    return extract
+
+
+def llm_extractor(record_path=None):
+    # Imported here: helpers needs Slack, the LLM SDKs and the database config
+    from helpers import llm_router, get_batch_prompt
+    from due_date_batcher import DueDateBatcher
+    from user_clock import UserClock
+
+    record = open(record_path, "a", encoding="utf-8") if record_path else None
+    lock = threading.Lock()
+
+    def extract(case):
+        clock = UserClock(pytz.timezone(case["tz"]), case["work_start"], case["work_end"])
+        reply = None
+        try:
+            raw, _ = llm_router.complete(get_batch_prompt([case["text"]], clock, now=case["now_dt"]), max_tokens=120)
+            reply = DueDateBatcher._parse(raw).get(0)
+            if reply is None:
+                raise ValueError("LLM returned no result")
+            return resolve_due_date(reply, case["text"], case["now_dt"], office_start=case["work_start"])
+        finally:
+            if record:
+                with lock:
+                    record.write(json.dumps({"id": case["id"], "reply": reply}, ensure_ascii=False) + "\n")
+                    record.flush()
+    return extract
+
+
+# --- Run and report ---
+
+def percentile(samples, p):
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def run(cases, extract, workers=1):
+    """Returns one outcome dict per case, in corpus order, and the wall time of the run."""
+    def one(case):
+        start = time.perf_counter()
+        try:
+            result = extract(case)
+            error = None
+        except Exception as e:
+            result, error = None, f"{type(e).__name__}: {e}"
+        latency = time.perf_counter() - start
+        got = deadline_of(result, case["now_dt"]) if result else None
+        return {
+            "id": case["id"],
+            "category": case["category"],
+            "latency": latency,
+            "got": got,
+            "got_text": result[1] if result else None,
+            "deadline_ok": got == case["expected"],
+            "text_ok": bool(result) and result[1].strip() == case["expected_text"],
+            "error": error,
+        }
+
+    started = time.perf_counter()
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(one, cases))
+    else:
+        outcomes = [one(case) for case in cases]
+    return outcomes, time.perf_counter() - started
+
+
+def summarize(outcomes, wall):
+    def stats(rows):
+        latencies = sorted(r["latency"] for r in rows)
+        return {
+            "cases": len(rows),
+            "deadline_accuracy": round(sum(r["deadline_ok"] for r in rows) / len(rows), 4),
+            "text_accuracy": round(sum(r["text_ok"] for r in rows) / len(rows), 4),
+            "errors": sum(r["error"] is not None for r in rows),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        }
+
+    by_category = defaultdict(list)
+    for r in outcomes:
+        by_category[r["category"]].append(r)
+    report = stats(outcomes)
+    report["wall_seconds"] = round(wall, 3)
+    report["throughput_per_second"] = round(len(outcomes) / wall, 1) if wall else None
+    report["categories"] = {name: stats(rows) for name, rows in sorted(by_category.items())}
+    return report
+
+
+def print_report(name, report, outcomes, cases, show_failures):
+    print(f"extractor: {name}   cases: {report['cases']}   errors: {report['errors']}")
+    print(f"deadline accuracy: {report['deadline_accuracy']:.1%}   text accuracy: {report['text_accuracy']:.1%}")
+    print(f"latency p50: {report['p50_ms']} ms   p99: {report['p99_ms']} ms   "
+          f"throughput: {report['throughput_per_second']}/s")
+    print()
+    print(f"  {'category':<15}{'cases':>7}{'deadline':>10}{'text':>8}{'p99 ms':>10}")
+    for category, s in report["categories"].items():
+        print(f"  {category:<15}{s['cases']:>7}{s['deadline_accuracy']:>10.1%}{s['text_accuracy']:>8.1%}{s['p99_ms']:>10}")
+
+    failed = [(r, c) for r, c in zip(outcomes, cases) if not r["deadline_ok"]]
+    if show_failures and failed:
+        print(f"\nFirst {min(show_failures, len(failed))} of {len(failed)} wrong deadlines:")
+        for r, c in failed[:show_failures]:
+            print(f"  {c['id']}  now {c['now'][:16]} ({c['tz']}, {c['work_start']}-{c['work_end']})  {c['text']!r}")
+            print(f"      expected {c['expected']}  got {r['got'] or r['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark due-date extraction against the labelled corpus.")
+    parser.add_argument("--extractor", choices=["local", "recorded", "llm"], default="local")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--category", action="append", help="only this category (repeatable)")
+    parser.add_argument("--limit", type=int, help="only the first N cases")
+    parser.add_argument("--workers", type=int, default=1, help="concurrent extractions (for the llm extractor)")
+    parser.add_argument("--replies", help="recorded LLM replies (for --extractor recorded)")
+    parser.add_argument("--record", metavar="FILE", help="append the live LLM replies to FILE (for --extractor llm)")
+    parser.add_argument("--repeat", type=int, default=1, help="run the corpus N times; the last run is reported")
+    parser.add_argument("--failures", type=int, default=10, help="how many wrong deadlines to print")
+    parser.add_argument("--json", metavar="FILE", help="also write the report as JSON")
+    parser.add_argument("--min-accuracy", type=float, help="exit 1 if deadline accuracy is below this (0-1)")
+    parser.add_argument("--min-category-accuracy", type=float,
+                        help="exit 1 if any category's deadline accuracy is below this (0-1)")
+    parser.add_argument("--no-gate", action="store_true", help="do not apply LOCAL_GATES")
+    parser.add_argument("--max-p99-ms", type=float, help="exit 1 if p99 latency is above this")
+    args = parser.parse_args()
+
+    if args.extractor == "local" and not args.no_gate:
+        for name, value in LOCAL_GATES.items():
+            if getattr(args, name) is None:
+                setattr(args, name, value)
+
+    cases = load_corpus(args.corpus, args.category, args.limit)
+    if not cases:
+        sys.exit("No cases selected")
+
+    if args.extractor == "local":
+        extract = local_extractor
+    elif args.extractor == "recorded":
+        if not args.replies:
+            sys.exit("--extractor recorded needs --replies FILE")
+        extract = recorded_extractor(args.replies)
+    else:
+        extract = llm_extractor(args.record)
+
+    for _ in range(max(1, args.repeat)):  # earlier runs warm up caches and the interpreter
+        outcomes, wall = run(cases, extract, args.workers)
+    report = summarize(outcomes, wall)
+    report["extractor"] = args.extractor
+    print_report(args.extractor, report, outcomes, cases, args.failures)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    failed = []
+    if args.min_accuracy is not None and report["deadline_accuracy"] < args.min_accuracy:
+        failed.append(f"deadline accuracy {report['deadline_accuracy']:.1%} < {args.min_accuracy:.1%}")
+    if args.min_category_accuracy is not None:
+        for category, stats in report["categories"].items():
+            if stats["deadline_accuracy"] < args.min_category_accuracy:
+                failed.append(f"{category} deadline accuracy {stats['deadline_accuracy']:.1%} "
+                              f"< {args.min_category_accuracy:.1%}")
+    if args.max_p99_ms is not None and report["p99_ms"] > args.max_p99_ms:
+        failed.append(f"p99 {report['p99_ms']} ms > {args.max_p99_ms} ms")
+    if failed:
+        print("\n❌ " + "; ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+Generates the labelled due-date corpus used by due_date_bench.py.
+
+Every case is a realistic /addtask text with a pinned "now" (timezone and
+working hours included) and the deadline a person writing it means. Labels
+come from how each phrase was built, not from any extractor, so the corpus
+can grade the local parser and the LLM alike. Phrases whose intent is
+genuinely ambiguous ("by friday" written on a Friday, "next friday", a bare
+"at 8") are left out rather than labelled by guesswork.
+
+The output is deterministic for a given --seed; commit the regenerated file
+together with any change to this script.
+
+  python bench/due_date_corpus.py                  # writes bench/due_date_corpus.jsonl
+  python bench/due_date_corpus.py --size 5000 --out /tmp/corpus.jsonl
+"""
+import os
+import json
+import random
+import argparse
+import calendar
+from datetime import datetime, timedelta
+import pytz
+
+DEFAULT_OUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "due_date_corpus.jsonl")
+
+ZONES = ["Asia/Kolkata"] * 6 + ["America/New_York", "Europe/London", "Asia/Singapore"]
+WORK_HOURS = [(10, 19)] * 6 + [(9, 18), (8, 17)]
+NOW_MINUTES = [3, 7, 12, 19, 23, 41, 47, 52, 58]  # never on the hour or half hour, so no ties with a deadline
+
+BODIES = [
+    "send the invoice to acme", "review the onboarding deck", "update the sprint board",
+    "call the vendor about the delayed shipment", "submit the expense report", "prepare the board slides",
+    "share the release notes with support", "fix the login redirect bug", "book the meeting room for the offsite",
+    "renew the SSL certificate", "follow up with the design team", "draft the job description for the QA role",
+    "reply to the client email", "merge the payments PR", "collect feedback from the pilot users",
+    "schedule the interview with priya", "upload the signed contract", "clean up the staging database",
+    "finalize the hiring plan", "send the weekly status update", "check the analytics dashboard numbers",
+    "write the incident postmortem", "approve the leave requests", "order lunch for the team",
+    "test the new checkout flow", "sync with marketing on the launch", "publish the blog post",
+    "reconcile the bank statements", "back up the shared drive", "set up the demo environment",
+    "translate the help article", "review rahul's pull request", "send the proposal to the new lead",
+    "archive the old tickets", "prepare the payroll sheet", "get the NDA signed",
+    "update the pricing page", "record the product walkthrough", "confirm the hotel booking",
+    "share the meeting minutes",
+]
+# Bodies with digits that are not dates or times; they must survive untouched
+NOISY_BODIES = [
+    "update the Q3 roadmap", "review PR 4521", "order 12 chairs for the new office",
+    "fix the 404 on the pricing page", "prepare slides for the v2 launch", "close the 3 open escalations",
+    "reply to ticket 8812", "bump the sdk to 2.3", "ship the 1.4 hotfix", "invite 25 people to the webinar",
+    "print 40 copies of the brochure", "move the 2 interns to the new project",
+]
+
+WEEKDAY_NAMES = list(calendar.day_name)
+
+
+def pick_now(rng, year, month_days=None):
+    """A random pinned "now" (aware, minute precision) plus the user's working hours."""
+    tz = pytz.timezone(rng.choice(ZONES))
+    if month_days:
+        month, first, last = month_days
+        day = datetime(year, month, rng.randint(first, last))
+    else:
+        day = datetime(year, 1, 1) + timedelta(days=rng.randint(0, 364))
+    naive = day.replace(hour=rng.randint(8, 21), minute=rng.choice(NOW_MINUTES))
+    start, end = rng.choice(WORK_HOURS)
+    return tz.localize(naive), start, end
+
+
+def h12(hour):
+    return hour % 12 or 12
+
+
+def render_time(rng, hour, minute, style=None):
+    """One way people write hour:minute; every style here is unambiguous."""
+    ampm = "am" if hour < 12 else "pm"
+    styles = ["compact", "spaced", "colon", "colon_upper", "dot", "packed"]
+    if hour >= 13 or hour in (10, 11, 12):
+        styles.append("24h")
+    style = style or rng.choice(styles)
+    mm = f"{minute:02d}"
+    if style == "compact":
+        return f"{h12(hour)}{ampm}" if not minute else f"{h12(hour)}:{mm}{ampm}"
+    if style == "spaced":
+        return f"{h12(hour)} {ampm}" if not minute else f"{h12(hour)}:{mm} {ampm}"
+    if style == "colon":
+        return f"{h12(hour)}:{mm}{ampm}"
+    if style == "colon_upper":
+        return f"{h12(hour)}:{mm} {ampm.upper()}"
+    if style == "dot":
+        return f"{h12(hour)}.{mm}{ampm}"
+    if style == "packed":  # "530pm"
+        return f"{h12(hour)}{mm if minute else ''}{ampm}"
+    return f"{hour:02d}:{mm}"
+
+
+def random_time(rng, hours=range(10, 19)):
+    return rng.choice(list(hours)), rng.choice([0, 0, 0, 30, 30, 15, 45])
+
+
+def place(rng, body, due):
+    """Where the due phrase goes; mostly at the end, as people type it."""
+    roll = rng.random()
+    if roll < 0.75:
+        return f"{body} {due}"
+    if roll < 0.9:
+        return f"{body}, {due}"
+    return f"{due} {body}"
+
+
+def same_day_or_next(now, hour, minute):
+    """Rule 5 of the prompt: a time without a date is today, or tomorrow once past."""
+    local = now.replace(tzinfo=None)
+    target = local.replace(hour=hour, minute=minute)
+    return target if target > local else target + timedelta(days=1)
+
+
+def at(day, hour, minute):
+    return datetime(day.year, day.month, day.day, hour, minute)
+
+
+# --- Categories ---
+# Each returns (text, expected naive local deadline, expected cleaned text)
+
+def case_time_only(rng, now, start, end):
+    hour, minute = random_time(rng, range(11, 20))
+    body = rng.choice(BODIES)
+    due = f"{rng.choice(['by', 'at', 'before'])} {render_time(rng, hour, minute)}"
+    return place(rng, body, due), same_day_or_next(now, hour, minute), body
+
+
+def case_sloppy_time(rng, now, start, end):
+    """'at 230', '@5', 'by 1130', '2 30': no am/pm, read as the working-hours time."""
+    body = rng.choice(BODIES)
+    hour = rng.choice([13, 14, 15, 16, 17, 18, 10, 11, 12])
+    minute = rng.choice([0, 0, 30, 15, 45])
+    shown = h12(hour)
+    if rng.random() < 0.1 and minute:
+        digits = f"{shown} {minute:02d}"
+    else:
+        digits = f"{shown}{minute:02d}" if minute else str(shown)
+    due = f"{rng.choice(['by', 'at', 'at', '@', 'before'])} {digits}"
+    return f"{body} {due}", same_day_or_next(now, hour, minute), body
+
+
+def case_am_time(rng, now, start, end):
+    """An explicit 'am' must be kept even before the working day starts."""
+    body = rng.choice(BODIES)
+    hour, minute = rng.choice([8, 9, 9, 10, 11]), rng.choice([0, 0, 30])
+    due = f"{rng.choice(['by', 'at', 'before'])} {render_time(rng, hour, minute, rng.choice(['compact', 'spaced', 'colon']))}"
+    return place(rng, body, due), same_day_or_next(now, hour, minute), body
+
+
+def case_today_time(rng, now, start, end):
+    body = rng.choice(BODIES)
+    hour, minute = random_time(rng, range(11, 21))
+    time_text = render_time(rng, hour, minute)
+    due = rng.choice([f"today {time_text}", f"today by {time_text}", f"by {time_text} today", f"today at {time_text}"])
+    # "today" is explicit: the deadline stays today even if that time has passed
+    return place(rng, body, due), at(now, hour, minute), body
+
+
+def case_tomorrow(rng, now, start, end):
+    body = rng.choice(BODIES)
+    word = rng.choice(["tomorrow", "tomorrow", "tmrw", "tmr"])
+    day = now + timedelta(days=1)
+    if rng.random() < 0.35:
+        # Rule 4: a date without a time means the start of the working day
+        return place(rng, body, f"{rng.choice(['by', 'due', ''])} {word}".strip()), at(day, start, 0), body
+    hour, minute = random_time(rng, range(10, 20))
+    time_text = render_time(rng, hour, minute)
+    due = rng.choice([f"{word} {time_text}", f"{word} by {time_text}", f"by {time_text} {word}"])
+    return place(rng, body, due), at(day, hour, minute), body
+
+
+def case_weekday(rng, now, start, end):
+    body = rng.choice(BODIES)
+    days_ahead = rng.randint(1, 6)  # never the current weekday
+    day = now + timedelta(days=days_ahead)
+    name = WEEKDAY_NAMES[day.weekday()]
+    name = rng.choice([name, name.lower(), name[:3].lower(), name[:3]])
+    if rng.random() < 0.4:
+        return place(rng, body, f"{rng.choice(['by', 'on', 'before'])} {name}"), at(day, start, 0), body
+    hour, minute = random_time(rng, range(10, 19))
+    time_text = render_time(rng, hour, minute)
+    due = rng.choice([f"by {name} {time_text}", f"on {name} at {time_text}", f"{name} {time_text}"])
+    return place(rng, body, due), at(day, hour, minute), body
+
+
+def case_eod(rng, now, start, end):
+    """EOD is half an hour before the working day ends."""
+    body = rng.choice(BODIES)
+    phrase = rng.choice(["EOD", "eod", "end of day", "end of the day"])
+    local = now.replace(tzinfo=None)
+    roll = rng.random()
+    if roll < 0.25:
+        return place(rng, body, f"by {phrase} tomorrow"), at(local + timedelta(days=1), end - 1, 30), body
+    if roll < 0.4:
+        return place(rng, body, f"by {phrase} today"), at(local, end - 1, 30), body
+    return place(rng, body, f"by {phrase}"), same_day_or_next(now, end - 1, 30), body
+
+
+def case_month_date(rng, now, start, end):
+    body = rng.choice(BODIES)
+    day = now + timedelta(days=rng.randint(2, 60))
+    month = calendar.month_name[day.month]
+    month = rng.choice([month, month[:3], month[:3].lower()])
+    suffix = {1: "st", 2: "nd", 3: "rd", 21: "st", 22: "nd", 23: "rd", 31: "st"}.get(day.day, "th")
+    date_text = rng.choice([f"{day.day} {month}", f"{month} {day.day}", f"{day.day}{suffix} {month}", f"{month} {day.day}{suffix}"])
+    if rng.random() < 0.5:
+        return place(rng, body, f"{rng.choice(['by', 'on', 'before'])} {date_text}"), at(day, start, 0), body
+    hour, minute = random_time(rng)
+    due = f"{rng.choice(['by', 'on'])} {date_text} {rng.choice(['', 'at ', 'by '])}{render_time(rng, hour, minute)}"
+    return place(rng, body, due), at(day, hour, minute), body
+
+
+def case_numeric_date(rng, now, start, end):
+    """Day first, as the prompt documents: 03/12 is the 3rd of December."""
+    body = rng.choice(BODIES)
+    day = now + timedelta(days=rng.randint(2, 60))
+    sep = rng.choice(["/", "/", "-", "."])
+    dd = rng.choice([f"{day.day:02d}", str(day.day)])
+    mm = rng.choice([f"{day.month:02d}", str(day.month)])
+    date_text = rng.choice([f"{dd}{sep}{mm}", f"{dd}{sep}{mm}{sep}{day.year}"])
+    if rng.random() < 0.5:
+        return place(rng, body, f"{rng.choice(['by', 'on', 'before'])} {date_text}"), at(day, start, 0), body
+    hour, minute = random_time(rng)
+    due = f"{rng.choice(['by', 'on'])} {date_text} {rng.choice(['', 'at '])}{render_time(rng, hour, minute)}"
+    return place(rng, body, due), at(day, hour, minute), body
+
+
+def case_year_rollover(rng, now, start, end):
+    """Late December, a January date without a year: next year."""
+    body = rng.choice(BODIES)
+    day = datetime(now.year + 1, 1, rng.randint(1, 15))
+    month = rng.choice(["January", "Jan", "jan"])
+    date_text = rng.choice([f"{day.day} {month}", f"{month} {day.day}", f"{day.day:02d}/01", f"{day.day}/1"])
+    if rng.random() < 0.5:
+        return place(rng, body, f"by {date_text}"), at(day, start, 0), body
+    hour, minute = random_time(rng)
+    return place(rng, body, f"by {date_text} {render_time(rng, hour, minute)}"), at(day, hour, minute), body
+
+
+def case_no_date(rng, now, start, end):
+    """Rule 3: nothing said means 24 hours from now."""
+    body = rng.choice(BODIES)
+    return body, now.replace(tzinfo=None) + timedelta(hours=24), body
+
+
+def case_noise(rng, now, start, end):
+    body = rng.choice(NOISY_BODIES)
+    return body, now.replace(tzinfo=None) + timedelta(hours=24), body
+
+
+# category -> (builder, share of the corpus, restrict "now" to (month, first day, last day))
+CATEGORIES = {
+    "time_only": (case_time_only, 0.15, None),
+    "sloppy_time": (case_sloppy_time, 0.13, None),
+    "am_time": (case_am_time, 0.05, None),
+    "today_time": (case_today_time, 0.07, None),
+    "tomorrow": (case_tomorrow, 0.10, None),
+    "weekday": (case_weekday, 0.13, None),
+    "eod": (case_eod, 0.07, None),
+    "month_date": (case_month_date, 0.09, None),
+    "numeric_date": (case_numeric_date, 0.08, None),
+    "year_rollover": (case_year_rollover, 0.03, (12, 20, 31)),
+    "no_date": (case_no_date, 0.05, None),
+    "noise": (case_noise, 0.05, None),
+}
+
+
+def generate(size, seed, year):
+    rng = random.Random(seed)
+    cases = []
+    for category, (build, share, month_days) in CATEGORIES.items():
+        for i in range(max(1, round(size * share))):
+            now, start, end = pick_now(rng, year, month_days)
+            text, expected, expected_text = build(rng, now, start, end)
+            cases.append({
+                "id": f"{category}-{i:04d}",
+                "category": category,
+                "text": text,
+                "now": now.isoformat(),
+                "tz": now.tzinfo.zone,
+                "work_start": start,
+                "work_end": end,
+                "expected": expected.strftime("%Y-%m-%d %H:%M"),
+                "expected_text": expected_text,
+            })
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the labelled due-date corpus.")
+    parser.add_argument("--size", type=int, default=3000, help="approximate number of cases")
+    parser.add_argument("--seed", type=int, default=44)
+    parser.add_argument("--year", type=int, default=2026, help="year the pinned 'now' values fall in")
+    parser.add_argument("--out", default=DEFAULT_OUT)
+    args = parser.parse_args()
+
+    cases = generate(args.size, args.seed, args.year)
+    with open(args.out, "w", encoding="utf-8") as f:
+        for case in cases:
+            f.write(json.dumps(case, ensure_ascii=False) + "\n")
+    print(f"Wrote {len(cases)} cases to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
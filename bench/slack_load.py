@@ -0,0 +1,628 @@
+"""
+Load generator for the Slack side of the app.
+
+Drives the registered slack_app listeners directly (the way Socket Mode
+hands them payloads) at a target rate, against a local fake Slack Web API
+and a fake LLM, each with configurable latency. Everything else is the real
+code: middlewares, rate limits, the storage backend (a throwaway SQLite file,
+or Postgres with --postgres), the Slack client's pooling and throttling,
+the LLM batcher and the button action queue.
+
+Workloads:
+  synthetic  a mix of /addtask, /mytasks, /completetasknew, /deletetask and
+             Complete/Snooze button clicks from --users users. /addtask texts
+             come from bench/due_date_corpus.jsonl, and complete/delete/click
+             target tasks seeded before the run.
+  replay     payloads recorded by a running app with SLACK_PAYLOAD_LOG set,
+             at their original pace (--speed to compress) or at --rate.
+             Recorded task IDs mostly do not exist in the bench database, so
+             those commands take their "not found" path.
+
+Reported: ack and completion latency percentiles (measured from the
+scheduled send time, so queueing is included), throughput, errors and
+rejections per kind, acks later than Slack's 3 s limit, peak threads by
+pool, connections opened to Slack, and the client, LLM and action-queue
+metrics.
+
+  python bench/slack_load.py --rate 20 --duration 30
+  python bench/slack_load.py --rate 50 --slack-latency-ms 150 --llm-latency-ms 900 --listener-workers 32
+  python bench/slack_load.py --replay payloads.jsonl --speed 10 --json bench_output.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import threading
+import contextlib
+from collections import defaultdict, Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CORPUS = os.path.join(ROOT, "bench", "due_date_corpus.jsonl")
+ACK_LIMIT = 3.0  # Slack shows the user an error when a command is not acked within 3 s
+TEAM_ID = "TBENCH"
+ZONES = ["Asia/Kolkata", "Asia/Kolkata", "Asia/Kolkata", "America/New_York", "Europe/London"]
+
+
+def percentile(samples, p):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def jittered(mean_ms, jitter_ms):
+    return max(0.0, random.gauss(mean_ms, jitter_ms) / 1000.0) if jitter_ms else mean_ms / 1000.0
+
+
+# --- Fake Slack Web API ---
+
+class FakeSlack(ThreadingHTTPServer):
+    """
+    Answers every Web API method with a plausible "ok" body after a
+    configurable delay. Keeps connections alive like Slack does, and counts
+    connections and calls so pooling changes show up in the report.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, users, latency_ms=50, jitter_ms=0, error_rate=0.0):
+        super().__init__(("127.0.0.1", 0), FakeSlackHandler)
+        self.users = users
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.errors = Counter()
+        self.connections = 0
+        self.open_connections = 0
+        self.peak_connections = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/api/"
+
+    def connection_opened(self):
+        with self.lock:
+            self.connections += 1
+            self.open_connections += 1
+            self.peak_connections = max(self.peak_connections, self.open_connections)
+
+    def connection_closed(self):
+        with self.lock:
+            self.open_connections -= 1
+
+    def respond(self, method, args):
+        with self.lock:
+            self.calls[method] += 1
+        time.sleep(jittered(self.latency_ms, self.jitter_ms))
+        if method != "auth.test" and random.random() < self.error_rate:
+            with self.lock:
+                self.errors[method] += 1
+            return {"ok": False, "error": "internal_error"}
+
+        if method == "auth.test":
+            return {"ok": True, "user_id": "UBENCHBOT", "bot_id": "BBENCH", "team_id": TEAM_ID, "team": "bench",
+                    "url": "https://bench.slack.com/"}
+        if method == "users.list":
+            members = [{"id": uid, "name": uid.lower(), "tz": tz, "profile": {"real_name": uid, "display_name": uid}}
+                       for uid, tz in self.users.items()]
+            return {"ok": True, "members": members, "response_metadata": {"next_cursor": ""}}
+        if method == "users.info":
+            uid = args.get("user")
+            return {"ok": True, "user": {"id": uid, "name": str(uid).lower(), "tz": self.users.get(uid),
+                                         "profile": {"real_name": uid, "display_name": uid}}}
+        if method == "usergroups.list":
+            return {"ok": True, "usergroups": []}
+        if method == "usergroups.users.list":
+            return {"ok": True, "users": []}
+        if method == "conversations.members":
+            return {"ok": True, "members": list(self.users)[:20], "response_metadata": {"next_cursor": ""}}
+        if method == "conversations.open":
+            return {"ok": True, "channel": {"id": "D" + str(args.get("users", "X"))[1:]}}
+        if method in ("chat.postMessage", "chat.update", "chat.postEphemeral"):
+            return {"ok": True, "channel": args.get("channel"), "ts": f"{time.time():.6f}"}
+        return {"ok": True}
+
+
+class FakeSlackHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so the client's pool is exercised
+
+    def setup(self):
+        super().setup()
+        threading.current_thread().name = "fake-slack-conn"
+        self.server.connection_opened()
+
+    def finish(self):
+        try:
+            super().finish()
+        finally:
+            self.server.connection_closed()
+
+    def log_message(self, *args):
+        pass
+
+    def _serve(self):
+        url = urlparse(self.path)
+        method = url.path.rsplit("/", 1)[-1]
+        args = {k: v[0] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if raw:
+            if "json" in (self.headers.get("Content-Type") or ""):
+                args.update(json.loads(raw))
+            else:
+                args.update({k: v[0] for k, v in parse_qs(raw.decode()).items()})
+
+        body = json.dumps(self.server.respond(method, args)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = _serve
+
+
+# --- Environment and app import ---
+
+def prepare_environment(args, slack_url, tmp):
+    """Points the app at the fakes; must run before config is imported."""
+    os.environ["SLACK_API_URL"] = slack_url
+    os.environ["SLACK_BOT_TOKEN"] = "xoxb-bench"
+    os.environ["SLACK_PAYLOAD_LOG"] = ""  # never record the bench's own traffic
+    os.environ["PUBLIC_HOST"] = "http://localhost"
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+    os.environ.setdefault("GROQ_API_KEY", "bench")
+    if args.postgres:
+        os.environ["STORAGE_BACKEND"] = "postgres"
+        os.environ["DATABASE_URL"] = args.postgres
+    else:
+        os.environ["STORAGE_BACKEND"] = "sqlite"
+        os.environ["SQLITE_PATH"] = os.path.join(tmp, "bench.db")
+    for assignment in args.env or []:
+        key, _, value = assignment.partition("=")
+        os.environ[key] = value
+
+
+def load_app():
+    import slack_handlers  # noqa: F401  registers the listeners
+    import config
+    import database
+    import helpers
+    from action_queue import action_queue
+    return config, database, helpers, action_queue
+
+
+def fake_llm_provider(latency_ms, jitter_ms, error_rate):
+    """An LLMProvider answering batch prompts from the local parser after a delay."""
+    import pytz
+    from llm_providers import LLMProvider
+    from due_date_parser import parse_due_text
+
+    task_re = re.compile(r"^(\d+)\. (\".*\")$", re.M)
+    now_re = re.compile(r"- Now: (\d{2}/\d{2}/\d{4} \d{2}:\d{2})")
+
+    class FakeLLMProvider(LLMProvider):
+        name = "fake"
+
+        def _call(self, prompt, max_tokens, timeout):
+            delay = jittered(latency_ms, jitter_ms)
+            time.sleep(min(delay, timeout))
+            if delay > timeout:
+                raise TimeoutError("fake LLM over its deadline")
+            if random.random() < error_rate:
+                raise RuntimeError("fake LLM error")
+            now = pytz.utc.localize(datetime.strptime(now_re.search(prompt).group(1), "%d/%m/%Y %H:%M"))
+            results = []
+            for match in task_re.finditer(prompt):
+                text = json.loads(match.group(2))
+                data = parse_due_text(text, now) or {"date": "", "time": "", "text": text}
+                results.append(dict(data, index=int(match.group(1))))
+            return json.dumps({"results": results}), len(prompt) // 4
+
+    return FakeLLMProvider()
+
+
+# --- Instrumentation ---
+
+_current = threading.local()
+
+
+class Job:
+    __slots__ = ("kind", "body", "scheduled", "sent", "acked", "finished", "status", "ack_text", "error", "done")
+
+    def __init__(self, kind, body, scheduled):
+        self.kind = kind
+        self.body = body
+        self.scheduled = scheduled
+        self.sent = self.acked = self.finished = None
+        self.status = None
+        self.ack_text = ""
+        self.error = None
+        self.done = threading.Event()
+
+
+class TimedExecutor:
+    """Wraps Bolt's listener executor to see when each listener finishes."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def submit(self, fn, *args, **kwargs):
+        job = getattr(_current, "job", None)
+
+        def run():
+            _current.job = job
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _current.job = None
+                if job is not None:
+                    job.finished = time.perf_counter()
+                    job.done.set()
+        return self.inner.submit(run)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+class RecordingErrorHandler:
+    """Bolt swallows listener exceptions into its error handler; note them on the job first."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def handle(self, error, request, response):
+        job = getattr(_current, "job", None)
+        if job is not None:
+            job.error = f"{type(error).__name__}: {error}"
+        return self.inner.handle(error=error, request=request, response=response)
+
+
+class ThreadSampler(threading.Thread):
+    """Samples live threads, grouped by pool name, every `interval` seconds."""
+
+    def __init__(self, interval=0.1):
+        super().__init__(daemon=True, name="bench-sampler")
+        self.interval = interval
+        self.samples = []
+        self.peak_by_pool = Counter()
+        self._halt = threading.Event()
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            threads = threading.enumerate()
+            self.samples.append(len(threads))
+            pools = Counter(re.sub(r"[-_]?\d+(_\d+)?$", "", t.name.split(" (")[0]) for t in threads)
+            for pool, count in pools.items():
+                self.peak_by_pool[pool] = max(self.peak_by_pool[pool], count)
+
+    def stop(self):
+        self._halt.set()
+        self.join()
+
+
+# --- Workloads ---
+
+def synthetic_users(n):
+    return {f"UBENCH{i:04d}": ZONES[i % len(ZONES)] for i in range(n)}
+
+
+def command_body(command, user_id, text=""):
+    return {
+        "team_id": TEAM_ID, "team_domain": "bench", "channel_id": "D" + user_id[1:],
+        "channel_name": "directmessage", "user_id": user_id, "user_name": user_id.lower(),
+        "command": command, "text": text, "api_app_id": "ABENCH", "is_enterprise_install": "false",
+        "trigger_id": uuid.uuid4().hex,
+    }
+
+
+def button_body(action_id, user_id, task_id):
+    ts = f"{time.time():.6f}"
+    return {
+        "type": "block_actions", "api_app_id": "ABENCH", "trigger_id": uuid.uuid4().hex,
+        "team": {"id": TEAM_ID, "domain": "bench"},
+        "user": {"id": user_id, "username": user_id.lower(), "team_id": TEAM_ID},
+        "container": {"type": "message", "message_ts": ts, "channel_id": "D" + user_id[1:]},
+        "channel": {"id": "D" + user_id[1:], "name": "directmessage"},
+        "message": {"ts": ts, "text": f"🔔 Reminder: task {task_id}"},
+        "actions": [{"action_id": action_id, "block_id": "task_actions", "value": str(task_id),
+                     "type": "button", "action_ts": ts}],
+    }
+
+
+class SyntheticWorkload:
+    """Builds payloads on demand; complete/delete/clicks pick seeded tasks, each at most once."""
+
+    def __init__(self, users, mix, store, seed_tasks, corpus=CORPUS):
+        self.users = list(users)
+        self.kinds = list(mix)
+        self.weights = [mix[k] for k in self.kinds]
+        self.lock = threading.Lock()
+        with open(corpus, encoding="utf-8") as f:
+            self.texts = [json.loads(line)["text"] for line in f if line.strip()]
+        self.assigned = defaultdict(list)  # user -> [task ids assigned to them]
+        self.created = defaultdict(list)   # user -> [task ids they created]
+        if seed_tasks:
+            self._seed(store, seed_tasks)
+
+    def _seed(self, store, count):
+        import pytz
+        now = datetime.now(pytz.utc)
+        tasks = []
+        for i in range(count):
+            creator = random.choice(self.users)
+            assignees = random.sample(self.users, k=min(len(self.users), random.randint(1, 3)))
+            tasks.append((creator, assignees, f"seeded task {i}", now, None))
+        with store.transaction() as c:
+            ids, _ = store.insert_tasks(c, tasks, now)
+        for task_id, (creator, assignees, _, _, _) in zip(ids, tasks):
+            self.created[creator].append(task_id)
+            for user in assignees:
+                self.assigned[user].append(task_id)
+
+    def _take(self, index, user):
+        with self.lock:
+            return index[user].pop() if index[user] else random.randint(10**8, 10**9)
+
+    def next(self):
+        kind = random.choices(self.kinds, self.weights)[0]
+        user = random.choice(self.users)
+        if kind == "addtask":
+            others = random.sample(self.users, k=random.choice([0, 0, 1, 1, 2, 3]))
+            text = random.choice(self.texts) + "".join(f" <@{u}>" for u in others)
+            return kind, command_body("/addtask", user, text)
+        if kind == "mytasks":
+            return kind, command_body("/mytasks", user)
+        if kind == "completetasknew":
+            return kind, command_body("/completetasknew", user, str(self._take(self.assigned, user)))
+        if kind == "deletetask":
+            return kind, command_body("/deletetask", user, str(self._take(self.created, user)))
+        if kind == "complete_button":
+            return kind, button_body("task_complete", user, self._take(self.assigned, user))
+        if kind == "snooze_button":
+            return kind, button_body("task_snooze", user, self._take(self.assigned, user))
+        raise ValueError(f"Unknown workload kind '{kind}'")
+
+
+def payload_kind(body):
+    if body.get("command"):
+        return body["command"].lstrip("/")
+    actions = body.get("actions") or [{}]
+    return {"task_complete": "complete_button", "task_snooze": "snooze_button"}.get(
+        actions[0].get("action_id"), actions[0].get("action_id", "unknown"))
+
+
+def synthetic_schedule(workload, rate, duration):
+    """Open loop: send times spaced as a Poisson process at `rate` per second."""
+    t, schedule = 0.0, []
+    while True:
+        t += random.expovariate(rate)
+        if t >= duration:
+            return schedule
+        kind, body = workload.next()
+        schedule.append((t, kind, body))
+
+
+def replay_schedule(path, speed=1.0, rate=None, limit=None):
+    """Recorded payloads at their recorded pace divided by `speed`, or evenly at `rate`."""
+    with open(path, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()][:limit]
+    if not entries:
+        return []
+    first = entries[0]["at"]
+    schedule = []
+    for i, entry in enumerate(entries):
+        offset = i / rate if rate else (entry["at"] - first) / speed
+        schedule.append((offset, payload_kind(entry["body"]), entry["body"]))
+    return schedule
+
+
+# --- Driver ---
+
+def run(slack_app, schedule, concurrency, drain):
+    from slack_bolt.request import BoltRequest
+
+    jobs = []
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench-socket")
+
+    def send(job):
+        _current.job = job
+        job.sent = time.perf_counter()
+        try:
+            response = slack_app.dispatch(BoltRequest(body=job.body, mode="socket_mode"))
+            job.acked = time.perf_counter()
+            job.status = response.status
+            job.ack_text = response.body or ""
+            if response.status != 200 or job.ack_text:
+                job.done.set()  # rejected by a middleware, or nothing listened: no listener runs
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.done.set()
+        finally:
+            _current.job = None
+
+    start = time.perf_counter()
+    for offset, kind, body in schedule:
+        delay = start + offset - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        job = Job(kind, body, start + offset)
+        jobs.append(job)
+        pool.submit(send, job)
+    sent_all = time.perf_counter()
+
+    deadline = time.perf_counter() + drain
+    for job in jobs:
+        job.done.wait(max(0.0, deadline - time.perf_counter()))
+    pool.shutdown(wait=False)
+    return jobs, sent_all - start, time.perf_counter() - start
+
+
+def summarize(jobs, send_seconds, wall_seconds):
+    def stats(rows):
+        acks = [j.acked - j.scheduled for j in rows if j.acked is not None]
+        finishes = [j.finished - j.scheduled for j in rows if j.finished is not None]
+        ms = lambda v: round(v * 1000, 1) if v is not None else None  # noqa: E731
+        return {
+            "requests": len(rows),
+            "completed": len(finishes),
+            "rejected": sum(bool(j.ack_text) for j in rows),
+            "errors": sum(j.error is not None or (j.status not in (None, 200)) for j in rows),
+            "unfinished": sum(not j.done.is_set() for j in rows),
+            "late_acks": sum(a > ACK_LIMIT for a in acks) + sum(j.acked is None for j in rows),
+            "ack_p50_ms": ms(percentile(acks, 0.50)),
+            "ack_p95_ms": ms(percentile(acks, 0.95)),
+            "ack_p99_ms": ms(percentile(acks, 0.99)),
+            "done_p50_ms": ms(percentile(finishes, 0.50)),
+            "done_p95_ms": ms(percentile(finishes, 0.95)),
+            "done_p99_ms": ms(percentile(finishes, 0.99)),
+        }
+
+    by_kind = defaultdict(list)
+    for job in jobs:
+        by_kind[job.kind].append(job)
+    report = stats(jobs)
+    report["offered_rate"] = round(len(jobs) / send_seconds, 2) if send_seconds else None
+    report["throughput"] = round(sum(j.done.is_set() for j in jobs) / wall_seconds, 2) if wall_seconds else None
+    report["wall_seconds"] = round(wall_seconds, 2)
+    report["kinds"] = {kind: stats(rows) for kind, rows in sorted(by_kind.items())}
+    report["error_samples"] = Counter(j.error or f"status {j.status}" for j in jobs
+                                      if j.error or j.status not in (None, 200)).most_common(5)
+    report["rejection_samples"] = Counter(j.ack_text[:80] for j in jobs if j.ack_text).most_common(3)
+    return report
+
+
+def print_report(report):
+    print(f"requests: {report['requests']}   offered: {report['offered_rate']}/s   "
+          f"throughput: {report['throughput']}/s   wall: {report['wall_seconds']} s")
+    print(f"errors: {report['errors']}   rejected: {report['rejected']}   unfinished: {report['unfinished']}   "
+          f"acks over {ACK_LIMIT:.0f}s: {report['late_acks']}")
+    print()
+    header = f"  {'kind':<17}{'n':>6}{'err':>5}{'rej':>5}{'ack p50':>9}{'p99':>8}{'done p50':>10}{'p95':>8}{'p99':>8}"
+    print(header)
+    for kind, s in report["kinds"].items():
+        print(f"  {kind:<17}{s['requests']:>6}{s['errors']:>5}{s['rejected']:>5}{str(s['ack_p50_ms']):>9}"
+              f"{str(s['ack_p99_ms']):>8}{str(s['done_p50_ms']):>10}{str(s['done_p95_ms']):>8}{str(s['done_p99_ms']):>8}")
+    print("  (milliseconds from the scheduled send time)")
+
+    r = report["resources"]
+    print(f"\nthreads: peak {r['threads_peak']}, mean {r['threads_mean']}   "
+          f"by pool: {', '.join(f'{k} {v}' for k, v in r['threads_by_pool'].items())}")
+    print(f"slack: {r['slack_calls']} calls, {r['slack_errors']} failed, {r['slack_connections']} connections opened "
+          f"(peak {r['slack_connections_peak']} open)")
+    for method, m in sorted(r["slack_client"].items()):
+        print(f"  {method:<22}{m['calls']:>6} calls  p95 {m['p95_ms']} ms  throttled {m['wait_seconds']} s  429s {m['rate_limited']}")
+    print(f"llm: {json.dumps(r['llm'])}")
+    print(f"action queue: {json.dumps(r['action_queue'])}")
+    for title, samples in (("errors", report["error_samples"]), ("rejections", report["rejection_samples"])):
+        for text, count in samples:
+            print(f"  {title}: {count} × {text}")
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the Slack listeners at a target rate against fake backends.")
+    parser.add_argument("--rate", type=float, help="requests per second (synthetic default 10); paces a replay evenly")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of synthetic load")
+    parser.add_argument("--mix", default="addtask=5,mytasks=2,completetasknew=2,deletetask=1,complete_button=2,snooze_button=1",
+                        help="synthetic request kinds and weights")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--seed-tasks", type=int, default=2000, help="tasks created before the run for complete/delete/clicks")
+    parser.add_argument("--replay", metavar="FILE", help="replay a SLACK_PAYLOAD_LOG recording instead")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay this many times faster than recorded")
+    parser.add_argument("--limit", type=int, help="replay only the first N payloads")
+    parser.add_argument("--concurrency", type=int, default=10,
+                        help="threads handing payloads to Bolt (Socket Mode's default is 10)")
+    parser.add_argument("--listener-workers", type=int, default=5, help="size of Bolt's listener pool (its default is 5)")
+    parser.add_argument("--slack-latency-ms", type=float, default=80)
+    parser.add_argument("--slack-jitter-ms", type=float, default=20)
+    parser.add_argument("--slack-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=700)
+    parser.add_argument("--llm-jitter-ms", type=float, default=200)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--postgres", metavar="DSN", help="use this Postgres database instead of a throwaway SQLite file")
+    parser.add_argument("--env", action="append", metavar="KEY=VALUE", help="extra app setting, e.g. RATE_LIMIT_COMMAND=1000/60")
+    parser.add_argument("--drain", type=float, default=30.0, help="seconds to wait for in-flight work after the last send")
+    parser.add_argument("--seed", type=int, help="random seed for a repeatable synthetic run")
+    parser.add_argument("--json", metavar="FILE", help="also write the report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's own output")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    users = synthetic_users(args.users)
+    fake_slack = FakeSlack(users, args.slack_latency_ms, args.slack_jitter_ms, args.slack_error_rate)
+    threading.Thread(target=fake_slack.serve_forever, daemon=True, name="fake-slack").start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prepare_environment(args, fake_slack.url, tmp)
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+        with quiet:
+            import logging
+            if not args.verbose:
+                logging.disable(logging.WARNING)
+            config, database, helpers, action_queue = load_app()
+            database.init_db()
+
+            runner = config.slack_app.listener_runner
+            runner.listener_executor = TimedExecutor(
+                ThreadPoolExecutor(max_workers=args.listener_workers, thread_name_prefix="bolt-listener"))
+            runner.listener_error_handler = RecordingErrorHandler(runner.listener_error_handler)
+            helpers.llm_router.providers = [fake_llm_provider(args.llm_latency_ms, args.llm_jitter_ms, args.llm_error_rate)]
+
+            if args.replay:
+                schedule = replay_schedule(args.replay, args.speed, args.rate, args.limit)
+            else:
+                workload = SyntheticWorkload(users, parse_mix(args.mix), database.store, args.seed_tasks)
+                schedule = synthetic_schedule(workload, args.rate or 10.0, args.duration)
+            if not schedule:
+                sys.exit("Nothing to send")
+
+            fake_slack.calls.clear()
+            sampler = ThreadSampler()
+            sampler.start()
+            jobs, send_seconds, wall_seconds = run(config.slack_app, schedule, args.concurrency, args.drain)
+            sampler.stop()
+
+        report = summarize(jobs, send_seconds, wall_seconds)
+        report["resources"] = {
+            "threads_peak": max(sampler.samples, default=None),
+            "threads_mean": round(sum(sampler.samples) / len(sampler.samples), 1) if sampler.samples else None,
+            "threads_by_pool": dict(sampler.peak_by_pool.most_common()),
+            "slack_calls": sum(fake_slack.calls.values()),
+            "slack_errors": sum(fake_slack.errors.values()),
+            "slack_connections": fake_slack.connections,
+            "slack_connections_peak": fake_slack.peak_connections,
+            "slack_client": config.client.metrics(),
+            "llm": helpers.llm_metrics(),
+            "action_queue": action_queue.metrics(),
+        }
+        print_report(report)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2, default=str)
+        database.store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@ from datetime import timedelta, timezone
 from flask import Flask
 from flask_socketio import SocketIO
 from slack_bolt import App
-from slack_sdk import WebClient
+from slack_client import SlackClient
 from google import genai
 from dotenv import load_dotenv
 
@@ -26,6 +26,91 @@ WEB_STYLE_PATH = os.path.join("web", "style")
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Storage backend: "postgres" (DATABASE_URL) or "sqlite" (single node, SQLITE_PATH).
+# Search, archival, export and stats need Postgres.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "postgres")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "tasks.db")
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 20))
+# How long a request waits for a free pooled connection before failing with a 503
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", 5))
+
+# Retention: completed tasks older than this are moved to the archive tables
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 30))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 1000))
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", 3600))
+
+# Recurring tasks: the next occurrence of an overdue series is created once it
+# is within the horizon (completing an occurrence creates the next one at once)
+RECURRENCE_HORIZON_HOURS = int(os.getenv("RECURRENCE_HORIZON_HOURS", 24))
+RECURRENCE_INTERVAL_SECONDS = int(os.getenv("RECURRENCE_INTERVAL_SECONDS", 300))
+
+# LLM due-date extraction: concurrent /addtask texts are sent as one batched request
+LLM_BATCH_WINDOW_MS = int(os.getenv("LLM_BATCH_WINDOW_MS", 50))
+LLM_BATCH_MAX_ITEMS = int(os.getenv("LLM_BATCH_MAX_ITEMS", 16))
+LLM_BATCH_MAX_CONCURRENCY = int(os.getenv("LLM_BATCH_MAX_CONCURRENCY", 4))
+LLM_BATCH_MAX_INPUT_TOKENS = int(os.getenv("LLM_BATCH_MAX_INPUT_TOKENS", 2000))
+LLM_BATCH_OUTPUT_TOKENS_PER_ITEM = int(os.getenv("LLM_BATCH_OUTPUT_TOKENS_PER_ITEM", 80))
+
+# LLM providers: per-call deadline, hedge delay bounds (p95-based) and circuit breaker
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+LLM_DEADLINE_MS = int(os.getenv("LLM_DEADLINE_MS", 2500))
+LLM_HEDGE_MIN_MS = int(os.getenv("LLM_HEDGE_MIN_MS", 300))
+LLM_HEDGE_MAX_MS = int(os.getenv("LLM_HEDGE_MAX_MS", 1500))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", 30))
+
+# Per-user /api/tasks cache. Write paths invalidate exactly the affected users;
+# with TASK_CACHE_NOTIFY the invalidation is broadcast to other worker processes.
+TASK_CACHE_MAX_USERS = int(os.getenv("TASK_CACHE_MAX_USERS", 1000))
+TASK_CACHE_TTL_SECONDS = int(os.getenv("TASK_CACHE_TTL_SECONDS", 60))
+TASK_CACHE_MAX_BYTES = int(os.getenv("TASK_CACHE_MAX_BYTES", 2_000_000))
+TASK_CACHE_NOTIFY = os.getenv("TASK_CACHE_NOTIFY", "1") == "1" and STORAGE_BACKEND == "postgres"
+
+# Admission control, as "<requests>/<seconds>" token buckets. Each policy has a
+# per-user budget (per route/command) and a per-workspace budget.
+# "llm" is due-date extraction; "fanout" is charged per notification recipient,
+# so its per-user capacity must cover MAX_TASK_ASSIGNEES or the largest tasks can never be sent.
+RATE_LIMIT_API = os.getenv("RATE_LIMIT_API", "120/60")
+RATE_LIMIT_API_WORKSPACE = os.getenv("RATE_LIMIT_API_WORKSPACE", "3000/60")
+RATE_LIMIT_COMMAND = os.getenv("RATE_LIMIT_COMMAND", "20/60")
+RATE_LIMIT_COMMAND_WORKSPACE = os.getenv("RATE_LIMIT_COMMAND_WORKSPACE", "600/60")
+RATE_LIMIT_LLM = os.getenv("RATE_LIMIT_LLM", "10/60")
+RATE_LIMIT_LLM_WORKSPACE = os.getenv("RATE_LIMIT_LLM_WORKSPACE", "120/60")
+RATE_LIMIT_FANOUT = os.getenv("RATE_LIMIT_FANOUT", "300/3600")
+RATE_LIMIT_FANOUT_WORKSPACE = os.getenv("RATE_LIMIT_FANOUT_WORKSPACE", "5000/3600")
+
+# /addtask expands <!subteam^...> and <#C...> mentions from a membership index
+# refreshed this often; larger expansions are refused
+MEMBERSHIP_REFRESH_SECONDS = int(os.getenv("MEMBERSHIP_REFRESH_SECONDS", 600))
+MEMBERSHIP_MAX_CHANNELS = int(os.getenv("MEMBERSHIP_MAX_CHANNELS", 500))
+MAX_TASK_ASSIGNEES = int(os.getenv("MAX_TASK_ASSIGNEES", 300))
+
+# Slack button clicks are acked at once and processed by this many background workers
+ACTION_WORKERS = int(os.getenv("ACTION_WORKERS", 4))
+ACTION_QUEUE_MAX = int(os.getenv("ACTION_QUEUE_MAX", 500))
+
+# Users' timezones come from their Slack profile (tz); working hours can be set
+# with /workhours. These apply when neither is known. Lookups are cached this long.
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "Asia/Kolkata")
+DEFAULT_WORK_START = int(os.getenv("DEFAULT_WORK_START", 10))
+DEFAULT_WORK_END = int(os.getenv("DEFAULT_WORK_END", 19))
+USER_CLOCK_TTL_SECONDS = int(os.getenv("USER_CLOCK_TTL_SECONDS", 600))
+
+# Daily reminders: "digest" (one message per user) or "individual" (one per task).
+# Users can override this with /remindermode.
+DEFAULT_REMINDER_MODE = os.getenv("DEFAULT_REMINDER_MODE", "digest")
+
+# Due-time escalation tiers: reminders this many minutes before the due time,
+# a DM to each pending assignee when the task falls overdue, a DM to the
+# creator once it is this many hours overdue (0 turns a tier off) and a daily
+# overdue roll-up to creators at their start of work. Marks passed while the
+# app was down are caught up for ESCALATION_CATCHUP_MINUTES.
+ESCALATION_REMIND_BEFORE_MINUTES = [int(m) for m in os.getenv("ESCALATION_REMIND_BEFORE_MINUTES", "60,30").split(",") if m.strip()]
+ESCALATION_NOTIFY_AT_DUE = os.getenv("ESCALATION_NOTIFY_AT_DUE", "1") == "1"
+ESCALATION_CREATOR_AFTER_HOURS = float(os.getenv("ESCALATION_CREATOR_AFTER_HOURS", 4))
+ESCALATION_DAILY_ROLLUP = os.getenv("ESCALATION_DAILY_ROLLUP", "1") == "1"
+ESCALATION_INTERVAL_SECONDS = int(os.getenv("ESCALATION_INTERVAL_SECONDS", 60))
+ESCALATION_CATCHUP_MINUTES = int(os.getenv("ESCALATION_CATCHUP_MINUTES", 15))
 
 
 
@@ -38,6 +123,21 @@ SLACK_APP_TOKEN = os.getenv("SLACK_APP_TOKEN")
 PUBLIC_HOST = os.getenv("PUBLIC_HOST")
 FLASK_PORT = int(os.getenv("FLASK_PORT", 5000))
 
+# Shared Slack client: HTTP keep-alive pool size, retries after 429s / connect timeouts,
+# and how many DMs post_many() sends in parallel
+SLACK_HTTP_POOL_SIZE = int(os.getenv("SLACK_HTTP_POOL_SIZE", 16))
+SLACK_MAX_RETRIES = int(os.getenv("SLACK_MAX_RETRIES", 3))
+SLACK_FANOUT_WORKERS = int(os.getenv("SLACK_FANOUT_WORKERS", 8))
+# Web API base URL; bench/slack_load.py points it at a local fake Slack
+SLACK_API_URL = os.getenv("SLACK_API_URL", "https://slack.com/api/")
+
+# When set, every slash-command and button payload is appended to this JSONL
+# file (tokens and response URLs removed) for bench/slack_load.py to replay
+SLACK_PAYLOAD_LOG = os.getenv("SLACK_PAYLOAD_LOG")
+
+# Slack user IDs allowed to see team-wide views (comma separated)
+ADMIN_USER_IDS = {u.strip() for u in os.getenv("ADMIN_USER_IDS", "").split(",") if u.strip()}
+
 if not GEMINI_API_KEY:
     raise ValueError("❌ No API key provided. Please set GEMINI_API_KEY in your .env file.")
 
@@ -54,5 +154,8 @@ SECRET_KEY = flask_app.secret_key
 
 socketio = SocketIO(flask_app, cors_allowed_origins="*")
 
-slack_app = App(token=SLACK_BOT_TOKEN)
-client = WebClient(token=SLACK_BOT_TOKEN)
\ No newline at end of file
+# One rate-limit-aware client for all Slack traffic; Bolt listeners get it
+# through the middleware in slack_handlers
+client = SlackClient(token=SLACK_BOT_TOKEN, pool_size=SLACK_HTTP_POOL_SIZE, max_retries=SLACK_MAX_RETRIES,
+                     fanout_workers=SLACK_FANOUT_WORKERS, base_url=SLACK_API_URL)
+slack_app = App(client=client)
\ No newline at end of file
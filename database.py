@@ -1,7 +1,13 @@
+import io
+import re
+import time
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import datetime,timezone,timedelta
-from config import client, IST, DATABASE_URL
+from config import client, socketio, IST, DATABASE_URL, DEFAULT_REMINDER_MODE, STORAGE_BACKEND, SQLITE_PATH, DB_POOL_MAX, DB_POOL_TIMEOUT_SECONDS
+from task_cache import task_list_cache, publish_invalidation
+from storage import create_store
+from recurrence import next_occurrence, advance_rule
 import pytz
 IST = pytz.timezone("Asia/Kolkata")
 
@@ -9,6 +15,20 @@ IST = pytz.timezone("Asia/Kolkata")
 # Cache for usernames
 user_cache = {}
 
+# Task lifecycle queries live in storage.py; the Postgres-only features
+# (search, archival, export, stats) below check store.require() first.
+store = create_store(STORAGE_BACKEND, database_url=DATABASE_URL, sqlite_path=SQLITE_PATH, pool_size=DB_POOL_MAX,
+                     acquire_timeout=DB_POOL_TIMEOUT_SECONDS)
+
+def emit_task_update(user_ids, **update):
+    """
+    Sends a task_update only to the dashboards of `user_ids`: every socket
+    joins the room of its session user (web_routes.join_user_room).
+    """
+    for uid in set(user_ids):
+        if uid:
+            socketio.emit("task_update", update, to=uid)
+
 def get_db_connection():
     """Helper to get a Postgres connection"""
     try:
@@ -20,45 +40,134 @@ def get_db_connection():
     return conn
 
 def init_db():
+    # Tasks, assignments, login tokens and preferences (both backends)
+    store.init_schema()
+    if store.dialect != "postgres":
+        return  # everything below backs the Postgres-only features
+
     # Since you already created tables in PgAdmin, 
     # we can leave this strictly for creating them if they are missing.
-    # Note: syntax for AUTOINCREMENT in Postgres is SERIAL.
     conn = get_db_connection()
     c = conn.cursor()
 
+    # --- Archive tables ---
+    # Completed tasks are moved here by archive_completed_tasks() so the hot
+    # tables only hold active work and recent history.
     c.execute("""
-    CREATE TABLE IF NOT EXISTS tasks (
-        id SERIAL PRIMARY KEY,
+    CREATE TABLE IF NOT EXISTS tasks_archive (
+        id INTEGER PRIMARY KEY,
         user_id TEXT,
         text TEXT,
         created_at TIMESTAMP WITH TIME ZONE,
         due TIMESTAMP WITH TIME ZONE,
         file_url TEXT,
-       done BOOLEAN DEFAULT FALSE,
-       completed_at TIMESTAMP WITH TIME ZONE
+        done BOOLEAN DEFAULT FALSE,
+        completed_at TIMESTAMP WITH TIME ZONE,
+        archived_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
     )
     """)
 
     c.execute("""
-    CREATE TABLE IF NOT EXISTS task_assignments (
-        id SERIAL PRIMARY KEY,
-        task_id INTEGER REFERENCES tasks(id) ON DELETE CASCADE,
+    CREATE TABLE IF NOT EXISTS task_assignments_archive (
+        id INTEGER PRIMARY KEY,
+        task_id INTEGER,
         assigned_to TEXT,
         done BOOLEAN DEFAULT FALSE,
-       completed_at TIMESTAMP WITH TIME ZONE,
+        completed_at TIMESTAMP WITH TIME ZONE,
         remarks TEXT
     )
     """)
 
+    # Columns added to the hot tables after the archive was introduced; archived
+    # occurrences keep their series linkage
+    c.execute("ALTER TABLE tasks_archive ADD COLUMN IF NOT EXISTS recurrence TEXT")
+    c.execute("ALTER TABLE tasks_archive ADD COLUMN IF NOT EXISTS series_id INTEGER")
+    c.execute("ALTER TABLE task_assignments_archive ADD COLUMN IF NOT EXISTS snoozed_until TIMESTAMP WITH TIME ZONE")
+
+    # --- Archive indexes ---
+    c.execute("CREATE INDEX IF NOT EXISTS idx_tasks_archive_user_id ON tasks_archive (user_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_task_assignments_archive_task_id ON task_assignments_archive (task_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_task_assignments_archive_assigned_to ON task_assignments_archive (assigned_to)")
+
+    # --- Stats aggregates ---
+    # Maintained incrementally by the write paths (see stats_* helpers below),
+    # so /api/stats never has to scan task history.
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS user_task_stats (
+        user_id TEXT PRIMARY KEY,
+        assigned_count INTEGER NOT NULL DEFAULT 0,
+        open_count INTEGER NOT NULL DEFAULT 0,
+        completed_count INTEGER NOT NULL DEFAULT 0,
+        completed_on_time_count INTEGER NOT NULL DEFAULT 0,
+        completion_seconds_total DOUBLE PRECISION NOT NULL DEFAULT 0
+    )
+    """)
+
     c.execute("""
-    CREATE TABLE IF NOT EXISTS login_tokens (
-        token_id TEXT PRIMARY KEY,
+    CREATE TABLE IF NOT EXISTS user_task_stats_daily (
         user_id TEXT,
-        expires_at DOUBLE PRECISION
+        day DATE,
+        assigned_count INTEGER NOT NULL DEFAULT 0,
+        completed_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, day)
     )
     """)
 
+    # --- Full-text search ---
+    # tasks.search_vector covers the task text (weight A) and every assignee's
+    # remarks (weight B). Triggers keep it current; a GIN index serves search_tasks().
+    c.execute("ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector TSVECTOR")
+    c.execute("ALTER TABLE tasks_archive ADD COLUMN IF NOT EXISTS search_vector TSVECTOR")
+
+    c.execute("""
+    CREATE OR REPLACE FUNCTION tasks_search_vector_refresh() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', COALESCE(NEW.text, '')), 'A') ||
+            setweight(to_tsvector('english', COALESCE(
+                (SELECT string_agg(remarks, ' ') FROM task_assignments WHERE task_id = NEW.id), ''
+            )), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """)
+    c.execute("DROP TRIGGER IF EXISTS tasks_search_vector_trg ON tasks")
+    c.execute("""
+    CREATE TRIGGER tasks_search_vector_trg
+    BEFORE INSERT OR UPDATE OF text ON tasks
+    FOR EACH ROW EXECUTE FUNCTION tasks_search_vector_refresh()
+    """)
+
+    # Remarks live on the assignment: touching tasks.text re-runs the trigger above
+    c.execute("""
+    CREATE OR REPLACE FUNCTION task_assignments_search_touch() RETURNS trigger AS $$
+    BEGIN
+        UPDATE tasks SET text = text WHERE id = NEW.task_id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """)
+    c.execute("DROP TRIGGER IF EXISTS task_assignments_search_trg ON task_assignments")
+    c.execute("""
+    CREATE TRIGGER task_assignments_search_trg
+    AFTER UPDATE OF remarks ON task_assignments
+    FOR EACH ROW WHEN (NEW.remarks IS DISTINCT FROM OLD.remarks)
+    EXECUTE FUNCTION task_assignments_search_touch()
+    """)
+
+    c.execute("CREATE INDEX IF NOT EXISTS idx_tasks_search_vector ON tasks USING GIN (search_vector)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_tasks_archive_search_vector ON tasks_archive USING GIN (search_vector)")
+
+    # Backfill rows created before the column existed
+    c.execute("UPDATE tasks SET text = text WHERE search_vector IS NULL")
+
     conn.commit()
+
+    # Backfill aggregates the first time they are created on an existing database
+    c.execute("SELECT EXISTS (SELECT 1 FROM user_task_stats)")
+    if not c.fetchone()[0]:
+        rebuild_task_stats(conn)
+
     conn.close()
 
 def get_username(uid):
@@ -74,124 +183,731 @@ def get_username(uid):
     except Exception:
         return uid
 
-def add_task_db(creator, assignees, text, due=None, file_url=None):
+# Cached workspace directory (users.list), shared by the dashboard and bulk import
+USER_DIRECTORY_TTL = 600  # seconds
+_user_directory = {"users": [], "loaded_at": 0.0}
+
+def get_user_directory(force=False):
+    """
+    Active human members as [{"id", "name", "display_name", "handle", "email", "tz"}, ...].
+    Refreshed at most every USER_DIRECTORY_TTL seconds; also warms user_cache.
+    """
+    if not force and _user_directory["users"] and time.time() - _user_directory["loaded_at"] < USER_DIRECTORY_TTL:
+        return _user_directory["users"]
+
+    users = []
+    cursor = None
+    while True:
+        resp = client.users_list(limit=200, cursor=cursor)
+        for member in resp.get("members", []):
+            if member.get("deleted") or member.get("is_bot") or member.get("id") == "USLACKBOT":
+                continue
+            profile = member.get("profile", {})
+            users.append({
+                "id": member["id"],
+                "name": profile.get("real_name") or member.get("name"),
+                "display_name": profile.get("display_name") or member.get("name"),
+                "handle": member.get("name"),
+                "email": profile.get("email"),
+                "tz": member.get("tz"),
+            })
+            user_cache[member["id"]] = profile.get("display_name") or member.get("name")
+        cursor = resp.get("response_metadata", {}).get("next_cursor")
+        if not cursor:
+            break
+
+    _user_directory["users"] = users
+    _user_directory["loaded_at"] = time.time()
+    return users
+
+def add_task_db(creator, assignees, text, due=None, file_url=None, recurrence=None):
+    return add_tasks_bulk([(creator, assignees, text, due, file_url, recurrence)])[0]
+
+def add_tasks_bulk(tasks, chunk_size=500):
+    """
+    Inserts many tasks at once. `tasks` is a list of
+    (creator, assignees, text, due, file_url[, recurrence]) tuples; returns
+    their ids in order.
+
+    Tasks and assignments go in with multi-row inserts (see
+    TaskStore.insert_tasks), one transaction per chunk of `chunk_size` tasks,
+    so a big import neither round-trips per row nor holds one huge transaction.
+    """
     created_at = datetime.now(IST).isoformat()
-    conn = get_db_connection()
-    c = conn.cursor()
-
-    # UPDATED: Use %s and RETURNING id
-    c.execute("""
-    INSERT INTO tasks (user_id, text, created_at, due, file_url)
-    VALUES (%s, %s, %s, %s, %s)
-    RETURNING id
-    """, (creator, text, created_at, due, file_url))
+    task_ids = []
 
-    task_id = c.fetchone()[0]
+    for start in range(0, len(tasks), chunk_size):
+        chunk = tasks[start:start + chunk_size]
+        with store.transaction() as c:
+            ids, assignment_rows = store.insert_tasks(c, chunk, created_at)
+            stats_record_assignments(c, ids)
+            affected = {creator for creator, *_ in chunk} | {user for _, user in assignment_rows}
+            publish_invalidation(c, affected)
+        task_list_cache.invalidate(affected)
+        task_ids.extend(ids)
 
-    for user in assignees:
-        c.execute("""
-        INSERT INTO task_assignments (task_id, assigned_to)
-        VALUES (%s, %s)
-        """, (task_id, user))
-    
-    conn.commit()
-    conn.close()
-    return task_id
+    return task_ids
 
 def complete_task_db(task_id, user_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    # UPDATED: Use %s
-    c.execute("""UPDATE task_assignments 
-                 SET done=1, completed_at=%s 
-                 WHERE task_id=%s AND assigned_to=%s""",
-              (datetime.now(IST), task_id, user_id))
-    conn.commit()
-    conn.close()
+    """Marks one user's assignment done, keeping its remarks."""
+    now = datetime.now(IST)
+    with store.transaction() as c:
+        assignment = store.get_assignment(c, task_id, user_id)
+        if not assignment or assignment[1]:
+            return False
+        store.complete_assignment(c, assignment[0], now)
+        closed, rule = store.close_task_if_done(c, task_id, now)
+        stats_record_completions(c, [assignment[0]])
+        publish_invalidation(c, [user_id])
+        spawned = spawn_next_occurrence(c, task_id, now) if closed and rule else None
+    task_list_cache.invalidate([user_id])
+    if spawned:
+        task_list_cache.invalidate(spawned[1])
+        emit_task_update(spawned[1], task_ids=[spawned[0]])
+    return True
 
 def get_task_db(task_id):
-    conn = get_db_connection()
-    # Use RealDictCursor to access columns by name easily, 
-    # or standard cursor for tuple access (existing code expects tuples in some places)
-    c = conn.cursor() 
-    c.execute("SELECT * FROM tasks WHERE id=%s", (task_id,))
-    row = c.fetchone()
-    conn.close()
-    return row
+    """(id, user_id, text, created_at, due, file_url, done, completed_at, recurrence) or None."""
+    return store.get_task(task_id)
+
+def spawn_next_occurrence(c, head_id, now):
+    """
+    Materializes the occurrence after series head `head_id` on the caller's
+    transaction and moves the (COUNT-advanced) rule onto it. Occurrences
+    missed while nobody completed the head are skipped, not back-filled.
+    Returns (new_task_id, affected_users), or None if the head was already
+    advanced or the series is over. Callers invalidate task_list_cache for
+    affected_users after committing.
+    """
+    head = store.claim_series_head(c, head_id)
+    if not head:
+        return None
+    creator, text, file_url, rule, series_id, due = head
+    due = due or now
+    next_rule = advance_rule(rule)
+    next_due = next_occurrence(rule, due, after=now) if next_rule else None
+    if next_due is None:
+        return None  # the rule is gone from the head, so the series simply ends
+
+    new_id, assignees = store.insert_occurrence(c, head_id, creator, text, now, next_due, file_url,
+                                                next_rule, series_id)
+    stats_record_assignments(c, [new_id])
+    affected = {creator, *assignees}
+    publish_invalidation(c, affected)
+    return new_id, affected
+
+def materialize_due_occurrences(horizon):
+    """
+    Scheduler pass over series heads: once a head is overdue (or done
+    without having spawned), its next occurrence is created as soon as it
+    falls within `horizon` (a timedelta) of now. Returns (new_task_id,
+    affected_users) for each occurrence created.
+    """
+    now = datetime.now(IST)
+    spawned_all = []
+    for head_id, rule, due, done in store.recurring_heads():
+        if not done and (due is None or due > now):
+            continue  # the current occurrence is still open and upcoming
+        upcoming = next_occurrence(rule, due or now, after=now)
+        if upcoming is not None and upcoming > now + horizon:
+            continue
+        with store.transaction() as c:
+            spawned = spawn_next_occurrence(c, head_id, now)
+        if spawned:
+            task_list_cache.invalidate(spawned[1])
+            spawned_all.append(spawned)
+    return spawned_all
+
+def task_row_to_dict(r):
+    """Formats a (id, creator, assignee, text, due, done, created_at, remarks) row for the API."""
+    # Note: Postgres boolean returns True/False. SQLite returned 0/1.
+    # We cast bool(r[5]) to be safe.
+    return {
+        "id": r[0],
+        "creator_id": r[1],
+        "creator": get_username(r[1]),
+        "assigned_to_id": r[2],
+        "assigned_to_name": get_username(r[2]),
+        "text": r[3],
+
+        # Send formatted string directly (no timezone conversion needed)
+        "due": r[4].strftime("%d/%m/%Y %H:%M") if r[4] else "-",
+        "done": bool(r[5]),
+        "created_at": r[6].strftime("%d/%m/%Y %H:%M") if r[6] else "-",
+
+        "remarks": r[7] or "",
+    }
 
 def get_tasks_for_user(uid):
+    """Active work plus recent history. Archived tasks are served by get_archived_tasks_for_user."""
+    return list(iter_tasks_for_user(uid))
+
+def iter_tasks_for_user(uid, batch_size=500, task_ids=None):
+    """
+    Streams the same rows as get_tasks_for_user batch_size rows at a time
+    (short keyset-paged reads on Postgres), so memory stays flat however many
+    tasks the user has. Dates come back formatted by the database and
+    usernames are resolved once per batch. task_ids limits the result to
+    those tasks (used by the dashboard to patch rows after an update).
+    """
+    for rows in store.iter_task_rows_for_user(uid, batch_size=batch_size, task_ids=task_ids):
+        names = {u: get_username(u) for u in {r[1] for r in rows} | {r[2] for r in rows}}
+        for r in rows:
+            yield {
+                "id": r[0],
+                "creator_id": r[1],
+                "creator": names[r[1]],
+                "assigned_to_id": r[2],
+                "assigned_to_name": names[r[2]],
+                "text": r[3],
+                "due": r[4] or "-",
+                "done": bool(r[5]),
+                "created_at": r[6] or "-",
+                "remarks": r[7] or "",
+            }
+
+def get_archived_tasks_for_user(uid, limit=200, before_id=None):
+    """
+    History view over the archive tables, newest first.
+    Paginate with before_id (the smallest id of the previous page).
+    """
+    store.require("archive")
     conn = get_db_connection()
-    # Using tuple cursor to match your existing index-based logic (r[0], r[1]...)
     c = conn.cursor()
-    
-    # UPDATED: Use %s
     c.execute("""
         SELECT t.id, t.user_id, ta.assigned_to, t.text, t.due, ta.done, t.created_at, ta.remarks
-        FROM task_assignments ta
-        JOIN tasks t ON ta.task_id = t.id
-        WHERE ta.assigned_to = %s OR t.user_id = %s
+        FROM task_assignments_archive ta
+        JOIN tasks_archive t ON ta.task_id = t.id
+        WHERE (ta.assigned_to = %s OR t.user_id = %s)
+          AND (%s IS NULL OR t.id < %s)
         ORDER BY t.id DESC
-    """, (uid, uid))
+        LIMIT %s
+    """, (uid, uid, before_id, before_id, limit))
+    rows = c.fetchall()
+    conn.close()
+
+    return [task_row_to_dict(r) for r in rows]
+
+EXPORT_COLUMNS = ("assignment_id", "task_id", "creator_id", "assigned_to", "text", "created_at",
+                  "due", "done", "completed_at", "remarks", "archived")
+
+def export_task_pages(uid=None, fmt="csv", date_from=None, date_to=None, status=None,
+                      include_archived=True, page_size=5000, timezone="Asia/Kolkata"):
+    """
+    Streams task history as CSV or NDJSON bytes, one page at a time.
+
+    Pages are cut by assignment id (keyset pagination), and each page is one
+    short autocommit COPY ... TO STDOUT statement. Postgres does the encoding,
+    memory stays at one page, and no transaction stays open on the hot tables
+    while a slow client drains the response.
+    uid=None exports every user's tasks (team export). Timestamps are
+    written in `timezone` (a tz name); date_from / date_to should be aware.
+    """
+    store.require("export")
+    filters = []
+    params = {"page": page_size}
+    if uid is not None:
+        filters.append("(ta.assigned_to = %(uid)s OR t.user_id = %(uid)s)")
+        params["uid"] = uid
+    if date_from is not None:
+        filters.append("t.created_at >= %(date_from)s")
+        params["date_from"] = date_from
+    if date_to is not None:
+        filters.append("t.created_at < %(date_to)s")
+        params["date_to"] = date_to
+    if status == "pending":
+        filters.append("ta.done = FALSE")
+    elif status == "done":
+        filters.append("ta.done = TRUE")
+    where = "".join(f" AND {f}" for f in filters)
+
+    sources = [("task_assignments", "tasks", "FALSE")]
+    if include_archived:
+        sources.append(("task_assignments_archive", "tasks_archive", "TRUE"))
+
+    def union(select, range_sql):
+        return " UNION ALL ".join(
+            f"SELECT {select.format(archived=archived)} FROM {assign} ta "
+            f"JOIN {tasks} t ON t.id = ta.task_id WHERE {range_sql}{where}"
+            for assign, tasks, archived in sources
+        )
+
+    columns = ("ta.id AS assignment_id, t.id AS task_id, t.user_id AS creator_id, ta.assigned_to, t.text, "
+               "t.created_at, t.due, ta.done, ta.completed_at, ta.remarks, {archived} AS archived")
+    if fmt == "ndjson":
+        # One JSON object per line. The control-character QUOTE/DELIMITER can never
+        # appear in row_to_json output, so COPY passes each line through untouched.
+        copy_sql = ("COPY (SELECT row_to_json(r) FROM ({rows}) r) TO STDOUT "
+                    "WITH (FORMAT csv, QUOTE e'\\x01', DELIMITER e'\\x02')")
+    else:
+        copy_sql = "COPY ({rows}) TO STDOUT WITH (FORMAT csv, HEADER {header})"
+
+    conn = get_db_connection()
+    conn.autocommit = True
+    try:
+        c = conn.cursor()
+        # A plain connection runs in the server's default zone, not the pool's
+        c.execute("SET TIME ZONE %s", (timezone,))
+        after = 0
+        first = True
+        while True:
+            params["after"] = after
+            c.execute(
+                f"SELECT MAX(id) FROM ({union('ta.id', 'ta.id > %(after)s')} ORDER BY 1 LIMIT %(page)s) page",
+                params
+            )
+            upto = c.fetchone()[0]
+            if upto is None:
+                if first and fmt != "ndjson":
+                    yield (",".join(EXPORT_COLUMNS) + "\n").encode("utf-8")
+                break
+
+            params["upto"] = upto
+            rows_sql = union(columns, "ta.id > %(after)s AND ta.id <= %(upto)s") + " ORDER BY assignment_id"
+            sql = copy_sql.format(rows=rows_sql, header="TRUE" if first else "FALSE")
+            buf = io.BytesIO()
+            c.copy_expert(c.mogrify(sql, params).decode("utf-8"), buf)
+            yield buf.getvalue()
+
+            after = upto
+            first = False
+    finally:
+        conn.close()
+
+def archive_completed_tasks(older_than_days, batch_size=1000):
+    """
+    Moves tasks whose assignments were all completed more than `older_than_days`
+    ago into tasks_archive / task_assignments_archive.
+    Works in batches (one short transaction each) so it never holds long locks
+    on the hot tables. Returns the number of tasks archived.
+    """
+    store.require("archive")
+    cutoff = datetime.now(IST) - timedelta(days=older_than_days)
+    total = 0
+
+    while True:
+        conn = get_db_connection()
+        c = conn.cursor()
+        # A single statement: pick a batch, copy assignments and tasks, delete them.
+        # SKIP LOCKED lets the job run alongside user edits without blocking them.
+        c.execute("""
+            WITH victims AS (
+                SELECT t.id
+                FROM tasks t
+                WHERE t.created_at < %s
+                  AND NOT EXISTS (
+                      SELECT 1 FROM task_assignments ta
+                      WHERE ta.task_id = t.id
+                        AND (ta.done = FALSE OR ta.completed_at IS NULL OR ta.completed_at >= %s)
+                  )
+                ORDER BY t.id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            ),
+            moved_assignments AS (
+                DELETE FROM task_assignments ta
+                USING victims v
+                WHERE ta.task_id = v.id
+                RETURNING ta.id, ta.task_id, ta.assigned_to, ta.done, ta.completed_at, ta.remarks, ta.snoozed_until
+            ),
+            archived_assignments AS (
+                INSERT INTO task_assignments_archive (id, task_id, assigned_to, done, completed_at, remarks,
+                                                      snoozed_until)
+                SELECT id, task_id, assigned_to, done, completed_at, remarks, snoozed_until FROM moved_assignments
+            ),
+            moved_tasks AS (
+                DELETE FROM tasks t
+                USING victims v
+                WHERE t.id = v.id
+                RETURNING t.id, t.user_id, t.text, t.created_at, t.due, t.file_url, t.done, t.completed_at,
+                          t.recurrence, t.series_id, t.search_vector
+            ),
+            archived_tasks AS (
+                INSERT INTO tasks_archive (id, user_id, text, created_at, due, file_url, done, completed_at,
+                                           recurrence, series_id, search_vector)
+                SELECT id, user_id, text, created_at, due, file_url, done, completed_at,
+                       recurrence, series_id, search_vector
+                FROM moved_tasks
+            )
+            SELECT (SELECT COUNT(*) FROM moved_tasks),
+                   ARRAY(SELECT user_id FROM moved_tasks UNION SELECT assigned_to FROM moved_assignments)
+        """, (cutoff, cutoff, batch_size))
+        moved, affected_users = c.fetchone()
+        publish_invalidation(c, affected_users)
+        conn.commit()
+        conn.close()
+        task_list_cache.invalidate(affected_users)
+
+        total += moved
+        if moved < batch_size:
+            break
+
+    return total
+
+def set_reminder_mode(uid, mode):
+    store.set_reminder_mode(uid, mode)
+
+def set_work_hours(uid, start, end):
+    store.set_work_hours(uid, start, end, DEFAULT_REMINDER_MODE)
+
+def get_work_hours():
+    """{user_id: (work_start, work_end)} for users who set their own."""
+    return {uid: (start, end) for uid, start, end in store.work_hours()}
+
+def get_pending_tasks_by_assignee(user_ids=None, known_ids=None):
+    """
+    One grouped pass for the daily reminder: every assignee with pending work,
+    their reminder mode, and their tasks as [(task_id, text, due), ...] sorted by due date.
+    user_ids narrows it to those assignees (plus, with known_ids, anyone not in known_ids).
+    """
+    return store.pending_tasks_by_assignee(DEFAULT_REMINDER_MODE, user_ids=user_ids, known_ids=known_ids)
+
+def snooze_task(task_id, user_id, until):
+    """Defers the user's reminders for this task until `until`; False if nothing is pending."""
+    return store.snooze_assignment(task_id, user_id, until)
+
+def take_expired_snoozes():
+    """(task_id, assigned_to, text) for snoozes that have run out; each is returned once."""
+    return store.take_expired_snoozes(datetime.now(IST))
+
+def claim_escalations(tier, notify, since, until, now):
+    """(task_id, recipient, text, pending) for each `notify` recipient newly past `tier`; each is returned once."""
+    return store.claim_escalations(tier, notify, since, until, now)
+
+def release_escalations(claims):
+    """Un-claims (task_id, recipient, tier) rows whose DM failed, so the next pass retries them."""
+    store.release_escalations(claims)
+
+def get_overdue_by_creator(now):
+    """{creator: [(task_id, text, due), ...]} of overdue tasks still waiting on others, oldest first."""
+    overdue = {}
+    for creator, task_id, text, due in store.overdue_by_creator(now):
+        overdue.setdefault(creator, []).append((task_id, text, due))
+    return overdue
+
+def get_task_creator(task_id):
+    """(creator_id, text) or None."""
+    task = store.get_task(task_id)
+    return (task[1], task[2]) if task else None
+
+def create_login_token(token_id, user_id, expires_at):
+    store.create_login_token(token_id, user_id, expires_at)
+
+def consume_login_token(token_id):
+    """One-time use: returns the token's user_id and burns it, or None if used/expired."""
+    return store.consume_login_token(token_id, time.time())
+
+def build_search_query(text):
+    """
+    Turns free text into a prefix-matching tsquery string ("invoice mar" ->
+    "invoice:* & mar:*"). Only word characters survive, so user input can
+    never produce tsquery syntax errors. Returns None if nothing is searchable.
+    """
+    terms = re.findall(r"\w+", text or "")
+    if not terms:
+        return None
+    return " & ".join(f"{t.lower()}:*" for t in terms[:10])
+
+def search_tasks(uid, text, limit=20, include_archived=True):
+    """
+    Ranked full-text search over tasks the user created or is assigned to.
+    Active tasks and (optionally) the archive are searched through their GIN indexes.
+    """
+    store.require("search")
+    tsquery = build_search_query(text)
+    if not tsquery:
+        return []
+
+    archive_sql = """
+        UNION ALL
+        SELECT t.id, t.user_id, t.text, t.due, t.created_at, TRUE AS done, TRUE AS archived,
+               ts_rank(t.search_vector, q) AS rank
+        FROM tasks_archive t, to_tsquery('english', %(q)s) q
+        WHERE t.search_vector @@ q
+          AND (t.user_id = %(uid)s OR EXISTS (
+              SELECT 1 FROM task_assignments_archive ta
+              WHERE ta.task_id = t.id AND ta.assigned_to = %(uid)s))
+    """ if include_archived else ""
+
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute(f"""
+        SELECT id, user_id, text, due, created_at, done, archived, rank FROM (
+            SELECT t.id, t.user_id, t.text, t.due, t.created_at,
+                   NOT EXISTS (SELECT 1 FROM task_assignments p
+                               WHERE p.task_id = t.id AND p.done = FALSE) AS done,
+                   FALSE AS archived,
+                   ts_rank(t.search_vector, q) AS rank
+            FROM tasks t, to_tsquery('english', %(q)s) q
+            WHERE t.search_vector @@ q
+              AND (t.user_id = %(uid)s OR EXISTS (
+                  SELECT 1 FROM task_assignments ta
+                  WHERE ta.task_id = t.id AND ta.assigned_to = %(uid)s))
+            {archive_sql}
+        ) results
+        ORDER BY rank DESC, id DESC
+        LIMIT %(limit)s
+    """, {"q": tsquery, "uid": uid, "limit": limit})
     rows = c.fetchall()
     conn.close()
 
-    # for r in rows:
-    #     print("DB Row:", r)
-    
-    # Note: Postgres boolean returns True/False. SQLite returned 0/1.
-    # We cast bool(r[5]) to be safe.
     return [
-            {
+        {
             "id": r[0],
             "creator_id": r[1],
             "creator": get_username(r[1]),
-            "assigned_to_id": r[2],
-            "assigned_to_name": get_username(r[2]),
-            "text": r[3],
-
-            # Send formatted string directly (no timezone conversion needed)
-            "due": r[4].strftime("%d/%m/%Y %H:%M") if r[4] else "-",
+            "text": r[2],
+            "due": r[3].strftime("%d/%m/%Y %H:%M") if r[3] else "-",
+            "created_at": r[4].strftime("%d/%m/%Y %H:%M") if r[4] else "-",
             "done": bool(r[5]),
-            "created_at": r[6].strftime("%d/%m/%Y %H:%M") if r[6] else "-",
-
-            "remarks": r[7] or "",
+            "archived": bool(r[6]),
+            "rank": float(r[7]),
         }
+        for r in rows
+    ]
 
-    for r in rows
-]
+# --- Stats aggregates ---
+# These helpers run on the caller's cursor so the aggregate update commits
+# atomically with the mutation it describes. All of them are set-based.
 
-def delete_task_internal(task_id, user_id, client, logger):
-    conn = get_db_connection()
+def stats_record_assignments(c, task_ids):
+    """Counts every assignment of freshly created tasks."""
+    if not task_ids or not store.supports("stats"):
+        return
+
+    c.execute("""
+        INSERT INTO user_task_stats (user_id, assigned_count, open_count)
+        SELECT ta.assigned_to, COUNT(*), COUNT(*)
+        FROM task_assignments ta
+        WHERE ta.task_id = ANY(%s)
+        GROUP BY ta.assigned_to
+        ON CONFLICT (user_id) DO UPDATE SET
+            assigned_count = user_task_stats.assigned_count + EXCLUDED.assigned_count,
+            open_count = user_task_stats.open_count + EXCLUDED.open_count
+    """, (list(task_ids),))
+
+    c.execute("""
+        INSERT INTO user_task_stats_daily (user_id, day, assigned_count)
+        SELECT ta.assigned_to, (t.created_at AT TIME ZONE 'Asia/Kolkata')::date, COUNT(*)
+        FROM task_assignments ta
+        JOIN tasks t ON t.id = ta.task_id
+        WHERE ta.task_id = ANY(%s)
+        GROUP BY ta.assigned_to, (t.created_at AT TIME ZONE 'Asia/Kolkata')::date
+        ON CONFLICT (user_id, day) DO UPDATE SET
+            assigned_count = user_task_stats_daily.assigned_count + EXCLUDED.assigned_count
+    """, (list(task_ids),))
+
+def stats_record_completions(c, assignment_ids):
+    """Counts assignments that were just marked done (call after the UPDATE)."""
+    if not assignment_ids or not store.supports("stats"):
+        return
+
+    c.execute("""
+        INSERT INTO user_task_stats (user_id, open_count, completed_count,
+                                     completed_on_time_count, completion_seconds_total)
+        SELECT ta.assigned_to,
+               -COUNT(*),
+               COUNT(*),
+               COUNT(*) FILTER (WHERE t.due IS NULL OR ta.completed_at <= t.due),
+               COALESCE(SUM(EXTRACT(EPOCH FROM ta.completed_at - t.created_at)), 0)
+        FROM task_assignments ta
+        JOIN tasks t ON t.id = ta.task_id
+        WHERE ta.id = ANY(%s)
+        GROUP BY ta.assigned_to
+        ON CONFLICT (user_id) DO UPDATE SET
+            open_count = user_task_stats.open_count + EXCLUDED.open_count,
+            completed_count = user_task_stats.completed_count + EXCLUDED.completed_count,
+            completed_on_time_count = user_task_stats.completed_on_time_count + EXCLUDED.completed_on_time_count,
+            completion_seconds_total = user_task_stats.completion_seconds_total + EXCLUDED.completion_seconds_total
+    """, (list(assignment_ids),))
+
+    c.execute("""
+        INSERT INTO user_task_stats_daily (user_id, day, completed_count)
+        SELECT ta.assigned_to, (ta.completed_at AT TIME ZONE 'Asia/Kolkata')::date, COUNT(*)
+        FROM task_assignments ta
+        WHERE ta.id = ANY(%s)
+        GROUP BY ta.assigned_to, (ta.completed_at AT TIME ZONE 'Asia/Kolkata')::date
+        ON CONFLICT (user_id, day) DO UPDATE SET
+            completed_count = user_task_stats_daily.completed_count + EXCLUDED.completed_count
+    """, (list(assignment_ids),))
+
+def stats_forget_task(c, task_id):
+    """Reverses a task's contribution to the aggregates (call before deleting it)."""
+    if not store.supports("stats"):
+        return
+
+    c.execute("""
+        INSERT INTO user_task_stats (user_id, assigned_count, open_count, completed_count,
+                                     completed_on_time_count, completion_seconds_total)
+        SELECT ta.assigned_to,
+               -COUNT(*),
+               -COUNT(*) FILTER (WHERE NOT ta.done),
+               -COUNT(*) FILTER (WHERE ta.done),
+               -COUNT(*) FILTER (WHERE ta.done AND (t.due IS NULL OR ta.completed_at <= t.due)),
+               -COALESCE(SUM(EXTRACT(EPOCH FROM ta.completed_at - t.created_at)) FILTER (WHERE ta.done), 0)
+        FROM task_assignments ta
+        JOIN tasks t ON t.id = ta.task_id
+        WHERE ta.task_id = %s
+        GROUP BY ta.assigned_to
+        ON CONFLICT (user_id) DO UPDATE SET
+            assigned_count = user_task_stats.assigned_count + EXCLUDED.assigned_count,
+            open_count = user_task_stats.open_count + EXCLUDED.open_count,
+            completed_count = user_task_stats.completed_count + EXCLUDED.completed_count,
+            completed_on_time_count = user_task_stats.completed_on_time_count + EXCLUDED.completed_on_time_count,
+            completion_seconds_total = user_task_stats.completion_seconds_total + EXCLUDED.completion_seconds_total
+    """, (task_id,))
+
+    c.execute("""
+        INSERT INTO user_task_stats_daily (user_id, day, assigned_count, completed_count)
+        SELECT user_id, day, SUM(assigned), SUM(completed)
+        FROM (
+            SELECT ta.assigned_to AS user_id,
+                   (t.created_at AT TIME ZONE 'Asia/Kolkata')::date AS day,
+                   -1 AS assigned, 0 AS completed
+            FROM task_assignments ta
+            JOIN tasks t ON t.id = ta.task_id
+            WHERE ta.task_id = %s
+            UNION ALL
+            SELECT ta.assigned_to,
+                   (ta.completed_at AT TIME ZONE 'Asia/Kolkata')::date,
+                   0, -1
+            FROM task_assignments ta
+            WHERE ta.task_id = %s AND ta.done AND ta.completed_at IS NOT NULL
+        ) deltas
+        GROUP BY user_id, day
+        ON CONFLICT (user_id, day) DO UPDATE SET
+            assigned_count = user_task_stats_daily.assigned_count + EXCLUDED.assigned_count,
+            completed_count = user_task_stats_daily.completed_count + EXCLUDED.completed_count
+    """, (task_id, task_id))
+
+def rebuild_task_stats(conn=None):
+    """
+    Recomputes the aggregates from scratch over the hot and archive tables.
+    Used for the initial backfill and as a repair tool; normal operation
+    relies on the incremental stats_* helpers.
+    """
+    store.require("stats")
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
     c = conn.cursor()
-    
-    # UPDATED: Use %s
-    c.execute("SELECT id, user_id, text FROM tasks WHERE id=%s", (task_id,))
-    row = c.fetchone()
 
-    if not row:
+    c.execute("DELETE FROM user_task_stats")
+    c.execute("DELETE FROM user_task_stats_daily")
+
+    history = """
+        SELECT ta.assigned_to, ta.done, ta.completed_at, t.created_at, t.due
+        FROM task_assignments ta JOIN tasks t ON t.id = ta.task_id
+        UNION ALL
+        SELECT ta.assigned_to, ta.done, ta.completed_at, t.created_at, t.due
+        FROM task_assignments_archive ta JOIN tasks_archive t ON t.id = ta.task_id
+    """
+
+    c.execute(f"""
+        INSERT INTO user_task_stats (user_id, assigned_count, open_count, completed_count,
+                                     completed_on_time_count, completion_seconds_total)
+        SELECT h.assigned_to,
+               COUNT(*),
+               COUNT(*) FILTER (WHERE NOT h.done),
+               COUNT(*) FILTER (WHERE h.done),
+               COUNT(*) FILTER (WHERE h.done AND (h.due IS NULL OR h.completed_at <= h.due)),
+               COALESCE(SUM(EXTRACT(EPOCH FROM h.completed_at - h.created_at)) FILTER (WHERE h.done), 0)
+        FROM ({history}) h
+        WHERE h.assigned_to IS NOT NULL
+        GROUP BY h.assigned_to
+    """)
+
+    c.execute(f"""
+        INSERT INTO user_task_stats_daily (user_id, day, assigned_count, completed_count)
+        SELECT user_id, day, SUM(assigned), SUM(completed)
+        FROM (
+            SELECT h.assigned_to AS user_id, (h.created_at AT TIME ZONE 'Asia/Kolkata')::date AS day,
+                   1 AS assigned, 0 AS completed
+            FROM ({history}) h
+            WHERE h.assigned_to IS NOT NULL AND h.created_at IS NOT NULL
+            UNION ALL
+            SELECT h.assigned_to, (h.completed_at AT TIME ZONE 'Asia/Kolkata')::date, 0, 1
+            FROM ({history}) h
+            WHERE h.assigned_to IS NOT NULL AND h.done AND h.completed_at IS NOT NULL
+        ) deltas
+        GROUP BY user_id, day
+    """)
+
+    conn.commit()
+    if own_conn:
         conn.close()
-        logger.error(f"Delete internal failed: Task {task_id} not found")
-        return False
 
-    _, creator_id, task_text = row
+def get_user_stats(user_ids=None):
+    """
+    Per-assignee aggregates. Reads the summary table plus an overdue count
+    that only touches pending assignments (via the pending partial index).
+    user_ids=None returns every user (team view).
+    """
+    store.require("stats")
+    conn = get_db_connection()
+    c = conn.cursor()
 
-    c.execute("SELECT assigned_to FROM task_assignments WHERE task_id=%s", (task_id,))
-    assignees = [r[0] for r in c.fetchall()]
+    c.execute("""
+        SELECT s.user_id, s.assigned_count, s.open_count, s.completed_count,
+               s.completed_on_time_count, s.completion_seconds_total,
+               COALESCE(o.overdue_count, 0)
+        FROM user_task_stats s
+        LEFT JOIN (
+            SELECT ta.assigned_to, COUNT(*) AS overdue_count
+            FROM task_assignments ta
+            JOIN tasks t ON t.id = ta.task_id
+            WHERE ta.done = FALSE AND t.due < NOW()
+              AND (%s IS NULL OR ta.assigned_to = ANY(%s::text[]))
+            GROUP BY ta.assigned_to
+        ) o ON o.assigned_to = s.user_id
+        WHERE %s IS NULL OR s.user_id = ANY(%s::text[])
+        ORDER BY s.open_count DESC, s.user_id
+    """, (user_ids, user_ids, user_ids, user_ids))
+    rows = c.fetchall()
     conn.close()
+    return rows
 
-    if user_id != creator_id and user_id not in assignees:
-        logger.error("Permission denied for delete (internal call).")
-        return False
+def get_stats_series(user_ids=None, days=30, bucket="day"):
+    """Assigned/completed counts per day or ISO week over the last `days` days."""
+    if bucket not in ("day", "week"):
+        raise ValueError("bucket must be 'day' or 'week'")
+    store.require("stats")
 
+    since = (datetime.now(IST) - timedelta(days=days)).date()
     conn = get_db_connection()
     c = conn.cursor()
-    # UPDATED: Use %s
-    c.execute("DELETE FROM tasks WHERE id=%s", (task_id,))
-    # Note: If you set up ON DELETE CASCADE in Postgres, the next line is optional,
-    # but keeping it is safer if you didn't set up cascades.
-    c.execute("DELETE FROM task_assignments WHERE task_id=%s", (task_id,))
-    conn.commit()
+    c.execute(f"""
+        SELECT date_trunc('{bucket}', day)::date AS bucket,
+               SUM(assigned_count), SUM(completed_count)
+        FROM user_task_stats_daily
+        WHERE day >= %s AND (%s IS NULL OR user_id = ANY(%s::text[]))
+        GROUP BY 1
+        ORDER BY 1
+    """, (since, user_ids, user_ids))
+    rows = c.fetchall()
     conn.close()
+    return rows
+
+def delete_task_internal(task_id, user_id, client, logger):
+    task = store.get_task_participants(task_id)
+    if not task:
+        logger.error(f"Delete internal failed: Task {task_id} not found")
+        return False
+
+    creator_id, task_text, assignees = task
+
+    if user_id != creator_id and user_id not in assignees:
+        logger.error("Permission denied for delete (internal call).")
+        return False
+
+    with store.transaction() as c:
+        stats_forget_task(c, task_id)
+        store.delete_task(c, task_id)
+        publish_invalidation(c, [creator_id] + assignees)
+    task_list_cache.invalidate([creator_id] + assignees)
+
+    # Dashboards drop just this task's rows
+    emit_task_update([creator_id] + assignees, deleted_ids=[task_id])
 
     
 
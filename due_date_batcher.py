@@ -0,0 +1,151 @@
+import json
+import re
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+def estimate_tokens(text):
+    """Rough token estimate (~4 chars per token), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+class DueDateBatcher:
+    """
+    Collects due-date extraction requests from concurrent commands and sends
+    them to the LLM as one structured request.
+
+    A batch is flushed when `window_ms` has passed since its first item, when it
+    holds `max_items` texts, or when adding another text would exceed
+    `max_input_tokens`. At most `max_concurrency` batches are in flight at once.
+
+    Items carry a hashable `context` (the user's timezone and working hours)
+    and a batch only ever holds one context, since the prompt states "now"
+    once; an item with another context starts the next batch.
+
+    `build_prompt(texts, context)` must ask for {"results": [{"index": i, ...}, ...]}
+    and `complete(prompt, max_tokens)` must return (raw_text, total_tokens_used).
+    """
+
+    def __init__(self, complete, build_prompt, window_ms=50, max_items=16,
+                 max_concurrency=4, max_input_tokens=2000, output_tokens_per_item=80):
+        self.complete = complete
+        self.build_prompt = build_prompt
+        self.window = window_ms / 1000.0
+        self.max_items = max_items
+        self.max_input_tokens = max_input_tokens
+        self.output_tokens_per_item = output_tokens_per_item
+
+        self._queue = queue.Queue()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm-batch")
+        self._lock = threading.Lock()
+        self._metrics = {"requests": 0, "items": 0, "tokens": 0, "failures": 0}
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._collect_loop, daemon=True, name="llm-batcher")
+                    self._thread.start()
+
+    def submit(self, task_text, context=None):
+        """Queues a text and returns a Future resolving to its parsed result dict."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((task_text, future, context))
+        return future
+
+    def extract(self, task_text, context=None, timeout=None):
+        """Blocking helper: submit and wait for this text's own result."""
+        return self.submit(task_text, context).result(timeout=timeout)
+
+    def metrics(self):
+        with self._lock:
+            m = dict(self._metrics)
+        m["avg_batch_size"] = round(m["items"] / m["requests"], 2) if m["requests"] else 0
+        return m
+
+    # --- Internals ---
+
+    def _collect_loop(self):
+        carry = None
+        while True:
+            first = carry or self._queue.get()
+            carry = None
+            batch = [first]
+            budget = estimate_tokens(first[0])
+            deadline = time.monotonic() + self.window
+
+            while len(batch) < self.max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                cost = estimate_tokens(item[0])
+                if budget + cost > self.max_input_tokens or item[2] != first[2]:
+                    carry = item  # starts the next batch
+                    break
+                batch.append(item)
+                budget += cost
+
+            # Back-pressure: wait for a free slot instead of piling up requests
+            self._slots.acquire()
+            self._executor.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch):
+        try:
+            texts = [text for text, _, _ in batch]
+            raw, tokens = self.complete(
+                self.build_prompt(texts, batch[0][2]),
+                max_tokens=self.output_tokens_per_item * len(batch)
+            )
+            results = self._parse(raw)
+
+            with self._lock:
+                self._metrics["requests"] += 1
+                self._metrics["items"] += len(batch)
+                self._metrics["tokens"] += tokens or 0
+
+            for index, (_, future, _) in enumerate(batch):
+                if index in results:
+                    future.set_result(results[index])
+                else:
+                    future.set_exception(ValueError(f"LLM returned no result for batch item {index}"))
+        except Exception as e:
+            logging.exception("Batched due-date extraction failed")
+            with self._lock:
+                self._metrics["failures"] += 1
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _parse(raw):
+        """Returns {index: result_dict} from the model's JSON reply."""
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            # Tolerate markdown fences or chatter around the JSON
+            match = re.search(r"[\[{].*[\]}]", raw, re.DOTALL)
+            data = json.loads(match.group(0) if match else raw)
+        items = data.get("results", []) if isinstance(data, dict) else data
+
+        results = {}
+        for position, item in enumerate(items):
+            if not isinstance(item, dict):
+                continue
+            try:
+                index = int(item.get("index", position))
+            except (TypeError, ValueError):
+                index = position
+            results[index] = item
+        return results
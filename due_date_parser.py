@@ -0,0 +1,285 @@
+import re
+import calendar
+from datetime import datetime, timedelta, time as dtime
+
+# --- CONFIG ---
+# Defaults only; callers pass the user's own working hours (see user_clock.py)
+OFFICE_START = 10  # 10 AM
+OFFICE_END = 19    # 7 PM
+
+def parse_flexible_time(time_str):
+    """
+    Tries multiple formats to prevent crashing if LLM gives '2:30 PM' 
+    instead of '14:30' or '2.30'.
+    Returns a datetime.time object or None.
+    """
+    if not time_str: return None
+    
+    # Clean string: "2.30" -> "2:30", " 02:30 " -> "02:30"
+    t_str = time_str.strip().replace(".", ":").upper()
+    
+    formats = ["%H:%M", "%I:%M %p", "%I:%M%p", "%H %M"]
+    
+    for fmt in formats:
+        try:
+            return datetime.strptime(t_str, fmt).time()
+        except ValueError:
+            continue
+    return None
+
+def resolve_due_date(data, task_text, now, office_start=OFFICE_START):
+    """
+    Turns one LLM result dict into (due, cleaned_text), `due` being an aware
+    datetime in the user's timezone, applying the weekday, office-hour,
+    past-time and year-rollover rules. `now` is in the user's timezone and
+    `office_start` is their working-day start hour.
+
+    >>> from datetime import timezone
+    >>> now = datetime(2026, 12, 31, 14, 0, tzinfo=timezone.utc)
+    >>> resolve_due_date({"time": "13:00"}, "before 1.00pm", now)[0].isoformat()
+    '2027-01-01T13:00:00+00:00'
+    >>> resolve_due_date({"date": "03/01", "time": "15:00"}, "call by 3/1", now)[0].isoformat()
+    '2027-01-03T15:00:00+00:00'
+    """
+    IST = now.tzinfo
+
+    # 3. Extract Fields
+    date_str = (data.get("date") or "").strip()
+    time_str = (data.get("time") or "").strip()
+    day_str = (data.get("day") or "").strip()
+    explicit_today = data.get("explicit_today", False)
+    explicit_meridiem = data.get("explicit_meridiem", False)
+    cleaned_text = (data.get("text") or task_text).strip()
+
+    # 4. Resolve Date
+    final_date = None
+    
+    # A. If date string exists (e.g., "01/12" or "01/12/2025")
+    if date_str:
+        clean_date = date_str.replace(":", "/").replace("-", "/")
+        try:
+            final_date = datetime.strptime(clean_date, "%d/%m/%Y").date()
+        except ValueError:
+            try:
+                final_date = datetime.strptime(f"{clean_date}/{now.year}", "%d/%m/%Y").date()
+                # "3/1" said in December means next January
+                if final_date < now.date():
+                    final_date = final_date.replace(year=now.year + 1)
+            except ValueError:
+                pass # Fall back to the logic below
+
+    # B. If no date, but weekday provided
+    if not final_date and day_str:
+        weekday_map = {day.lower(): i for i, day in enumerate(calendar.day_name)}
+        if day_str.lower() in weekday_map:
+            target_idx = weekday_map[day_str.lower()]
+            today_idx = now.weekday()
+            days_ahead = target_idx - today_idx
+            if days_ahead <= 0: days_ahead += 7
+            final_date = (now + timedelta(days=days_ahead)).date()
+
+    # C. Default to Today
+    if not final_date:
+        final_date = now.date()
+
+    # 5. Resolve Time & Apply Office Logic
+    final_time = parse_flexible_time(time_str)
+    
+     # If no time found, default to end of day
+    if not final_time:
+        final_time = dtime(23, 59)
+
+
+    dt = datetime.combine(final_date, final_time)
+    dt = IST.localize(dt) if hasattr(IST, "localize") else dt.replace(tzinfo=IST)
+
+    # --- OFFICE HOUR LOGIC ---
+    # If user says "230", LLM likely returns "02:30".
+    # We assume they mean PM if it's currently Office Hours or if 2:30 AM is absurd.
+    # A written "9am" is kept as it is.
+    if dt.hour < office_start and not explicit_meridiem:
+        # Shift +12 hours (e.g., 02:30 -> 14:30)
+        dt_pm = dt + timedelta(hours=12)
+        
+        # Use PM version if:
+        # 1. User specifically said "today" (so we must stay on today)
+        # 2. OR if extracting 2:30 AM would put us in the past (and PM fixes it)
+        if explicit_today:
+            dt = dt_pm
+        elif dt < now and dt_pm > now:
+            dt = dt_pm
+        elif dt.hour < 7: # Even if not "today", assume nobody means a 2 AM (or 6:45 AM) deadline
+            dt = dt_pm
+
+    # --- PAST TIME CHECK ---
+    # If extracted time is still in the past (e.g. 10:00 AM today, but it's 2:00 PM)
+    # AND user didn't write "today" explicitly -> Move to Tomorrow
+    if dt < now and not explicit_today:
+        dt = dt + timedelta(days=1)
+
+    return dt, cleaned_text
+
+
+# --- Local (no-LLM) parser ---
+# Used when every LLM provider is down or over its deadline. Understands the
+# same inputs the prompt lists: today/tomorrow, weekdays, literal dates and
+# sloppy times ("230", "530pm", "2:30 pm", "EOD"). Returns a dict shaped like an
+# LLM result, or None if the text holds no date or time at all.
+
+MONTHS = {m.lower(): i for i, m in enumerate(calendar.month_abbr) if m}
+WEEKDAYS = {d.lower(): d for d in calendar.day_name}
+WEEKDAYS.update({d[:3].lower(): d for d in calendar.day_name})
+
+_CONNECTOR = r"(?:\b(?:by|at|on|before|until|till|due)\s+)?"
+_DAY_WORD_RE = re.compile(_CONNECTOR + r"\b(today|tonight|tomorrow|tmrw|tmr)\b", re.I)
+_WEEKDAY_RE = re.compile(_CONNECTOR + r"\b(?:next\s+)?(" + "|".join(sorted(WEEKDAYS, key=len, reverse=True)) + r")\b", re.I)
+_NUMERIC_DATE_RE = re.compile(_CONNECTOR + r"\b(\d{1,2})([/\-.])(\d{1,2})(?:[/\-.](\d{2,4}))?\b")
+_MONTH_DATE_RE = re.compile(
+    _CONNECTOR + r"\b(?:(\d{1,2})(?:st|nd|rd|th)?\s+(" + "|".join(MONTHS) + r")[a-z]*"
+    r"|(" + "|".join(MONTHS) + r")[a-z]*\s+(\d{1,2})(?:st|nd|rd|th)?)\b", re.I)
+_EOD_RE = re.compile(_CONNECTOR + r"\b(eod|end of (?:the )?day)\b", re.I)
+_CLOCK_RE = re.compile(_CONNECTOR + r"\b(\d{1,2})([:.])(\d{2})\s*(am|pm)?\b", re.I)
+_MERIDIEM_RE = re.compile(_CONNECTOR + r"\b(\d{1,4})\s*(am|pm)\b", re.I)
+# Not "by 4 January": a number followed by a month is a date
+_BARE_TIME_RE = re.compile(r"(?:\b(?:by|at|before|until|till)|@)\s*(\d{1,2}\s\d{2}|\d{1,4})\b(?![/\-.:]\d)"
+                           r"(?!(?:st|nd|rd|th)?\s+(?:" + "|".join(MONTHS) + r"))", re.I)
+
+def _split_digits(digits):
+    """'230' -> (2, 30), '1130' -> (11, 30), '9' -> (9, 0)."""
+    if len(digits) <= 2:
+        return int(digits), 0
+    return int(digits[:-2]), int(digits[-2:])
+
+def _has_connector(match):
+    return not match.group(0)[:1].isdigit()
+
+def _looks_like_date(match, text):
+    """A dotted "17.10" / "17.10.2026" without am/pm is a date, unless it follows "at"."""
+    day, sep, month, meridiem = match.group(1, 2, 3, 4)
+    if sep != "." or meridiem:
+        return False
+    if re.match(r"[/\-.]\d", text[match.end():]):
+        return True
+    return 1 <= int(day) <= 31 and 1 <= int(month) <= 12 and not match.group(0).lower().startswith("at")
+
+def _to_24h(hour, minute, meridiem):
+    if meridiem:
+        meridiem = meridiem.lower()
+        if meridiem == "pm" and hour < 12:
+            hour += 12
+        elif meridiem == "am" and hour == 12:
+            hour = 0
+    if not (0 <= hour <= 23 and 0 <= minute <= 59):
+        return None
+    return f"{hour:02d}:{minute:02d}"
+
+def parse_due_text(task_text, now, office_start=OFFICE_START, office_end=OFFICE_END):
+    text = task_text
+    date_str = time_str = day_str = ""
+    explicit_today = explicit_meridiem = False
+
+    def cut(match):
+        nonlocal text
+        text = text[:match.start()] + " " + text[match.end():]
+
+    m = _EOD_RE.search(text)
+    if m:
+        time_str = f"{office_end - 1:02d}:30"  # half an hour before the day ends
+        cut(m)
+
+    if not time_str:
+        for regex in (_CLOCK_RE, _MERIDIEM_RE, _BARE_TIME_RE):
+            # The first match may not be a time ("on 14.10 at 2:00 PM"), so try each
+            for m in regex.finditer(text):
+                if regex is _CLOCK_RE:
+                    if _looks_like_date(m, text):
+                        continue
+                    meridiem = m.group(4)
+                    time_str = _to_24h(int(m.group(1)), int(m.group(3)), meridiem)
+                else:
+                    meridiem = m.group(2) if regex is _MERIDIEM_RE else None
+                    hour, minute = _split_digits(m.group(1).replace(" ", ""))
+                    time_str = _to_24h(hour, minute, meridiem)
+                if time_str:
+                    explicit_meridiem = bool(meridiem)
+                    cut(m)
+                    break
+                time_str = ""
+            if time_str:
+                break
+
+    m = _DAY_WORD_RE.search(text)
+    if m:
+        word = m.group(1).lower()
+        target = now if word in ("today", "tonight") else now + timedelta(days=1)
+        explicit_today = target is now
+        date_str = target.strftime("%d/%m/%Y")
+        cut(m)
+
+    if not date_str:
+        for m in _NUMERIC_DATE_RE.finditer(text):
+            # "ship the 1.4 hotfix": a dotted date needs "by" / "on" / ... in front
+            if m.group(2) == "." and not _has_connector(m):
+                continue
+            day, month = int(m.group(1)), int(m.group(3))
+            year = int(m.group(4)) if m.group(4) else now.year
+            if year < 100:
+                year += 2000
+            try:
+                candidate = datetime(year, month, day)
+            except ValueError:
+                continue
+            # Without a year, a date already past this year means next year
+            if not m.group(4) and candidate.date() < now.date():
+                candidate = candidate.replace(year=now.year + 1)
+            date_str = candidate.strftime("%d/%m/%Y")
+            cut(m)
+            break
+
+    if not date_str:
+        m = _MONTH_DATE_RE.search(text)
+        if m:
+            day = int(m.group(1) or m.group(4))
+            month = MONTHS[(m.group(2) or m.group(3))[:3].lower()]
+            try:
+                candidate = datetime(now.year, month, day)
+                # "3 Jan" said in December means next year
+                if candidate.date() < now.date():
+                    candidate = candidate.replace(year=now.year + 1)
+                date_str = candidate.strftime("%d/%m/%Y")
+                cut(m)
+            except ValueError:
+                pass
+
+    if not date_str:
+        m = _WEEKDAY_RE.search(text)
+        if m:
+            day_str = WEEKDAYS[m.group(1).lower()]
+            cut(m)
+
+    if not (date_str or time_str or day_str):
+        return None
+
+    # Rule 4 of the prompt: a date without a time means office start
+    if not time_str:
+        time_str = f"{office_start:02d}:00"
+
+    return {
+        "date": date_str,
+        "time": time_str,
+        "day": day_str,
+        "explicit_today": explicit_today,
+        "explicit_meridiem": explicit_meridiem,
+        "text": re.sub(r"\s+", " ", text).strip(" ,.-") or task_text,
+    }
+
+def local_due_date(task_text, now, office_start=OFFICE_START, office_end=OFFICE_END):
+    """
+    The whole no-LLM path: parse_due_text + resolve_due_date, or 24 hours
+    from `now` when the text holds no date or time (rule 3 of the prompt).
+    Same return shape as resolve_due_date.
+    """
+    data = parse_due_text(task_text, now, office_start=office_start, office_end=office_end)
+    if data:
+        return resolve_due_date(data, task_text, now, office_start=office_start)
+    return now + timedelta(hours=24), task_text
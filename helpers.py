@@ -1,42 +1,34 @@
 import json
 import time
 import logging
-import calendar
 import pytz
-import re
-import json
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, time as dtime
 from dateparser.search import search_dates
 from google.genai import types
 # from prompt_file import get_prompt
 from groq import Groq
-from config import IST,  gemini_client, client, socketio, GROQ_API_KEY,DATABASE_URL
-from database import get_username, get_task_db, add_task_db, delete_task_internal,get_db_connection
-
-groq_client = Groq(api_key=GROQ_API_KEY)
-
-
-# --- CONFIG ---
-OFFICE_START = 10  # 10 AM
-OFFICE_END = 19    # 7 PM
-
-def get_prompt(task_text):
-    IST = pytz.timezone("Asia/Kolkata")
-    now = datetime.now(IST).replace(second=0, microsecond=0)
-    
-    prompt = f"""
-You are an expert date-time extraction engine.
-
-📌 CURRENT DATETIME (IST)
-- Now: {now.strftime("%d/%m/%Y %H:%M")}
-- Today: {now.strftime("%d/%m")}
-- Weekday: {now.strftime("%A")}
-
-
-"{task_text}"
-
-Your job is to extract the EXACT deadline (date + time) from the text.
-
+from config import IST,  gemini_client, client, GROQ_API_KEY,DATABASE_URL, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, ARCHIVE_INTERVAL_SECONDS
+from config import RECURRENCE_HORIZON_HOURS, RECURRENCE_INTERVAL_SECONDS, PUBLIC_HOST
+from config import ESCALATION_REMIND_BEFORE_MINUTES, ESCALATION_NOTIFY_AT_DUE, ESCALATION_CREATOR_AFTER_HOURS, ESCALATION_DAILY_ROLLUP, ESCALATION_INTERVAL_SECONDS, ESCALATION_CATCHUP_MINUTES
+from config import LLM_BATCH_WINDOW_MS, LLM_BATCH_MAX_ITEMS, LLM_BATCH_MAX_CONCURRENCY, LLM_BATCH_MAX_INPUT_TOKENS, LLM_BATCH_OUTPUT_TOKENS_PER_ITEM
+from config import LLM_DEADLINE_MS, LLM_HEDGE_MIN_MS, LLM_HEDGE_MAX_MS, LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN_SECONDS, GEMINI_MODEL
+from due_date_batcher import DueDateBatcher
+from slack_client import set_lane
+from task_cache import task_list_cache, publish_invalidation
+from llm_providers import LLMRouter, GroqProvider, GeminiProvider, CircuitBreaker
+from due_date_parser import resolve_due_date, local_due_date
+from user_clock import user_clocks
+from database import store, get_username, get_task_db, add_task_db, delete_task_internal, archive_completed_tasks, stats_record_completions, get_pending_tasks_by_assignee, spawn_next_occurrence, materialize_due_occurrences, snooze_task, take_expired_snoozes, emit_task_update
+from database import claim_escalations, release_escalations, get_overdue_by_creator
+
+# Retries are handled by the router (failover/hedging), not by the SDK
+groq_client = Groq(api_key=GROQ_API_KEY, max_retries=0)
+
+
+GROQ_MODEL = "llama-3.1-8b-instant"
+
+# Shared by the single-task and batched prompts
+DUE_DATE_RULES = """
 ---------------- RULES ----------------
 
 1. **Date Formats Allowed**
@@ -57,7 +49,7 @@ Your job is to extract the EXACT deadline (date + time) from the text.
    Example: If now = 02 Dec 3:19 PM → return = 03 Dec 3:19 PM
 
 4. **IF DATE IS PROVIDED BUT NO TIME**
-   → Default time = **10:00 AM** (office start)
+   → Default time = **{office_start}** (office start)
 
 5. **IF TIME IS PROVIDED BUT NO DATE**
    → Use TODAY  
@@ -66,7 +58,35 @@ Your job is to extract the EXACT deadline (date + time) from the text.
 6. Convert everything to:
    - Date: DD/MM/YYYY
    - Time: HH:MM (24-hour format)
+"""
+
+def prompt_context(clock, now=None):
+    """
+    (now in the user's timezone, their rules text); the batcher's per-zone
+    context. `now` pins the current time (bench/due_date_bench.py replays
+    labelled cases at their own "now").
+    """
+    clock = clock or user_clocks.default
+    now = now or datetime.now(clock.tz).replace(second=0, microsecond=0)
+    rules = DUE_DATE_RULES.format(office_start=dtime(clock.work_start).strftime("%I:%M %p"))
+    return now, rules
+
+def get_prompt(task_text, clock=None, now=None):
+    now, rules = prompt_context(clock, now)
+    
+    prompt = f"""
+You are an expert date-time extraction engine.
+
+📌 CURRENT DATETIME ({now.strftime("%Z")})
+- Now: {now.strftime("%d/%m/%Y %H:%M")}
+- Today: {now.strftime("%d/%m")}
+- Weekday: {now.strftime("%A")}
+
+
+"{task_text}"
 
+Your job is to extract the EXACT deadline (date + time) from the text.
+{rules}
 7. Return ONLY valid JSON. No explanation, no markdown.
 
 ---------------- OUTPUT FORMAT ----------------
@@ -83,236 +103,462 @@ Follow the rules strictly.
     """
 
     return prompt
+
+def get_batch_prompt(task_texts, clock=None, now=None):
+    """Same rules as get_prompt, sent once for a whole batch of tasks (all in `clock`'s zone)."""
+    now, rules = prompt_context(clock, now)
+    numbered = "\n".join(f"{i}. {json.dumps(text, ensure_ascii=False)}" for i, text in enumerate(task_texts))
+
+    return f"""
+You are an expert date-time extraction engine.
+
+📌 CURRENT DATETIME ({now.strftime("%Z")})
+- Now: {now.strftime("%d/%m/%Y %H:%M")}
+- Today: {now.strftime("%d/%m")}
+- Weekday: {now.strftime("%A")}
+
+Extract the EXACT deadline (date + time) for EACH numbered task below.
+Tasks are independent of each other.
+
+---------------- TASKS ----------------
+{numbered}
+{rules}
+7. Return ONLY valid JSON with exactly one result per task. No explanation, no markdown.
+
+---------------- OUTPUT FORMAT ----------------
+
+{{
+  "results": [
+    {{
+      "index": 0,
+      "date": "DD/MM/YYYY",
+      "time": "HH:MM",
+      "final_datetime": "YYYY-MM-DD HH:MM",
+      "text": "cleaned task description",
+      "source": "parsed | default_24hr | inferred"
+    }}
+  ]
+}}
+
+Follow the rules strictly.
+    """
+
+# --- LLM providers ---
+# Groq first, Gemini as the hedge/failover; both behind per-call deadlines
+# and circuit breakers. When neither answers in time we use the local parser.
+llm_router = LLMRouter(
+    providers=[
+        GroqProvider(groq_client, GROQ_MODEL,
+                     breaker=CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN_SECONDS)),
+        GeminiProvider(gemini_client, GEMINI_MODEL,
+                       breaker=CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN_SECONDS)),
+    ],
+    deadline=LLM_DEADLINE_MS / 1000.0,
+    hedge_min=LLM_HEDGE_MIN_MS / 1000.0,
+    hedge_max=LLM_HEDGE_MAX_MS / 1000.0,
+)
+
+due_date_batcher = DueDateBatcher(
+    complete=llm_router.complete,
+    build_prompt=get_batch_prompt,
+    window_ms=LLM_BATCH_WINDOW_MS,
+    max_items=LLM_BATCH_MAX_ITEMS,
+    max_concurrency=LLM_BATCH_MAX_CONCURRENCY,
+    max_input_tokens=LLM_BATCH_MAX_INPUT_TOKENS,
+    output_tokens_per_item=LLM_BATCH_OUTPUT_TOKENS_PER_ITEM,
+)
    
     
 
-def parse_flexible_time(time_str):
+def extract_due_date(task_text, use_llm=True, clock=None):
     """
-    Tries multiple formats to prevent crashing if LLM gives '2:30 PM' 
-    instead of '14:30' or '2.30'.
-    Returns a datetime.time object or None.
+    Returns (due, cleaned_text), `due` an aware datetime. Dates and times are
+    read in the user's timezone and working hours (`clock`, see user_clock.py;
+    default zone if None). use_llm=False goes straight to the local parser
+    (e.g. when the LLM budget is spent).
     """
-    if not time_str: return None
-    
-    # Clean string: "2.30" -> "2:30", " 02:30 " -> "02:30"
-    t_str = time_str.strip().replace(".", ":").upper()
-    
-    formats = ["%H:%M", "%I:%M %p", "%I:%M%p", "%H %M"]
-    
-    for fmt in formats:
+    clock = clock or user_clocks.default
+    now = datetime.now(clock.tz).replace(second=0, microsecond=0)
+
+    if use_llm:
         try:
-            return datetime.strptime(t_str, fmt).time()
-        except ValueError:
-            continue
-    return None
+            # 1. LLM Call (micro-batched with other in-flight commands of the same zone, deadline-bounded)
+            wait_limit = (LLM_BATCH_WINDOW_MS + LLM_DEADLINE_MS) / 1000.0 + 0.5
+            data = due_date_batcher.extract(task_text, context=clock, timeout=wait_limit)
 
-def extract_due_date(task_text):
-    IST = pytz.timezone("Asia/Kolkata")
-    now = datetime.now(IST).replace(second=0, microsecond=0)
+            # 2. Resolve the structured result
+            return resolve_due_date(data, task_text, now, office_start=clock.work_start)
 
-    
-    prompt = get_prompt(task_text)
+        except Exception as e:
+            # Expected when the deadline passes or every provider's circuit is open
+            logging.warning(f"LLM due-date extraction failed, using the local parser: {e}")
 
+    # Fallback: local parser, or 24 hours from now if the text holds no date or time
+    return local_due_date(task_text, now, office_start=clock.work_start, office_end=clock.work_end)
 
-    try:
-        
-        # 1. LLM Call
-        response = groq_client.chat.completions.create(
-
-            model="llama-3.1-8b-instant",
-            messages=[ {"role": "system", "content": "Respond ONLY with valid JSON. No markdown. No explanation."},
-    {"role": "user", "content": prompt}],
-            temperature=0,
-        )
-        raw = response.choices[0].message.content
-        
-        # 2. Extract JSON safely
-        try:
-            match = re.search(r"\{.*\}", raw, re.DOTALL)
-            json_str = match.group(0) if match else raw
-            data = json.loads(json_str)
-        except Exception as e:
-            print(f"JSON Parse Error: {raw}")
-            raise e
-
-        # 3. Extract Fields
-        date_str = data.get("date", "").strip()
-        time_str = data.get("time", "").strip()
-        day_str = data.get("day", "").strip()
-        explicit_today = data.get("explicit_today", False)
-        cleaned_text = data.get("text", task_text).strip()
-
-        # 4. Resolve Date
-        final_date = None
-        
-        # A. If date string exists (e.g., "01/12")
-        if date_str:
-            try:
-                # Try parsing DD/MM or DD:MM
-                clean_date = date_str.replace(":", "/")
-                parsed_date = datetime.strptime(f"{clean_date}/{now.year}", "%d/%m/%Y")
-                final_date = parsed_date.date()
-            except:
-                pass # Fail silently, fallback to logic below
-
-        # B. If no date, but weekday provided
-        if not final_date and day_str:
-            weekday_map = {day.lower(): i for i, day in enumerate(calendar.day_name)}
-            if day_str.lower() in weekday_map:
-                target_idx = weekday_map[day_str.lower()]
-                today_idx = now.weekday()
-                days_ahead = target_idx - today_idx
-                if days_ahead <= 0: days_ahead += 7
-                final_date = (now + timedelta(days=days_ahead)).date()
-
-        # C. Default to Today
-        if not final_date:
-            final_date = now.date()
-
-        # 5. Resolve Time & Apply Office Logic
-        final_time = parse_flexible_time(time_str)
-        
-         # If no time found, default to end of day
-        if not final_time:
-            final_time = time(23, 59)
-
-
-        dt = datetime.combine(final_date, final_time).replace(tzinfo=IST)
-
-        # --- OFFICE HOUR LOGIC ---
-        # If user says "230", LLM likely returns "02:30".
-        # We assume they mean PM if it's currently Office Hours or if 2:30 AM is absurd.
-        if dt.hour < OFFICE_START:
-            # Shift +12 hours (e.g., 02:30 -> 14:30)
-            dt_pm = dt + timedelta(hours=12)
-            
-            # Use PM version if:
-            # 1. User specifically said "today" (so we must stay on today)
-            # 2. OR if extracting 2:30 AM would put us in the past (and PM fixes it)
-            if explicit_today:
-                dt = dt_pm
-            elif dt < now and dt_pm > now:
-                dt = dt_pm
-            elif dt.hour < 6: # Even if not "today", assume nobody means 2 AM deadline
-                dt = dt_pm
-
-        # --- PAST TIME CHECK ---
-        # If extracted time is still in the past (e.g. 10:00 AM today, but it's 2:00 PM)
-        # AND user didn't write "today" explicitly -> Move to Tomorrow
-        if dt < now and not explicit_today:
-            dt = dt + timedelta(days=1)
-
-        return (
-            dt.strftime("%d:%m"),
-            dt.strftime("%H:%M"),
-            dt.strftime("%A"),
-            cleaned_text
-        )
+def llm_metrics():
+    return {"providers": llm_router.metrics(), "batching": due_date_batcher.metrics()}
 
-    except Exception as e:
-        # PRINT THE ERROR to see why it fails
-        print(f"!!! Extraction Failed: {e}")
-        
-        # Fallback
-        default_due = now + timedelta(hours=24)
-        return (
-            default_due.strftime("%d:%m"),
-            default_due.strftime("%H:%M"),
-            default_due.strftime("%A"),
-            task_text
-        )
+SNOOZE_DURATION = timedelta(hours=1)
+
+def task_blocks(text, task_id, note=None):
+    """
+    Block Kit payload for a message about one task: `text` plus the
+    Complete / Snooze 1h / Open dashboard buttons handled in slack_handlers.
+    Post it with the same `text` as the notification fallback.
+    """
+    blocks = [{"type": "section", "text": {"type": "mrkdwn", "text": text}}]
+    if note:
+        blocks.append({"type": "context", "elements": [{"type": "mrkdwn", "text": note}]})
+    blocks.append({"type": "actions", "elements": [
+        {"type": "button", "action_id": "task_complete", "style": "primary", "value": str(task_id),
+         "text": {"type": "plain_text", "text": "✅ Complete"}},
+        {"type": "button", "action_id": "task_snooze", "value": str(task_id),
+         "text": {"type": "plain_text", "text": "😴 Snooze 1h"}},
+        dashboard_button(),
+    ]})
+    return blocks
+
+def dashboard_button():
+    # A plain link: an existing dashboard session opens straight away, no login token minted
+    return {"type": "button", "action_id": "task_open_dashboard", "url": f"{PUBLIC_HOST}/dashboard",
+            "text": {"type": "plain_text", "text": "Open dashboard"}}
+
+def complete_from_button(task_id, user_id, channel, message_ts):
+    """Action-queue job for the Complete button; the clicked message is updated in place."""
+    success, msg = complete_task_logic(task_id, user_id, slack_channel=channel, message_ts=message_ts)
+    if not success:
+        client.chat_postEphemeral(channel=channel, user=user_id, text=f"⚠️ {msg}")
+
+def snooze_from_button(task_id, user_id, channel, message_ts, message_text):
+    """Action-queue job for the Snooze button: re-sends the reminder in SNOOZE_DURATION."""
+    tz = user_clocks.get(user_id).tz
+    until = tz.normalize(datetime.now(tz) + SNOOZE_DURATION)  # rendered in the user's own time
+    if not snooze_task(task_id, user_id, until):
+        client.chat_postEphemeral(channel=channel, user=user_id,
+                                  text="⚠️ Nothing to snooze: this task is done or not assigned to you.")
+        return
+    client.chat_update(
+        channel=channel,
+        ts=message_ts,
+        text=message_text,
+        blocks=task_blocks(message_text, task_id, note=f"😴 Snoozed until {until.strftime('%I:%M %p')}")
+    )
+
+DIGEST_MAX_TASKS = 40  # keeps the message well under Slack's 50-block limit
+
+def build_digest_blocks(tasks, now):
+    """
+    Block Kit payload for one user's daily digest.
+    `tasks` is [(task_id, text, due), ...] already sorted by due date.
+    """
+    overdue = [t for t in tasks if t[2] and t[2] < now]
+    pending = [t for t in tasks if not (t[2] and t[2] < now)]
+
+    def line(task_id, text, due):
+        due_str = due.astimezone(now.tzinfo).strftime("%a, %b %d at %I:%M %p") if due else "No due time"
+        return f"• *{text}* (ID: {task_id}) — {due_str}"
+
+    summary = f"🌤 *Good morning!* You have *{len(tasks)}* pending task{'s' if len(tasks) != 1 else ''}"
+    if overdue:
+        summary += f", *{len(overdue)}* overdue"
+    summary += "."
+
+    blocks = [{"type": "section", "text": {"type": "mrkdwn", "text": summary}}]
+    shown = 0
+    for title, group in (("⚠️ *Overdue*", overdue), ("⏳ *Pending*", pending)):
+        if not group or shown >= DIGEST_MAX_TASKS:
+            continue
+        group = group[:DIGEST_MAX_TASKS - shown]
+        shown += len(group)
+        blocks.append({"type": "divider"})
+        blocks.append({"type": "section", "text": {"type": "mrkdwn", "text": title}})
+        # Section text is capped at 3000 chars, so emit the list in chunks
+        chunk = []
+        for t in group:
+            chunk.append(line(*t))
+            if len(chunk) == 10:
+                blocks.append({"type": "section", "text": {"type": "mrkdwn", "text": "\n".join(chunk)}})
+                chunk = []
+        if chunk:
+            blocks.append({"type": "section", "text": {"type": "mrkdwn", "text": "\n".join(chunk)}})
+
+    if len(tasks) > shown:
+        blocks.append({"type": "context", "elements": [
+            {"type": "mrkdwn", "text": f"…and {len(tasks) - shown} more. Run `/mytasks` to see everything."}
+        ]})
+    blocks.append({"type": "actions", "elements": [dashboard_button()]})
+
+    return blocks, summary
+
+def send_daily_reminders(now, sent_reminders):
+    """
+    Daily reminders, sent in the first pass after each user's working day
+    starts in their own timezone. The cached clocks say whose day starts
+    now, so only those users' pending work is read, and a pass where no
+    zone is at its start hour reads nothing. Users the clock cache has not
+    seen yet come back too and are placed with by_zone.
+    Digest users get one Block Kit message for all of their pending work;
+    "individual" users keep the legacy one-DM-per-task mode.
+    """
+    due, known = user_clocks.starting_work(now)
+    if not due:
+        return
+    pending = {assigned_to: (mode, tasks)
+               for assigned_to, mode, tasks in get_pending_tasks_by_assignee(user_ids=due, known_ids=known)}
+    for clock, users in user_clocks.by_zone(pending).items():
+        local_now = now.astimezone(clock.tz)
+        if local_now.hour != clock.work_start:
+            continue
+        date_key = local_now.strftime("%Y-%m-%d")
+        for assigned_to in users:
+            send_daily_reminder(assigned_to, *pending[assigned_to], local_now, date_key, sent_reminders)
+
+def send_daily_reminder(assigned_to, mode, tasks, now, date_key, sent_reminders):
+    """One user's daily reminder; `now` and `date_key` are in their timezone."""
+    if mode == "individual":
+        for task_id, text, due in tasks:
+            if due is None:
+                continue
+            daily_key = f"{task_id}:{assigned_to}:daily:{date_key}"
+            if daily_key in sent_reminders:
+                continue
+            try:
+                msg = f"🌤 Gentle reminder: Task *{text}* (ID: {task_id}) is still pending."
+                client.chat_postMessage(channel=assigned_to, text=msg, blocks=task_blocks(msg, task_id))
+                sent_reminders.add(daily_key)
+            except Exception:
+                logging.exception(f"Daily reminder failed for task {task_id} -> user {assigned_to}")
+        return
+
+    digest_key = f"{assigned_to}:digest:{date_key}"
+    if digest_key in sent_reminders:
+        return
+    try:
+        blocks, summary = build_digest_blocks(tasks, now)
+        # Posting to the user ID opens the DM implicitly: one API call per user
+        client.chat_postMessage(channel=assigned_to, text=summary, blocks=blocks)
+        sent_reminders.add(digest_key)
+    except Exception:
+        logging.exception(f"Daily digest failed for user {assigned_to}")
 
 def reminder_loop():
     """
-    Background thread that checks for tasks due soon and sends reminders.
+    Background thread for the daily reminders and expired snoozes. Reminders
+    around the due time are escalation tiers (see escalation_loop).
     """
     tz = pytz.timezone("Asia/Kolkata")  # IST
-    sent_reminders = set()  # format: f"{task_id}:{assigned_to}:{type}:{date}"
+    sent_reminders = set()  # format: f"{task_id}:{assigned_to}:daily:{date}" / f"{assigned_to}:digest:{date}"
+    daily_pass = None
+    set_lane("background")  # interactive replies go first
 
     while True:
         try:
             now = datetime.now(tz)
-            date_key = now.strftime("%Y-%m-%d")
-
-            # --- Fetch all pending assignments with task info ---
-            conn = get_db_connection()
-            c = conn.cursor()
-            c.execute("""
-                SELECT t.id, ta.assigned_to, t.text, ta.done, t.due
-                FROM task_assignments ta
-                JOIN tasks t ON t.id = ta.task_id
-                WHERE ta.done = FALSE AND t.due IS NOT NULL
-            """)
-            rows = c.fetchall()
-            conn.close()
-
-            for task_id, assigned_to, text, done, due_str in rows:
-                if not assigned_to:
-                    continue  # skip if no assigned user
-
-                # Parse due datetime
-                # Parse due datetime safely
+
+            # --- Daily reminders at each user's local start of work ---
+            # One grouped pass per quarter hour, so zones offset by :30 / :45 start on time
+            pass_key = (now.strftime("%Y-%m-%d %H"), now.minute // 15)
+            if pass_key != daily_pass:
+                send_daily_reminders(now, sent_reminders)
+                daily_pass = pass_key
+
+            # --- Snoozed reminders that have run out ---
+            for task_id, assigned_to, text in take_expired_snoozes():
                 try:
-                    if isinstance(due_str, str):
-                        due_dt = datetime.fromisoformat(due_str)
-                    else:
-                        due_dt = due_str  # already a datetime object
-                    if due_dt.tzinfo is None:
-                        due_dt = tz.localize(due_dt)
+                    msg = f"⏰ Snoozed reminder: Task *{text}* (ID: {task_id}) is still pending."
+                    client.chat_postMessage(channel=assigned_to, text=msg, blocks=task_blocks(msg, task_id))
                 except Exception:
-                     logging.exception(f"Failed to parse due datetime for task {task_id}")
-                     continue
-
-
-                time_left = (due_dt - now).total_seconds()
-
-                # --- Daily reminder at 10 AM ---
-                daily_key = f"{task_id}:{assigned_to}:daily:{date_key}"
-                if 10 <= now.hour < 11 and daily_key not in sent_reminders:
-                    try:
-                        dm = client.conversations_open(users=assigned_to)
-                        dm_channel = dm["channel"]["id"]
-                        client.chat_postMessage(
-                            channel=dm_channel,
-                            text=f"🌤 Gentle reminder: Task *{text}* (ID: {task_id}) is still pending."
-                        )
-                        sent_reminders.add(daily_key)
-                    except Exception:
-                        logging.exception(f"Daily reminder failed for task {task_id} -> user {assigned_to}")
-
-                # --- 1-hour reminder ---
-                hour_key = f"{task_id}:{assigned_to}:hour:{date_key}"
-                if 0 < abs(time_left - 3600) < 65 and hour_key not in sent_reminders:
-                    try:
-                        dm = client.conversations_open(users=assigned_to)
-                        dm_channel = dm["channel"]["id"]
-                        client.chat_postMessage(
-                            channel=dm_channel,
-                            text=f"⏰ Reminder: Task *{text}* (ID: {task_id}) is due in 1 hour!"
-                        )
-                        sent_reminders.add(hour_key)
-                    except Exception:
-                        logging.exception(f"1-hour reminder failed for task {task_id} -> user {assigned_to}")
-
-                # --- 30-minute reminder ---
-                half_key = f"{task_id}:{assigned_to}:half:{date_key}"
-                if 0 < abs(time_left - 1800) < 65 and half_key not in sent_reminders:
-                    try:
-                        dm = client.conversations_open(users=assigned_to)
-                        dm_channel = dm["channel"]["id"]
-                        client.chat_postMessage(
-                            channel=dm_channel,
-                            text=f"⚠️ Reminder: Task *{text}* (ID: {task_id}) is due in 30 minutes!"
-                        )
-                        sent_reminders.add(half_key)
-                    except Exception:
-                        logging.exception(f"30-min reminder failed for task {task_id} -> user {assigned_to}")
+                    logging.exception(f"Snoozed reminder failed for task {task_id} -> user {assigned_to}")
 
         except Exception:
             logging.exception("Reminder loop error")
 
         time.sleep(60)  # run every minute
 
+# (tier, who is notified, offset from the due time) in the order they fire.
+# The tier name is what task_escalations records as sent.
+ESCALATION_TIERS = (
+    [(f"before:{m}m", "assignee", -timedelta(minutes=m))
+     for m in sorted(set(ESCALATION_REMIND_BEFORE_MINUTES), reverse=True) if m > 0]
+    + ([("due", "assignee", timedelta(0))] if ESCALATION_NOTIFY_AT_DUE else [])
+    + ([(f"creator:{ESCALATION_CREATOR_AFTER_HOURS:g}h", "creator", timedelta(hours=ESCALATION_CREATOR_AFTER_HOURS))]
+       if ESCALATION_CREATOR_AFTER_HOURS > 0 else [])
+)
+
+def describe_duration(delta):
+    """timedelta -> '1 hour', '30 minutes', '2 hours 15 minutes'."""
+    hours, minutes = divmod(int(delta.total_seconds()) // 60, 60)
+    parts = [f"{n} {unit}{'s' if n != 1 else ''}" for n, unit in ((hours, "hour"), (minutes, "minute")) if n]
+    return " ".join(parts) or "under a minute"
+
+def escalation_line(offset, task_id, text, pending):
+    if offset < timedelta(0):
+        return f"⏰ *{text}* (ID: {task_id}) is due in {describe_duration(-offset)}"
+    if offset == timedelta(0):
+        return f"🚨 *{text}* (ID: {task_id}) is now overdue"
+    waiting = ", ".join(f"<@{uid}>" for uid in (pending or "").split(",") if uid)
+    return f"📣 *{text}* (ID: {task_id}) is {describe_duration(offset)} overdue, still waiting on {waiting}"
+
+def task_list_blocks(summary, lines):
+    """A summary, then `lines` in sections of 10 (up to DIGEST_MAX_TASKS), then the dashboard button."""
+    blocks = [{"type": "section", "text": {"type": "mrkdwn", "text": summary}}]
+    shown = lines[:DIGEST_MAX_TASKS]
+    for i in range(0, len(shown), 10):
+        blocks.append({"type": "section", "text": {"type": "mrkdwn", "text": "\n".join(shown[i:i + 10])}})
+    if len(lines) > len(shown):
+        blocks.append({"type": "context", "elements": [
+            {"type": "mrkdwn", "text": f"…and {len(lines) - len(shown)} more. Open the dashboard to see everything."}
+        ]})
+    blocks.append({"type": "actions", "elements": [dashboard_button()]})
+    return blocks
+
+def build_escalation_messages(claimed):
+    """
+    post_many() payloads for one escalation pass: a single message per
+    recipient, whichever tiers and tasks they were claimed for.
+    `claimed` is [(offset, notify, (task_id, recipient, text, pending)), ...].
+    """
+    by_recipient = {}
+    for offset, notify, (task_id, recipient, text, pending) in claimed:
+        by_recipient.setdefault(recipient, []).append((offset, notify, task_id, escalation_line(offset, task_id, text, pending)))
+
+    messages = []
+    for recipient, items in by_recipient.items():
+        if len(items) == 1:
+            _, notify, task_id, line = items[0]
+            # Assignees get Complete / Snooze; a creator cannot snooze someone else's work
+            blocks = task_blocks(line, task_id) if notify == "assignee" else task_list_blocks(line, [])
+            messages.append({"channel": recipient, "text": line, "blocks": blocks})
+            continue
+        summary = f"🔔 *{len(items)} of your tasks need attention*"
+        lines = [f"• {line}" for *_, line in items]
+        messages.append({"channel": recipient, "text": summary + "\n" + "\n".join(lines[:DIGEST_MAX_TASKS]),
+                         "blocks": task_list_blocks(summary, lines)})
+    return messages
+
+def run_escalations(since, now):
+    """
+    Claims every tier whose mark a pending task passed in (since, now] and
+    sends one message per recipient. Each tier is one indexed range query
+    over due times in (since - offset, now - offset], so a pass costs the
+    number of tasks that just crossed a mark, not the number of open tasks.
+    A recipient whose message fails has their claims released, so a later
+    pass over the same window sends them again. Returns (sent, failed) claim counts.
+    """
+    claimed, claims = [], {}
+    for tier, notify, offset in ESCALATION_TIERS:
+        for row in claim_escalations(tier, notify, since - offset, now - offset, now):
+            claimed.append((offset, notify, row))
+            claims.setdefault(row[1], []).append((row[0], row[1], tier))
+    if not claimed:
+        return 0, 0
+    messages = build_escalation_messages(claimed)
+    failed = []
+    for message, e in client.post_many(messages):
+        logging.error(f"Escalation DM failed for {message['channel']}: {e}")
+        failed.extend(claims[message["channel"]])
+    if failed:
+        release_escalations(failed)
+    return len(claimed) - len(failed), len(failed)
+
+def send_overdue_rollups(now, sent_rollups):
+    """
+    Daily roll-up of overdue tasks to their creators, sent in the first pass
+    after each creator's working day starts in their own timezone.
+    """
+    overdue = get_overdue_by_creator(now)
+    messages, keys = [], []
+    for clock, creators in user_clocks.by_zone(overdue).items():
+        local_now = now.astimezone(clock.tz)
+        if local_now.hour != clock.work_start:
+            continue
+        date_key = local_now.strftime("%Y-%m-%d")
+        for creator in creators:
+            key = f"{creator}:rollup:{date_key}"
+            if key in sent_rollups:
+                continue
+            tasks = overdue[creator]
+            summary = f"📋 *{len(tasks)}* task{'s' if len(tasks) != 1 else ''} you created {'are' if len(tasks) != 1 else 'is'} overdue."
+            lines = [f"• *{text}* (ID: {task_id}) — due {due.astimezone(clock.tz).strftime('%a, %b %d at %I:%M %p')}"
+                     for task_id, text, due in tasks]
+            messages.append({"channel": creator, "text": summary, "blocks": task_list_blocks(summary, lines)})
+            keys.append(key)
+
+    failed = set()
+    for message, e in client.post_many(messages):
+        failed.add(message["channel"])
+        logging.error(f"Overdue roll-up failed for {message['channel']}: {e}")
+    sent_rollups.update(key for key, message in zip(keys, messages) if message["channel"] not in failed)
+
+def escalation_loop():
+    """
+    Background thread for the due-time escalation tiers and the daily overdue
+    roll-up. Each pass covers the time since the previous one; the first
+    catches up on marks passed in the last ESCALATION_CATCHUP_MINUTES, and
+    task_escalations keeps anything already sent from going out again. While
+    DMs fail the window is not advanced (for at most the catch-up period), so
+    the released claims are retried.
+    """
+    set_lane("background")
+    since = datetime.now(IST) - timedelta(minutes=ESCALATION_CATCHUP_MINUTES)
+    sent_rollups = set()  # format: f"{creator}:rollup:{date}"
+    rollup_pass = None
+    while True:
+        now = datetime.now(IST)
+        try:
+            sent, failed = run_escalations(since, now)
+            if sent:
+                logging.info(f"Sent {sent} due-time escalations")
+            # A failed pass is retried over the same window
+            if not failed:
+                since = now
+            else:
+                since = max(since, now - timedelta(minutes=ESCALATION_CATCHUP_MINUTES))
+
+            # Same quarter-hour cadence as the daily reminders
+            pass_key = (now.strftime("%Y-%m-%d %H"), now.minute // 15)
+            if ESCALATION_DAILY_ROLLUP and pass_key != rollup_pass:
+                send_overdue_rollups(now, sent_rollups)
+                rollup_pass = pass_key
+        except Exception:
+            logging.exception("Escalation loop error")
+
+        time.sleep(ESCALATION_INTERVAL_SECONDS)
+
+def archive_loop():
+    """
+    Background thread that moves long-completed tasks out of the hot tables.
+    """
+    while True:
+        try:
+            archived = archive_completed_tasks(ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE)
+            if archived:
+                logging.info(f"Archived {archived} tasks completed more than {ARCHIVE_AFTER_DAYS} days ago")
+        except Exception:
+            logging.exception("Archive loop error")
+
+        time.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+def recurrence_loop():
+    """
+    Background thread that materializes the next occurrence of recurring
+    tasks whose current occurrence is overdue, once it is within the horizon.
+    """
+    set_lane("background")
+    horizon = timedelta(hours=RECURRENCE_HORIZON_HOURS)
+    while True:
+        try:
+            spawned = materialize_due_occurrences(horizon)
+            if spawned:
+                logging.info(f"Materialized {len(spawned)} recurring task occurrences")
+            for new_id, affected in spawned:
+                emit_task_update(affected, task_ids=[new_id])
+        except Exception:
+            logging.exception("Recurrence loop error")
+
+        time.sleep(RECURRENCE_INTERVAL_SECONDS)
+
 def complete_task_logic(task_id, user_who_clicked, slack_channel=None, message_ts=None, note=""):
     """
     Marks a task complete and saves remarks with the user's signature.
@@ -330,48 +576,43 @@ def complete_task_logic(task_id, user_who_clicked, slack_channel=None, message_t
     if note:
         final_remark = f"{note}\n\n— Added by @{user_name}"
 
-    conn = get_db_connection()
-    c = conn.cursor()
+    timestamp = datetime.now(IST).isoformat()
 
-    c.execute(
-        "SELECT id, done FROM task_assignments WHERE task_id=%s AND assigned_to=%s",
-        (task_id, user_who_clicked)
-    )
-    assignment = c.fetchone()
-    timestamp = datetime.now().isoformat()
-
-    if assignment:
-        assignment_id, done = assignment
-        if done:
-            conn.close()
-            return False, "Task already completed."
-        
-        c.execute(
-            "UPDATE task_assignments SET done=TRUE, completed_at=%s, remarks=%s WHERE id=%s",
-            (timestamp, final_remark, assignment_id)
-        )
-    elif user_who_clicked == creator_id:
-        # Creator marks complete: mark all assignments done
-        c.execute(
-            "UPDATE task_assignments SET done=TRUE, completed_at=%s, remarks=%s WHERE task_id=%s ",
-            (timestamp, final_remark, task_id)
-        )
-    else:
-        conn.close()
-        return False, "You are not allowed to complete this task."
-
-    # Update main task if all assignments done
-    c.execute("SELECT COUNT(*) FROM task_assignments WHERE task_id=%s AND done=TRUE", (task_id,))
-    remaining = c.fetchone()[0]
-    if remaining == 0:
-        c.execute("UPDATE tasks SET done=TRUE, completed_at=%s WHERE id=%s",
-                  (timestamp, task_id))
-
-    conn.commit()
-    conn.close()
+    with store.transaction() as c:
+        assignment = store.get_assignment(c, task_id, user_who_clicked)
+
+        if assignment:
+            assignment_id, done = assignment
+            if done:
+                return False, "Task already completed."
+
+            store.complete_assignment(c, assignment_id, timestamp, final_remark)
+            completed_ids = [assignment_id]
+            affected_users = {creator_id, user_who_clicked}
+        elif user_who_clicked == creator_id:
+            # Creator marks complete: mark all pending assignments done
+            # (already-completed ones keep their own timestamp and remarks)
+            completed = store.complete_pending_assignments(c, task_id, timestamp, final_remark)
+            completed_ids = [r[0] for r in completed]
+            affected_users = {creator_id} | {r[1] for r in completed}
+        else:
+            return False, "You are not allowed to complete this task."
+
+        stats_record_completions(c, completed_ids)
+        publish_invalidation(c, affected_users)
+
+        # Update main task if all assignments done
+        closed, rule = store.close_task_if_done(c, task_id, timestamp)
+
+        # Closing a series head spawns its next occurrence in the same transaction
+        spawned = spawn_next_occurrence(c, task_id, datetime.now(IST)) if closed and rule else None
+        if spawned:
+            affected_users |= spawned[1]
+
+    task_list_cache.invalidate(affected_users)
  
-    # Refresh dashboard
-    socketio.emit("task_update", {})
+    # Refresh the affected dashboards (only this task's rows are re-fetched)
+    emit_task_update(affected_users, task_ids=[task_id] + ([spawned[0]] if spawned else []))
 
     if slack_channel and message_ts:
         try:
@@ -399,19 +640,13 @@ def complete_task_logic(task_id, user_who_clicked, slack_channel=None, message_t
     return True, f"🎉 <@{user_who_clicked}> completed the task: *{task_text}* (ID: {task_id})"
 
 def edit_task(task_id, new_assignees, editor_user_id, client, logger, new_text=None, new_due=None):
-    conn = get_db_connection()
-    c = conn.cursor()
-
     # 1. Fetch task details AND creator_id
-    c.execute("SELECT user_id, text, due, file_url FROM tasks WHERE id=%s", (task_id,))
-    row = c.fetchone()
+    row = get_task_db(task_id)
 
     if not row:
-        conn.close()
         return {"success": False, "error": "Task not found"}
 
-    creator_id, old_text, old_due, file_url = row
-    conn.close()
+    _, creator_id, old_text, _, old_due, file_url, _, _, recurrence = row
 
     # --- SECURITY CHECK ---
     if creator_id != editor_user_id:
@@ -427,7 +662,8 @@ def edit_task(task_id, new_assignees, editor_user_id, client, logger, new_text=N
         assignees=new_assignees,
         text=updated_text,
         due=updated_due,
-        file_url=file_url
+        file_url=file_url,
+        recurrence=recurrence
     )
 
     # --- 3. Notify assignees ---
@@ -445,7 +681,7 @@ def edit_task(task_id, new_assignees, editor_user_id, client, logger, new_text=N
                 f"*Due:* {updated_due or 'No due date'}\n"
                 f"🆕 *Task ID:* {new_task_id}"
             )
-            client.chat_postMessage(channel=dm_channel, text=msg_text)
+            client.chat_postMessage(channel=dm_channel, text=msg_text, blocks=task_blocks(msg_text, new_task_id))
         except Exception as e:
             logger.exception(f"DM failed for new assignee: {e}")
 
@@ -455,6 +691,8 @@ def edit_task(task_id, new_assignees, editor_user_id, client, logger, new_text=N
     except Exception as e:
         logger.exception("Delete inside edit failed:", e)
 
+    emit_task_update([editor_user_id] + list(new_assignees), task_ids=[new_task_id])
+
     # --- 5. Notify the editor (creator) ---
     try:
         client.chat_postMessage(
@@ -0,0 +1,231 @@
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from google.genai import types
+
+
+class ProvidersUnavailable(Exception):
+    """No provider could answer before the deadline (or all circuits are open)."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `cooldown` seconds. After that a single trial call is let through
+    (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, cooldown=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class LLMProvider:
+    """
+    One completion backend. Subclasses implement _call(prompt, max_tokens, timeout)
+    returning (raw_text, total_tokens). Latency, error and breaker state are
+    tracked here so the router can pick and hedge between providers.
+    """
+
+    name = "provider"
+
+    def __init__(self, breaker=None, window=200):
+        self.breaker = breaker or CircuitBreaker()
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "errors": 0, "timeouts": 0, "wins": 0, "hedged": 0}
+
+    def _call(self, prompt, max_tokens, timeout):
+        raise NotImplementedError
+
+    def call(self, prompt, max_tokens, timeout):
+        start = time.monotonic()
+        with self._lock:
+            self.counters["calls"] += 1
+        try:
+            result = self._call(prompt, max_tokens, timeout)
+        except Exception:
+            with self._lock:
+                self.counters["errors"] += 1
+            self.breaker.record_failure()
+            raise
+        with self._lock:
+            self._latencies.append(time.monotonic() - start)
+        self.breaker.record_success()
+        return result
+
+    def percentile(self, pct, default=None):
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples:
+            return default
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+    def count(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    def metrics(self):
+        with self._lock:
+            m = dict(self.counters)
+        p50, p95 = self.percentile(50), self.percentile(95)
+        m["p50_ms"] = round(p50 * 1000, 1) if p50 is not None else None
+        m["p95_ms"] = round(p95 * 1000, 1) if p95 is not None else None
+        m["circuit"] = self.breaker.state
+        return m
+
+
+class GroqProvider(LLMProvider):
+    name = "groq"
+
+    def __init__(self, groq_client, model, **kwargs):
+        super().__init__(**kwargs)
+        self.client = groq_client
+        self.model = model
+
+    def _call(self, prompt, max_tokens, timeout):
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "system", "content": "Respond ONLY with valid JSON. No markdown. No explanation."},
+                      {"role": "user", "content": prompt}],
+            temperature=0,
+            max_tokens=max_tokens,
+            timeout=timeout,
+        )
+        usage = getattr(response, "usage", None)
+        return response.choices[0].message.content, getattr(usage, "total_tokens", 0)
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, gemini_client, model, **kwargs):
+        super().__init__(**kwargs)
+        self.client = gemini_client
+        self.model = model
+
+    def _call(self, prompt, max_tokens, timeout):
+        response = self.client.models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config=types.GenerateContentConfig(
+                temperature=0,
+                max_output_tokens=max_tokens,
+                response_mime_type="application/json",
+                http_options=types.HttpOptions(timeout=int(timeout * 1000)),
+            ),
+        )
+        usage = getattr(response, "usage_metadata", None)
+        return response.text, getattr(usage, "total_token_count", 0)
+
+
+class LLMRouter:
+    """
+    Deadline-bounded completion across providers, in preference order.
+
+    The first healthy provider is called. If it has not answered after its own
+    p95 latency (clamped to [hedge_min, hedge_max]), the next healthy provider
+    is called in parallel and whichever answers first wins. A provider that
+    fails outright hands over to the next one immediately. Nothing blocks past
+    `deadline`; callers fall back to the local parser on ProvidersUnavailable.
+    """
+
+    def __init__(self, providers, deadline=2.5, hedge_min=0.3, hedge_max=1.5, max_workers=8):
+        self.providers = providers
+        self.deadline = deadline
+        self.hedge_min = hedge_min
+        self.hedge_max = hedge_max
+        # Timed-out calls keep running in the background; the pool bounds how many
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-call")
+
+    def _hedge_delay(self, provider):
+        p95 = provider.percentile(95, default=self.hedge_max)
+        return min(max(p95, self.hedge_min), self.hedge_max)
+
+    def complete(self, prompt, max_tokens=None, deadline=None):
+        end = time.monotonic() + (deadline or self.deadline)
+        # Breakers are consulted lazily, only when a provider is actually called,
+        # so a half-open trial slot is never claimed without being used.
+        remaining_providers = list(self.providers)
+        in_flight = {}
+        last_error = None
+
+        def launch():
+            while remaining_providers:
+                provider = remaining_providers.pop(0)
+                if provider.breaker.allow():
+                    budget = max(end - time.monotonic(), 0.05)
+                    in_flight[self._executor.submit(provider.call, prompt, max_tokens, budget)] = provider
+                    return provider
+            return None
+
+        current = launch()
+        if current is None:
+            raise ProvidersUnavailable("All LLM circuits are open")
+        hedge_at = time.monotonic() + self._hedge_delay(current)
+
+        while in_flight:
+            now = time.monotonic()
+            if now >= end:
+                break
+            timeout = (min(hedge_at, end) if remaining_providers else end) - now
+            done, _ = wait(list(in_flight), timeout=max(timeout, 0), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                provider = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    logging.warning(f"LLM provider {provider.name} failed: {e}")
+                    continue
+                provider.count("wins")
+                return result
+
+            # Fail over if nothing is running, hedge if the current call is slow
+            if remaining_providers and (not in_flight or time.monotonic() >= hedge_at):
+                hedging = bool(in_flight)
+                current = launch()
+                if current is not None:
+                    if hedging:
+                        current.count("hedged")
+                    hedge_at = time.monotonic() + self._hedge_delay(current)
+
+        for provider in in_flight.values():
+            provider.count("timeouts")
+        raise ProvidersUnavailable(f"No LLM answer within deadline (last error: {last_error})")
+
+    def metrics(self):
+        return {p.name: p.metrics() for p in self.providers}
@@ -0,0 +1,158 @@
+"""
+Expands user-group (<!subteam^S…>) and channel (<#C…>) mentions into the
+user IDs they stand for, so /addtask can assign a whole team at once.
+
+Membership comes from an in-process index refreshed in the background:
+every user group with its members in one usergroups.list call, plus the
+channels that were actually mentioned recently (conversations.members).
+A mention only costs Slack API calls the first time its group or channel
+is seen, or when the index has gone stale because the refresher stopped.
+Needs the usergroups:read and channels:read / groups:read scopes.
+"""
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from slack_sdk.errors import SlackApiError
+from config import client, MEMBERSHIP_REFRESH_SECONDS, MEMBERSHIP_MAX_CHANNELS
+from database import get_user_directory
+from slack_client import set_lane
+
+SUBTEAM_RE = re.compile(r"<!subteam\^([A-Z0-9]+)(?:\|[^>]*)?>")
+CHANNEL_RE = re.compile(r"<#([A-Z0-9]+)(?:\|[^>]*)?>")
+
+
+class MembershipIndex:
+    """
+    group_id / channel_id -> [user IDs] with a background refresh().
+    Entries older than two refresh intervals are re-fetched on read, so a
+    stuck refresher degrades to on-demand lookups instead of stale teams.
+    Channel entries are kept LRU, at most `max_channels` of them.
+    """
+
+    def __init__(self, client, refresh_seconds=600, max_channels=500):
+        self.client = client
+        self.refresh_seconds = refresh_seconds
+        self.max_channels = max_channels
+        self._groups = {}  # subteam id -> (loaded_at, [users])
+        self._channels = OrderedDict()  # channel id -> (loaded_at, [users])
+        self._lock = threading.Lock()
+        self._metrics = {"hits": 0, "misses": 0, "refreshes": 0, "errors": 0}
+
+    def _fresh(self, entry):
+        return entry is not None and time.time() - entry[0] < 2 * self.refresh_seconds
+
+    def group_members(self, group_id):
+        with self._lock:
+            entry = self._groups.get(group_id)
+            if self._fresh(entry):
+                self._metrics["hits"] += 1
+                return entry[1]
+            self._metrics["misses"] += 1
+        users = self.client.usergroups_users_list(usergroup=group_id)["users"]
+        with self._lock:
+            self._groups[group_id] = (time.time(), users)
+        return users
+
+    def channel_members(self, channel_id):
+        with self._lock:
+            entry = self._channels.get(channel_id)
+            if self._fresh(entry):
+                self._channels.move_to_end(channel_id)
+                self._metrics["hits"] += 1
+                return entry[1]
+            self._metrics["misses"] += 1
+        users = self._fetch_channel(channel_id)
+        self._store_channel(channel_id, users)
+        return users
+
+    def _fetch_channel(self, channel_id):
+        users, cursor = [], None
+        while True:
+            resp = self.client.conversations_members(channel=channel_id, limit=1000, cursor=cursor)
+            users.extend(resp["members"])
+            cursor = resp.get("response_metadata", {}).get("next_cursor")
+            if not cursor:
+                return users
+
+    def _store_channel(self, channel_id, users):
+        with self._lock:
+            self._channels[channel_id] = (time.time(), users)
+            self._channels.move_to_end(channel_id)
+            while len(self._channels) > self.max_channels:
+                self._channels.popitem(last=False)
+
+    def refresh(self):
+        """Reloads every user group in one call and re-reads the cached channels."""
+        now = time.time()
+        groups = self.client.usergroups_list(include_users=True)["usergroups"]
+        with self._lock:
+            self._groups = {g["id"]: (now, g.get("users", [])) for g in groups}
+            channel_ids = list(self._channels)
+
+        for channel_id in channel_ids:
+            try:
+                self._store_channel(channel_id, self._fetch_channel(channel_id))
+            except SlackApiError:
+                # Archived, or the bot was removed: forget it until it is mentioned again
+                with self._lock:
+                    self._channels.pop(channel_id, None)
+        with self._lock:
+            self._metrics["refreshes"] += 1
+
+    def expand(self, text, exclude=()):
+        """
+        Resolves the user-group and channel mentions in `text`.
+        Returns (user_ids, text_without_those_mentions, unresolved_mentions,
+        empty_mentions). Bots and deactivated accounts are dropped, as are the
+        IDs in `exclude`; a mention left with nobody is in empty_mentions.
+        user_ids keep mention order without duplicates.
+        """
+        expanded, unresolved = [], []
+        for pattern, lookup in ((SUBTEAM_RE, self.group_members), (CHANNEL_RE, self.channel_members)):
+            for match in pattern.finditer(text):
+                try:
+                    expanded.append((match.group(0), lookup(match.group(1))))
+                except SlackApiError as e:
+                    logging.warning(f"Could not expand {match.group(0)}: {e.response.get('error')}")
+                    unresolved.append(match.group(0))
+                    with self._lock:
+                        self._metrics["errors"] += 1
+            text = pattern.sub("", text)
+
+        humans = None
+        if any(members for _, members in expanded):
+            try:
+                humans = {u["id"] for u in get_user_directory()}
+            except Exception:
+                logging.exception("User directory unavailable; mention expansion is unfiltered")
+        users, empty = [], []
+        for mention, members in expanded:
+            members = [u for u in members if u not in exclude and (humans is None or u in humans)]
+            users.extend(members)
+            if not members:
+                empty.append(mention)
+        return list(dict.fromkeys(users)), re.sub(r"\s{2,}", " ", text).strip(), unresolved, empty
+
+    def metrics(self):
+        with self._lock:
+            m = dict(self._metrics)
+            m["groups"] = len(self._groups)
+            m["channels"] = len(self._channels)
+        return m
+
+
+membership_index = MembershipIndex(client, refresh_seconds=MEMBERSHIP_REFRESH_SECONDS,
+                                   max_channels=MEMBERSHIP_MAX_CHANNELS)
+
+
+def membership_refresh_loop():
+    """Background thread keeping membership_index warm."""
+    set_lane("background")
+    while True:
+        try:
+            membership_index.refresh()
+        except Exception:
+            logging.exception("Membership refresh error")
+        time.sleep(MEMBERSHIP_REFRESH_SECONDS)
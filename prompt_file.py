@@ -5,17 +5,17 @@ from config import IST
 OFFICE_START_HOUR = 10  # 10 AM
 OFFICE_END_HOUR = 19    # 7 PM (Buffer for 6:30 PM)
 
-def get_prompt(task_text):
-    now = datetime.now(IST).replace(second=0, microsecond=0)
+def get_prompt(task_text, tz=IST, office_start=OFFICE_START_HOUR):
+    now = datetime.now(tz).replace(second=0, microsecond=0)
     current_date = now.strftime("%d:%m")
     current_time = now.strftime("%H:%M")
     query_day = now.strftime("%A")
 
     prompt = f"""
     Context:
-    - Current IST Time: {current_time}
+    - Current {now.strftime("%Z")} Time: {current_time}
     - Current Date: {current_date} ({query_day})
-    - Office Hours: 10:00 AM to 06:30 PM
+    - Office Hours: {office_start:02d}:00 to 06:30 PM
     - Office Hours can vary upto some hours on overtime in AM and PM
 
     Role: Task Scheduler. Extract deadline details.
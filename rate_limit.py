@@ -0,0 +1,156 @@
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from config import (RATE_LIMIT_API, RATE_LIMIT_API_WORKSPACE, RATE_LIMIT_COMMAND, RATE_LIMIT_COMMAND_WORKSPACE,
+                    RATE_LIMIT_LLM, RATE_LIMIT_LLM_WORKSPACE, RATE_LIMIT_FANOUT, RATE_LIMIT_FANOUT_WORKSPACE,
+                    MAX_TASK_ASSIGNEES)
+
+# retry_after is None when the request costs more than the budget can ever hold
+Decision = namedtuple("Decision", "allowed retry_after")
+
+
+class RateLimited(Exception):
+    """Raised by code paths that reject instead of returning a Decision."""
+
+    def __init__(self, policy, retry_after):
+        super().__init__(f"Rate limit '{policy}' exceeded; retry in {retry_after}s")
+        self.policy = policy
+        self.retry_after = retry_after
+
+
+class OverCapacity(ValueError):
+    """Raised by require() for a request that no amount of waiting would admit."""
+
+    def __init__(self, policy, cost, capacity):
+        super().__init__(f"Too many recipients: {cost} exceeds the '{policy}' limit of {capacity} at once")
+        self.policy = policy
+        self.cost = cost
+        self.capacity = capacity
+
+
+def parse_rate(spec):
+    """'30/60' -> (capacity 30, refill 0.5 tokens per second)."""
+    count, _, seconds = spec.partition("/")
+    count, seconds = float(count), float(seconds or 1)
+    if count <= 0 or seconds <= 0:
+        raise ValueError(f"Invalid rate limit '{spec}' (expected '<requests>/<seconds>')")
+    return count, count / seconds
+
+
+class TokenBucket:
+    """Starts full; refills continuously at `rate` tokens/second up to `capacity`."""
+
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity, rate, now):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, cost, now):
+        """Takes `cost` tokens, or returns the seconds until that would succeed."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        if cost > self.capacity:
+            return math.inf
+        return (cost - self.tokens) / self.rate
+
+    def refund(self, cost):
+        self.tokens = min(self.capacity, self.tokens + cost)
+
+
+class RateLimiter:
+    """
+    Token-bucket admission control. Each policy has a per-user budget (one
+    bucket per user and route/command) and a per-workspace budget shared by
+    everyone. A request needs a token from both; rejections are immediate
+    and carry the seconds until a retry can succeed, nothing is queued.
+
+    `policies` maps name -> (user_spec, workspace_spec), specs as '30/60'.
+    Idle buckets are dropped LRU-first beyond `max_buckets`; a dropped bucket
+    comes back full, which only ever errs on the side of admitting.
+    """
+
+    def __init__(self, policies, max_buckets=50000):
+        self.policies = {
+            name: (parse_rate(user_spec), parse_rate(workspace_spec))
+            for name, (user_spec, workspace_spec) in policies.items()
+        }
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = {name: {"admitted": 0, "rejected_user": 0, "rejected_workspace": 0}
+                         for name in self.policies}
+
+    def _bucket(self, key, limits, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(limits[0], limits[1], now)
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def admit(self, policy, user_id, route, cost=1, workspace=None):
+        """Returns Decision(allowed, retry_after_seconds)."""
+        user_limits, workspace_limits = self.policies[policy]
+        now = time.monotonic()
+        with self._lock:
+            user_bucket = self._bucket(("user", policy, user_id, route), user_limits, now)
+            wait = user_bucket.take(cost, now)
+            if wait:
+                self._metrics[policy]["rejected_user"] += 1
+                return Decision(False, _retry_seconds(wait))
+
+            workspace_bucket = self._bucket(("workspace", policy, workspace), workspace_limits, now)
+            wait = workspace_bucket.take(cost, now)
+            if wait:
+                user_bucket.refund(cost)  # the user's own budget was not the problem
+                self._metrics[policy]["rejected_workspace"] += 1
+                return Decision(False, _retry_seconds(wait))
+
+            self._metrics[policy]["admitted"] += 1
+            return Decision(True, 0)
+
+    def require(self, policy, user_id, route, cost=1, workspace=None):
+        """Like admit(), but raises RateLimited when rejected, OverCapacity when it never could be."""
+        decision = self.admit(policy, user_id, route, cost=cost, workspace=workspace)
+        if decision.retry_after is None:
+            raise OverCapacity(policy, cost, self.capacity(policy))
+        if not decision.allowed:
+            raise RateLimited(policy, decision.retry_after)
+
+    def capacity(self, policy):
+        """The largest cost a single request of this policy can ever be admitted with."""
+        (user_capacity, _), (workspace_capacity, _) = self.policies[policy]
+        return int(min(user_capacity, workspace_capacity))
+
+    def metrics(self):
+        with self._lock:
+            m = {name: dict(counts) for name, counts in self._metrics.items()}
+            m["buckets"] = len(self._buckets)
+        return m
+
+
+def _retry_seconds(wait):
+    # Retry-After is whole seconds; an impossible request (cost > capacity) gets None
+    return None if math.isinf(wait) else max(1, math.ceil(wait))
+
+
+limiter = RateLimiter({
+    "api": (RATE_LIMIT_API, RATE_LIMIT_API_WORKSPACE),
+    "command": (RATE_LIMIT_COMMAND, RATE_LIMIT_COMMAND_WORKSPACE),
+    "llm": (RATE_LIMIT_LLM, RATE_LIMIT_LLM_WORKSPACE),
+    "fanout": (RATE_LIMIT_FANOUT, RATE_LIMIT_FANOUT_WORKSPACE),
+})
+
+if limiter.capacity("fanout") < MAX_TASK_ASSIGNEES:
+    logging.warning(f"RATE_LIMIT_FANOUT allows {limiter.capacity('fanout')} recipients at once, fewer than "
+                    f"MAX_TASK_ASSIGNEES ({MAX_TASK_ASSIGNEES}); larger tasks will be refused")
@@ -0,0 +1,152 @@
+"""
+Recurring task rules.
+
+A series is stored as an RRULE string (e.g. "FREQ=WEEKLY;BYDAY=MO") on its
+newest occurrence only, the series "head". Future occurrences are never
+pre-generated: the next one is materialized when the head is completed, or
+by the scheduler once the head is overdue and the next occurrence is within
+the horizon. COUNT is decremented as occurrences are spawned, so the rule
+always describes what is left of the series. TZID (not part of RRULE
+proper) names the creator's timezone, whose wall-clock time occurrences
+keep across DST changes; rules without it use IST.
+"""
+import re
+from datetime import datetime
+import pytz
+from dateutil.rrule import rrulestr
+
+IST = pytz.timezone("Asia/Kolkata")
+
+WEEKDAYS = {"mon": "MO", "tue": "TU", "wed": "WE", "thu": "TH", "fri": "FR", "sat": "SA", "sun": "SU"}
+_DAY = r"(?:mon(?:day)?|tue(?:s(?:day)?)?|wed(?:nesday)?|thu(?:r(?:s(?:day)?)?)?|fri(?:day)?|sat(?:urday)?|sun(?:day)?)s?\b"
+_UNITS = {"day": "DAILY", "week": "WEEKLY", "month": "MONTHLY"}
+_ADVERBS = {"daily": "DAILY", "weekly": "WEEKLY", "monthly": "MONTHLY"}
+_REPEAT = r"\b(?:repeat(?:s|ing)?\s+)?"
+# A bare "daily" / "weekly" / "monthly" is only a directive after the task
+# text: at the end, or just before the when-part ("at 10am", "by friday").
+# Anywhere else it is an adjective ("weekly report") of a one-off task.
+_TRAILING = r"(?=\s*(?:$|[,;.!]|\b(?:at|on|by|from|starting|until|till|before)\b))"
+
+PATTERNS = [
+    (re.compile(rf"{_REPEAT}every\s+weekdays?\b", re.I), lambda m: "FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR"),
+    (re.compile(rf"{_REPEAT}every\s+({_DAY}(?:\s*(?:,|and|&)\s*{_DAY})*)\b", re.I),
+     lambda m: "FREQ=WEEKLY;BYDAY=" + ",".join(
+         dict.fromkeys(WEEKDAYS[d[:3].lower()] for d in re.findall(_DAY, m.group(1), re.I)))),
+    (re.compile(rf"{_REPEAT}every\s+(\d+)\s+(day|week|month)s\b", re.I),
+     lambda m: f"FREQ={_UNITS[m.group(2).lower()]};INTERVAL={int(m.group(1))}"),
+    (re.compile(rf"{_REPEAT}every\s+other\s+(day|week|month)\b", re.I),
+     lambda m: f"FREQ={_UNITS[m.group(1).lower()]};INTERVAL=2"),
+    (re.compile(rf"{_REPEAT}every\s+(day|week|month)\b", re.I), lambda m: f"FREQ={_UNITS[m.group(1).lower()]}"),
+    (re.compile(r"\brepeat(?:s|ing)?\s+(daily|weekly|monthly)\b", re.I),
+     lambda m: f"FREQ={_ADVERBS[m.group(1).lower()]}"),
+    (re.compile(rf"(?<=\w)\s+(daily|weekly|monthly){_TRAILING}", re.I),
+     lambda m: f"FREQ={_ADVERBS[m.group(1).lower()]}"),
+]
+
+
+def parse_recurrence(text):
+    """
+    Finds a repeat directive ("every monday", "repeat daily", "every 2 weeks",
+    a trailing "weekly", ...). Returns (rule, text_without_phrase), or
+    (None, text) if there is none.
+
+    >>> parse_recurrence("standup notes every weekday at 10am")
+    ('FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR', 'standup notes at 10am')
+    >>> parse_recurrence("send the report to finance weekly by friday")
+    ('FREQ=WEEKLY', 'send the report to finance by friday')
+    >>> parse_recurrence("backup the db repeat daily")
+    ('FREQ=DAILY', 'backup the db')
+    >>> parse_recurrence("send the weekly report to finance by friday")
+    (None, 'send the weekly report to finance by friday')
+    >>> parse_recurrence("daily standup notes")
+    (None, 'daily standup notes')
+    >>> parse_recurrence("pay the monthly invoice")
+    (None, 'pay the monthly invoice')
+    """
+    for pattern, build in PATTERNS:
+        match = pattern.search(text)
+        if match:
+            cleaned = (text[:match.start()] + text[match.end():]).strip()
+            return build(match), re.sub(r"\s{2,}", " ", cleaned)
+    return None, text
+
+
+def _split_rule(rule):
+    """-> (RRULE body without COUNT/TZID, count or None, tzid or None)"""
+    count = tzid = None
+    rest = []
+    for part in (p for p in rule.split(";") if p):
+        key = part.split("=", 1)[0].upper()
+        if key == "COUNT":
+            count = int(part[6:])
+        elif key == "TZID":
+            tzid = part[5:]  # zone names are case sensitive
+        else:
+            rest.append(part.upper())
+    return ";".join(rest), count, tzid
+
+
+def _join_rule(body, count, tzid):
+    return body + (f";COUNT={count}" if count is not None else "") + (f";TZID={tzid}" if tzid else "")
+
+
+def with_timezone(rule, tz_name):
+    """Pins `rule` to the given zone (e.g. the creator's Slack timezone)."""
+    body, count, _ = _split_rule(rule)
+    return _join_rule(body, count, tz_name)
+
+
+def validate_rule(rule):
+    """Raises ValueError unless `rule` is a usable RRULE body."""
+    body, count, tzid = _split_rule(rule)
+    if tzid:
+        try:
+            pytz.timezone(tzid)
+        except pytz.UnknownTimeZoneError:
+            raise ValueError(f"Unknown timezone '{tzid}'")
+    if count is not None and count < 1:
+        raise ValueError("COUNT must be at least 1")
+    try:
+        rrulestr(body, dtstart=datetime(2000, 1, 1))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid recurrence rule '{rule}': {e}")
+    return _join_rule(body, count, tzid)
+
+
+def next_occurrence(rule, anchor, after=None, inclusive=False):
+    """
+    The first occurrence of `rule` after `after` (default: `anchor`), or at
+    it with inclusive. The series is laid out from the aware datetime
+    `anchor`, so occurrences keep its wall-clock time in the rule's zone.
+    None once the series is over (UNTIL passed).
+    """
+    body, _, tzid = _split_rule(rule)
+    tz = pytz.timezone(tzid) if tzid else IST
+    start = anchor.astimezone(tz).replace(tzinfo=None)
+    after = max(anchor, after).astimezone(tz).replace(tzinfo=None) if after else start
+    occurrence = rrulestr(body, dtstart=start).after(after, inc=inclusive)
+    return tz.localize(occurrence) if occurrence else None
+
+
+def advance_rule(rule):
+    """The rule carried by the next occurrence: COUNT drops by one; None when exhausted."""
+    body, count, tzid = _split_rule(rule)
+    if count is None:
+        return rule
+    if count <= 1:
+        return None
+    return _join_rule(body, count - 1, tzid)
+
+
+def describe(rule):
+    """Short human label for confirmations, e.g. 'every week on MO,WE'."""
+    body, count, _ = _split_rule(rule)
+    parts = dict(p.split("=", 1) for p in body.split(";") if "=" in p)
+    unit = {"DAILY": "day", "WEEKLY": "week", "MONTHLY": "month"}.get(parts.get("FREQ"), parts.get("FREQ", "").lower())
+    interval = int(parts.get("INTERVAL", 1))
+    label = f"every {unit}" if interval == 1 else f"every {interval} {unit}s"
+    if "BYDAY" in parts:
+        label += f" on {parts['BYDAY']}"
+    if count is not None:
+        label += f", {count} more"
+    return label
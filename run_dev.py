@@ -1,5 +1,30 @@
+"""
+Development reloader: restarts TARGET_SCRIPT when project files change.
+
+A warm "fork server" process imports the heavy third-party packages once
+(PRELOAD) and forks a fresh child for every restart. The child imports only
+the project's own modules, so a restart costs the project's import time
+instead of the whole dependency tree. The fork server is itself
+single-threaded, so forking from it is safe; the file watcher lives in
+this parent process and only tells it when to restart.
+
+Bursts of events (an editor's save, a `git checkout`) are debounced into
+one restart, and paths that cannot affect the app (.git, virtualenvs,
+caches, bench/) are ignored. A change to requirements.txt restarts the
+fork server too, so new dependency versions are picked up.
+
+Without os.fork (Windows), or with --no-fork, each restart spawns a new
+interpreter as before.
+
+  python run_dev.py
+  python run_dev.py --debounce 0.5 --no-fork
+"""
+import os
 import sys
 import time
+import signal
+import argparse
+import threading
 import subprocess
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
@@ -7,39 +32,235 @@ from watchdog.events import FileSystemEventHandler
 # REPLACE "main.py" WITH THE NAME OF YOUR MAIN SCRIPT
 TARGET_SCRIPT = "app.py"
 
-class RestartHandler(FileSystemEventHandler):
+# Imported once by the fork server; a module missing here is simply not preloaded
+PRELOAD = [
+    "google.genai", "groq", "dateparser", "dateparser.search", "slack_bolt",
+    "slack_bolt.adapter.socket_mode", "slack_sdk", "flask", "flask_socketio",
+    "psycopg2", "psycopg2.pool", "requests", "jwt", "pytz", "dateutil.rrule", "dotenv",
+]
+
+WATCHED_SUFFIXES = (".py", ".env")
+DEPENDENCY_FILES = ("requirements.txt",)
+IGNORED_DIRS = {".git", "__pycache__", "venv", ".venv", "env", "node_modules", ".mypy_cache",
+                ".pytest_cache", ".ruff_cache", ".tox", ".nox", "bench", "web"}
+STOP_GRACE_SECONDS = 5
+
+
+# --- Fork server (runs in its own process) ---
+
+def preload():
+    start = time.monotonic()
+    loaded = 0
+    for name in PRELOAD:
+        try:
+            __import__(name)
+            loaded += 1
+        except Exception as e:
+            print(f"⚠️ Not preloaded: {name} ({e})")
+    print(f"📦 Preloaded {loaded} packages in {time.monotonic() - start:.1f}s")
+    if threading.active_count() > 1:
+        print("⚠️ A preloaded package started a thread; forked children may hang")
+
+
+def stop_child(pid):
+    if pid is None:
+        return
+    try:
+        os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + STOP_GRACE_SECONDS
+        while time.monotonic() < deadline:
+            if os.waitpid(pid, os.WNOHANG)[0]:
+                return
+            time.sleep(0.02)
+        print(f"🛑 {TARGET_SCRIPT} ignored SIGTERM; killing it")
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+    except (ProcessLookupError, ChildProcessError):
+        pass  # already gone (e.g. it crashed and was reaped)
+
+
+def fork_child():
+    pid = os.fork()
+    if pid:
+        return pid
+
+    # Child: a fresh __main__ from TARGET_SCRIPT; project modules are not yet imported
+    code = 1
+    try:
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)  # stdin carries the fork server's commands
+        import random
+        import runpy
+        random.seed()
+        sys.argv = [TARGET_SCRIPT]
+        runpy.run_path(TARGET_SCRIPT, run_name="__main__")
+        code = 0
+    except KeyboardInterrupt:
+        code = 0
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+def fork_server():
+    """Reads "restart" lines from stdin; stops the child and exits at EOF."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent decides when we stop
+    sys.stdout.reconfigure(line_buffering=True)
+    preload()
+    child = None
+    while True:
+        command = sys.stdin.readline()
+        if not command:
+            break
+        if command.strip() == "restart":
+            start = time.monotonic()
+            stop_child(child)
+            child = fork_child()
+            print(f"🔄 Started {TARGET_SCRIPT} (pid {child}) in {(time.monotonic() - start) * 1000:.0f} ms")
+    stop_child(child)
+
+
+# --- Runners (used by the watcher) ---
+
+class ForkRunner:
+    def __init__(self):
+        self.server = None
+
+    def start(self):
+        self.server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--fork-server"],
+                                       stdin=subprocess.PIPE, text=True)
+        self.restart()
+
+    def restart(self):
+        if self.server.poll() is not None:
+            print("⚠️ Fork server exited; starting a new one")
+            self.start()
+            return
+        self.server.stdin.write("restart\n")
+        self.server.stdin.flush()
+
+    def stop(self):
+        if self.server and self.server.poll() is None:
+            self.server.stdin.close()  # EOF: the server stops the app and exits
+            try:
+                self.server.wait(STOP_GRACE_SECONDS + 2)
+            except subprocess.TimeoutExpired:
+                self.server.kill()
+                self.server.wait()
+
+
+class SpawnRunner:
     def __init__(self):
         self.process = None
-        self.start_process()
 
-    def start_process(self):
-        if self.process:
-            print("🛑 Stopping previous process...")
-            self.process.kill()      # Kill old process
-            self.process.wait()      # Ensure it fully stops
+    def start(self):
+        self.restart()
 
+    def restart(self):
+        self.stop()
         print(f"🔄 Starting {TARGET_SCRIPT}...")
         self.process = subprocess.Popen([sys.executable, TARGET_SCRIPT])
 
-    def on_modified(self, event):
-        # restart only when Python files change
-        if event.src_path.endswith(".py"):
-            print(f"⚡ Detected change in: {event.src_path}. Restarting...")
-            self.start_process()
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            print("🛑 Stopping previous process...")
+            self.process.terminate()
+            try:
+                self.process.wait(STOP_GRACE_SECONDS)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
 
-if __name__ == "__main__":
-    handler = RestartHandler()
-    observer = Observer()
+# --- Watcher ---
+
+def is_relevant(path, root):
+    rel = os.path.relpath(os.path.abspath(path), root)
+    parts = rel.split(os.sep)
+    if rel.startswith("..") or any(p in IGNORED_DIRS or p.endswith(".egg-info") for p in parts[:-1]):
+        return False
+    name = parts[-1]
+    if name.startswith((".#", "~")) or name.endswith(("~", ".swp", ".swx", ".tmp")):
+        return False  # editor scratch files
+    return name.endswith(WATCHED_SUFFIXES) or name in DEPENDENCY_FILES
+
+
+class RestartHandler(FileSystemEventHandler):
+    """Collects relevant changed paths; take_quiet() hands them over once events stop."""
+
+    def __init__(self, root):
+        self.root = root
+        self.changed = set()
+        self.last_event = 0.0
+        self.lock = threading.Lock()
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type not in ("modified", "created", "moved", "deleted"):
+            return
+        for path in (event.src_path, getattr(event, "dest_path", None)):
+            if path and is_relevant(path, self.root):
+                with self.lock:
+                    self.changed.add(os.path.relpath(path, self.root))
+                    self.last_event = time.monotonic()
+
+    def take_quiet(self, debounce):
+        with self.lock:
+            if not self.changed or time.monotonic() - self.last_event < debounce:
+                return None
+            changed, self.changed = self.changed, set()
+            return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=f"Run {TARGET_SCRIPT}, restarting it when project files change.")
+    parser.add_argument("--debounce", type=float, default=0.3, help="seconds without changes before restarting")
+    parser.add_argument("--no-fork", action="store_true", help="spawn a new interpreter per restart")
+    parser.add_argument("--fork-server", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
 
-    # Watch current directory
-    observer.schedule(handler, path=".", recursive=True)
+    if args.fork_server:
+        fork_server()
+        return
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # clean up the app like Ctrl+C does
+    root = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(root)
+    runner = SpawnRunner() if args.no_fork or not hasattr(os, "fork") else ForkRunner()
+    runner.start()
+
+    handler = RestartHandler(root)
+    observer = Observer()
+    observer.schedule(handler, path=root, recursive=True)
     observer.start()
 
     try:
         while True:
-            time.sleep(1)
+            time.sleep(0.05)
+            changed = handler.take_quiet(args.debounce)
+            if not changed:
+                continue
+            shown = ", ".join(sorted(changed)[:3]) + (f" and {len(changed) - 3} more" if len(changed) > 3 else "")
+            print(f"⚡ Detected change in: {shown}. Restarting...")
+            if any(os.path.basename(p) in DEPENDENCY_FILES for p in changed):
+                print("📦 Dependencies changed; restarting the fork server")
+                runner.stop()
+                runner.start()
+            else:
+                runner.restart()
     except KeyboardInterrupt:
+        pass
+    finally:
         observer.stop()
-        if handler.process:
-            handler.process.kill()
+        runner.stop()
     observer.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+import time
+import logging
+from base64 import b64encode
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import requests
+from requests.adapters import HTTPAdapter
+from slack_sdk import WebClient
+from slack_sdk.web import SlackResponse
+from slack_sdk.web.internal_utils import _build_req_args, _get_url, convert_bool_to_0_or_1
+
+# Slack's published per-method tiers (calls per minute, per workspace).
+# Unlisted methods are treated as Tier 3.
+TIER_PER_MINUTE = {1: 1, 2: 20, 3: 50, 4: 100}
+METHOD_TIERS = {
+    "auth.test": 4,
+    "users.info": 4,
+    "users.list": 2,
+    "users.lookupByEmail": 3,
+    "conversations.open": 3,
+    "conversations.members": 4,
+    "conversations.info": 3,
+    "usergroups.list": 2,
+    "usergroups.users.list": 2,
+    "chat.update": 3,
+    "chat.delete": 3,
+    "chat.postEphemeral": 4,
+    "views.open": 4,
+    "views.publish": 4,
+}
+# chat.postMessage is limited per channel (about one per second, short bursts allowed)
+POST_MESSAGE_RATE = 1.0
+POST_MESSAGE_BURST = 3
+
+_lane = threading.local()
+
+
+def current_lane():
+    return getattr(_lane, "name", "interactive")
+
+
+def set_lane(name):
+    """Sets the calling thread's default lane (e.g. "background" for reminder loops)."""
+    _lane.name = name
+
+
+@contextmanager
+def slack_lane(name):
+    """Runs the block's Slack calls in the "interactive" or "background" lane."""
+    previous = current_lane()
+    _lane.name = name
+    try:
+        yield
+    finally:
+        _lane.name = previous
+
+
+class _MethodBucket:
+    __slots__ = ("capacity", "rate", "tokens", "updated", "blocked_until", "interactive_waiting")
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.interactive_waiting = 0
+
+
+class SlackClient(WebClient):
+    """
+    The one Slack client every part of the app uses (config.client, and the
+    client Bolt hands to listeners via the middleware in slack_handlers).
+
+    - Client-side token buckets per method, sized to Slack's tiers, so bursts
+      are smoothed here instead of bouncing off 429s. chat.postMessage is
+      bucketed per channel.
+    - Two priority lanes: "background" callers (reminders, digests) leave
+      `background_reserve` of every bucket to interactive callers and step
+      aside while an interactive call is waiting.
+    - A 429 honours Retry-After for every caller of that method, then retries.
+    - Requests go through one pooled requests.Session (keep-alive) instead of
+      a new TLS connection per call.
+    - post_many() fans a batch of DMs out over `fanout_workers` threads.
+    - Per-method call, error, 429, throttle-wait and latency counters.
+    """
+
+    def __init__(self, token=None, pool_size=16, max_retries=3, background_reserve=0.25, fanout_workers=8, **kwargs):
+        super().__init__(token=token, **kwargs)
+        self.max_retries = max_retries
+        self.background_reserve = background_reserve
+        self._http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self._http.mount("https://", adapter)
+        self._buckets = {}
+        self._cond = threading.Condition()
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        self._fanout = ThreadPoolExecutor(max_workers=fanout_workers, thread_name_prefix="slack-fanout")
+
+    # --- Admission ---
+
+    def _bucket_for(self, api_method, channel):
+        key = (api_method, channel) if api_method == "chat.postMessage" else api_method
+        with self._cond:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if api_method == "chat.postMessage":
+                    bucket = _MethodBucket(POST_MESSAGE_BURST, POST_MESSAGE_RATE)
+                else:
+                    per_minute = TIER_PER_MINUTE[METHOD_TIERS.get(api_method, 3)]
+                    bucket = _MethodBucket(per_minute, per_minute / 60.0)
+                self._buckets[key] = bucket
+        return bucket
+
+    def _acquire(self, bucket):
+        """Blocks until this lane may make one call; returns seconds waited."""
+        interactive = current_lane() == "interactive"
+        reserve = 0 if interactive else min(bucket.capacity * self.background_reserve, bucket.capacity - 1)
+        start = time.monotonic()
+        with self._cond:
+            if interactive:
+                bucket.interactive_waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    bucket.tokens = min(bucket.capacity, bucket.tokens + (now - bucket.updated) * bucket.rate)
+                    bucket.updated = now
+                    yielding = not interactive and bucket.interactive_waiting
+                    if now >= bucket.blocked_until and not yielding and bucket.tokens - reserve >= 1:
+                        bucket.tokens -= 1
+                        return now - start
+                    wait = max(bucket.blocked_until - now, (1 + reserve - bucket.tokens) / bucket.rate, 0.01)
+                    self._cond.wait(wait)
+            finally:
+                if interactive:
+                    bucket.interactive_waiting -= 1
+                    self._cond.notify_all()
+
+    def _block(self, bucket, seconds):
+        with self._cond:
+            bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + seconds)
+            bucket.tokens = 0
+
+    # --- Transport ---
+
+    def api_call(self, api_method, *, http_verb="POST", files=None, data=None, params=None,
+                 json=None, headers=None, auth=None):
+        if files is not None:
+            # Multipart uploads keep slack_sdk's own transport
+            return super().api_call(api_method, http_verb=http_verb, files=files, data=data,
+                                    params=params, json=json, headers=headers, auth=auth)
+
+        channel = (json or data or params or {}).get("channel")
+        bucket = self._bucket_for(api_method, channel)
+        url = _get_url(self.base_url, api_method)
+        # slack_sdk's own request building: User-Agent and client headers,
+        # default_params, None values dropped, a "token" param moved to the header
+        if isinstance(json, dict):
+            json = {k: v for k, v in json.items() if v is not None}
+        req_args = _build_req_args(
+            token=self.token, http_verb=http_verb, files=None, data=data,
+            default_params=self.default_params, params=params, json=json,
+            headers={**(headers or {}), **self.headers}, auth=auth, ssl=None, proxy=None,
+        )
+        req_headers = req_args["headers"]
+        if auth is not None:
+            # oauth.v2.access / oauth.access: Basic auth replaces the bot token
+            if isinstance(auth, dict):
+                auth = b64encode(f"{auth['client_id']}:{auth['client_secret']}".encode()).decode("ascii")
+                auth = f"Basic {auth}"
+            req_headers = {k: v for k, v in req_headers.items() if k != "Authorization"}
+            req_headers["Authorization"] = auth
+        # Like slack_sdk, a POST sends params in the form body; only GET uses the query string
+        if http_verb == "GET":
+            query, form = req_args["params"], req_args["data"]
+        else:
+            query, form = None, {**(req_args["params"] or {}), **(req_args["data"] or {})} or None
+        query, form = convert_bool_to_0_or_1(query), convert_bool_to_0_or_1(form)
+
+        for attempt in range(self.max_retries + 1):
+            waited = self._acquire(bucket)
+            start = time.monotonic()
+            try:
+                resp = self._http.request(
+                    http_verb, url, params=query, data=form, json=req_args["json"],
+                    headers=req_headers, timeout=self.timeout,
+                )
+            except requests.RequestException as e:
+                self._record(api_method, waited, time.monotonic() - start, error=True)
+                # Only retry what cannot have reached Slack twice (no duplicate posts)
+                if attempt == self.max_retries or (http_verb != "GET" and not isinstance(e, requests.ConnectTimeout)):
+                    raise
+                time.sleep(min(2 ** attempt, 10))
+                continue
+
+            self._record(api_method, waited, time.monotonic() - start,
+                         error=resp.status_code >= 400, limited=resp.status_code == 429)
+            if resp.status_code == 429 and attempt < self.max_retries:
+                retry_after = int(resp.headers.get("Retry-After", 1))
+                logging.warning(f"Slack 429 on {api_method}; pausing it for {retry_after}s")
+                self._block(bucket, retry_after)
+                continue
+            break
+
+        try:
+            body = resp.json()
+        except ValueError:
+            body = resp.content
+        return SlackResponse(
+            client=self,
+            http_verb=http_verb,
+            api_url=url,
+            req_args={"headers": req_headers, "data": form, "params": query, "json": req_args["json"]},
+            data=body,
+            headers=dict(resp.headers),
+            status_code=resp.status_code,
+        ).validate()
+
+    # --- Fan-out ---
+
+    def post_many(self, messages, lane="background"):
+        """
+        chat.postMessage for every kwargs dict in `messages`, concurrently.
+        The limit is per channel, so DMs to different users do not queue
+        behind each other. Blocks until all are sent; returns
+        [(message, exception), ...] for the ones that failed.
+        """
+        def send(message):
+            with slack_lane(lane):
+                try:
+                    self.chat_postMessage(**message)
+                except Exception as e:
+                    return message, e
+
+        return [failure for failure in self._fanout.map(send, messages) if failure]
+
+    # --- Metrics ---
+
+    def _record(self, api_method, waited, latency, error=False, limited=False):
+        with self._stats_lock:
+            s = self._stats.get(api_method)
+            if s is None:
+                s = self._stats[api_method] = {"calls": 0, "errors": 0, "rate_limited": 0,
+                                               "wait_seconds": 0.0, "latencies": deque(maxlen=200)}
+            s["calls"] += 1
+            s["errors"] += error
+            s["rate_limited"] += limited
+            s["wait_seconds"] += waited
+            s["latencies"].append(latency)
+
+    def metrics(self):
+        with self._stats_lock:
+            snapshot = {m: (dict(s), sorted(s["latencies"])) for m, s in self._stats.items()}
+        result = {}
+        for method, (s, samples) in snapshot.items():
+            del s["latencies"]
+            s["wait_seconds"] = round(s["wait_seconds"], 3)
+            s["p50_ms"] = round(samples[len(samples) // 2] * 1000, 1) if samples else None
+            s["p95_ms"] = round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 1) if samples else None
+            result[method] = s
+        return result
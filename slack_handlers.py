@@ -1,15 +1,55 @@
 import re
 import jwt
+import json
 import uuid
 import time
+import threading
 from datetime import datetime
-from config import slack_app, PUBLIC_HOST,  SECRET_KEY,DATABASE_URL
-from database import add_task_db, delete_task_internal,get_db_connection
-from helpers import extract_due_date, complete_task_logic
+from config import slack_app, PUBLIC_HOST,  SECRET_KEY,DATABASE_URL, MAX_TASK_ASSIGNEES, SLACK_PAYLOAD_LOG
+from config import client as shared_client
+from database import store, add_task_db, emit_task_update, delete_task_internal, get_task_creator, create_login_token, search_tasks, set_reminder_mode
+from helpers import extract_due_date, complete_task_logic, task_blocks, complete_from_button, snooze_from_button
+from action_queue import action_queue
+from membership import membership_index
+from rate_limit import limiter
+from recurrence import parse_recurrence, next_occurrence, describe, with_timezone
+from user_clock import user_clocks
 import pytz
 IST = pytz.timezone("Asia/Kolkata")
 
 
+@slack_app.middleware
+def use_shared_client(context, next):
+    """Bolt builds a plain WebClient per request; hand listeners the shared rate-limited one."""
+    context["client"] = shared_client
+    next()
+
+_payload_log_lock = threading.Lock()
+
+@slack_app.middleware
+def record_payload(body, next):
+    """With SLACK_PAYLOAD_LOG set, appends command and button payloads for bench/slack_load.py to replay."""
+    if SLACK_PAYLOAD_LOG and (body.get("command") or body.get("type") == "block_actions"):
+        entry = {k: v for k, v in body.items() if k not in ("token", "response_url", "trigger_id")}
+        line = json.dumps({"at": time.time(), "body": entry}, ensure_ascii=False)
+        try:
+            with _payload_log_lock, open(SLACK_PAYLOAD_LOG, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print(f"⚠️ Could not record payload: {e}")
+    next()
+
+@slack_app.middleware
+def admit_command(body, ack, next):
+    """Per-user / per-workspace command budget; rejects immediately instead of queueing."""
+    command = body.get("command")
+    if command:
+        decision = limiter.admit("command", body.get("user_id"), command, workspace=body.get("team_id"))
+        if not decision.allowed:
+            # Returned, not just called: Bolt only sends a middleware's ack if it is the return value
+            return ack(f"⏳ You're sending commands too quickly. Try `{command}` again in {decision.retry_after}s.")
+    next()
+
 @slack_app.command("/addtask")
 def add_task(ack, body, client, logger):
     print("Inside add task")
@@ -26,55 +66,128 @@ def add_task(ack, body, client, logger):
         return
     print("After if cond")
     mentions = re.findall(r"<@([A-Z0-9]+)(?:\|[^>]+)?>", raw_text)
-    assigned_to_user_ids = mentions if mentions else [user_id_invoker]
     task_text = re.sub(r"<@([A-Z0-9]+)(?:\|[^>]+)?>", "", raw_text).strip()
-    
+
+    # User groups and channels expand to their members (not the invoker)
+    group_members, task_text, unresolved, empty = membership_index.expand(task_text, exclude={user_id_invoker})
+    if unresolved:
+        client.chat_postMessage(
+            channel=user_id_invoker,
+            text=f"⚠️ Couldn't read the members of {', '.join(unresolved)}. "
+                 f"For private channels, invite the bot first."
+        )
+        return
+    if empty:
+        # Assigning nobody would silently fall back to the invoker
+        client.chat_postEphemeral(
+            channel=body["channel_id"],
+            user=user_id_invoker,
+            text=f"⚠️ No members found for {', '.join(empty)}, so the task was not added."
+        )
+        return
+    mentions = list(dict.fromkeys(mentions + group_members))
+    if len(mentions) > MAX_TASK_ASSIGNEES:
+        client.chat_postMessage(
+            channel=user_id_invoker,
+            text=f"⚠️ That's {len(mentions)} people; a task can have at most {MAX_TASK_ASSIGNEES} assignees."
+        )
+        return
+    assigned_to_user_ids = mentions if mentions else [user_id_invoker]
+
+    # "every monday", "repeat daily", a trailing "weekly", ... is taken out before the due date is parsed
+    recurrence, task_text = parse_recurrence(task_text)
+
+    # Assignment DMs come out of the fan-out budget; checked before anything is written
+    recipients = {u for u in assigned_to_user_ids if u != user_id_invoker}
+    if recipients:
+        decision = limiter.admit("fanout", user_id_invoker, "/addtask", cost=len(recipients),
+                                 workspace=body.get("team_id"))
+        if decision.retry_after is None:
+            client.chat_postMessage(
+                channel=user_id_invoker,
+                text=f"⚠️ Too many recipients: that's {len(recipients)} people to notify, "
+                     f"and at most {limiter.capacity('fanout')} can be notified at once."
+            )
+            return
+        if not decision.allowed:
+            client.chat_postMessage(
+                channel=user_id_invoker,
+                text=f"⏳ Too many assignment notifications recently. Try again in {decision.retry_after}s."
+            )
+            return
+
+    # Due dates are read in the creator's own timezone and working hours
+    clock = user_clocks.get(user_id_invoker)
+
+    # Over the LLM budget the local parser handles the due date instead
+    llm_allowed = limiter.admit("llm", user_id_invoker, "/addtask", workspace=body.get("team_id")).allowed
     print("before date extr")
-    date_str, time_str, day_str, task_text = extract_due_date(task_text)
+    due_dt, task_text = extract_due_date(task_text, use_llm=llm_allowed, clock=clock)
+    due = due_dt.isoformat()
 
-    due = None
-    if date_str and time_str:
-        try:
-            year = datetime.now().year
-            due_dt = datetime.strptime(f"{date_str}:{year} {time_str}", "%d:%m:%Y %H:%M")
-            due = due_dt.isoformat()
-        except Exception as e:
-            print("⚠️ Date parse error:", e)
-    elif date_str and not time_str:
-        try:
-            year = datetime.now().year
-            time_str = "23:59"
-            due_dt = datetime.strptime(f"{date_str}:{year} {time_str}", "%d:%m:%Y %H:%M")
-            due = due_dt.isoformat()
-        except Exception as e:
-            print("⚠️ Date parse error:", e)
-
-    task_id = add_task_db(user_id_invoker, assigned_to_user_ids, task_text, due=due)
-
-    if due:
-        due_dt = datetime.fromisoformat(due)
-        due_str = due_dt.strftime("%a, %b %d at %I:%M %p")
-    else:
-        due_str = "No due time"
+    if recurrence:
+        # The series starts at the first matching day on or after the due
+        # date and keeps its local time of day
+        recurrence = with_timezone(recurrence, clock.tz.zone)
+        first = next_occurrence(recurrence, due_dt, inclusive=True)
+        if first:
+            due = first.isoformat()
+
+    task_id = add_task_db(user_id_invoker, assigned_to_user_ids, task_text, due=due, recurrence=recurrence)
+    emit_task_update([user_id_invoker] + assigned_to_user_ids, task_ids=[task_id])
+
+    def due_label(tz):
+        label = datetime.fromisoformat(due).astimezone(tz).strftime("%a, %b %d at %I:%M %p %Z") if due else "No due time"
+        return label + (f" (🔁 repeats {describe(recurrence)})" if recurrence else "")
+
+    due_str = due_label(clock.tz)
     
+    assignee_note = f"\n👥 *Assigned to:* {len(assigned_to_user_ids)} people" if group_members else ""
     client.chat_postMessage(
         channel=user_id_invoker,
-        text=f"✅ Task added: *{task_text}* (id: {task_id})\n⏰ *Due:* {due_str}"
+        text=f"✅ Task added: *{task_text}* (id: {task_id})\n⏰ *Due:* {due_str}{assignee_note}"
     )
-    
-    for assigned_user in assigned_to_user_ids:
-        if assigned_user == user_id_invoker:
-            continue
-        try:
-            dm = client.conversations_open(users=assigned_user)
-            dm_channel = dm["channel"]["id"]
-            msg_text = (
-                 f"🔔 *New Task Assigned!*\n" f"<@{user_id_invoker}> assigned you: *{task_text}*\n"
-                 f"⏰ *Due:* {due_str}"
-                 )
-            client.chat_postMessage(channel=dm_channel, text=msg_text)
-        except Exception as e:
-            logger.exception(f"DM failed for {assigned_user}: {e}")
+
+    # One message per timezone (the due time is shown in the assignee's own);
+    # posting to the user ID opens the DM implicitly, and post_many sends them in parallel
+    messages = []
+    for assignee_clock, users in user_clocks.by_zone(recipients).items():
+        msg_text = (
+             f"🔔 *New Task Assigned!*\n" f"<@{user_id_invoker}> assigned you: *{task_text}*\n"
+             f"⏰ *Due:* {due_label(assignee_clock.tz)}"
+             )
+        blocks = task_blocks(msg_text, task_id)
+        messages.extend({"channel": user, "text": msg_text, "blocks": blocks} for user in users)
+    failures = shared_client.post_many(messages)
+    for message, e in failures:
+        logger.error(f"DM failed for {message['channel']}: {e}")
+
+# --- Task buttons (helpers.task_blocks) ---
+# Handlers only ack and enqueue; the DB write and the message update run on
+# action_queue's workers, so Slack gets its ack within milliseconds.
+
+def enqueue_button_job(body, key, fn, *args):
+    if not action_queue.submit(key, fn, *args):
+        shared_client.chat_postEphemeral(channel=body["channel"]["id"], user=body["user"]["id"],
+                                         text="⏳ Busy right now, please click again in a moment.")
+
+@slack_app.action("task_complete")
+def complete_button(ack, body, action):
+    ack()
+    task_id, user_id = int(action["value"]), body["user"]["id"]
+    enqueue_button_job(body, ("complete", task_id, user_id), complete_from_button,
+                       task_id, user_id, body["channel"]["id"], body["message"]["ts"])
+
+@slack_app.action("task_snooze")
+def snooze_button(ack, body, action):
+    ack()
+    task_id, user_id = int(action["value"]), body["user"]["id"]
+    enqueue_button_job(body, ("snooze", task_id, user_id), snooze_from_button,
+                       task_id, user_id, body["channel"]["id"], body["message"]["ts"], body["message"].get("text", ""))
+
+@slack_app.action("task_open_dashboard")
+def open_dashboard_button(ack):
+    ack()  # URL button: Slack opens the link itself, the click only needs acknowledging
 
 @slack_app.command("/deletetask")
 def delete_task(ack, body, client, logger):
@@ -88,11 +201,7 @@ def delete_task(ack, body, client, logger):
 
     task_id = int(text)
 
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT user_id FROM tasks WHERE id=%s", (task_id,))
-    row = c.fetchone()
-    conn.close()
+    row = get_task_creator(task_id)
 
     if not row:
         client.chat_postMessage(channel=user_id, text="❌ Task not found.")
@@ -123,6 +232,77 @@ def complete_task_command(ack, body, client):
     success, msg = complete_task_logic(task_id, user_id)
     client.chat_postMessage(channel=user_id, text=f"{'✅' if success else '⚠️'} {msg}")
 
+@slack_app.command("/findtask")
+def find_task(ack, body, client):
+    ack()
+    user_id = body["user_id"]
+    query = body.get("text", "").strip()
+
+    if not query:
+        client.chat_postMessage(channel=user_id, text="⚠️ Usage: `/findtask <words>` e.g. `/findtask invoice march`")
+        return
+    if not store.supports("search"):
+        client.chat_postMessage(channel=user_id, text="⚠️ Search is not available on this deployment.")
+        return
+
+    results = search_tasks(user_id, query, limit=10)
+    if not results:
+        client.chat_postMessage(channel=user_id, text=f"🔍 No tasks found for *{query}*.")
+        return
+
+    lines = []
+    for r in results:
+        status = "🗄️ Archived" if r["archived"] else ("✅ Done" if r["done"] else "⏳ Pending")
+        lines.append(f"• *{r['text']}* (ID: {r['id']}) — {status}, due {r['due']}, by <@{r['creator_id']}>")
+
+    client.chat_postMessage(
+        channel=user_id,
+        text=f"🔍 *Results for* _{query}_\n" + "\n".join(lines)
+    )
+
+@slack_app.command("/remindermode")
+def reminder_mode(ack, body, client):
+    ack()
+    user_id = body["user_id"]
+    mode = body.get("text", "").strip().lower()
+
+    if mode not in ("digest", "individual"):
+        client.chat_postMessage(
+            channel=user_id,
+            text="⚠️ Usage: `/remindermode digest` (one daily summary) or `/remindermode individual` (one DM per task)"
+        )
+        return
+
+    set_reminder_mode(user_id, mode)
+    client.chat_postMessage(channel=user_id, text=f"🔔 Daily reminders set to *{mode}* mode.")
+
+@slack_app.command("/workhours")
+def work_hours(ack, body, client):
+    ack()
+    user_id = body["user_id"]
+    text = body.get("text", "").strip().lower()
+    clock = user_clocks.get(user_id)
+
+    match = re.fullmatch(r"(\d{1,2})\s*-\s*(\d{1,2})", text)
+    if text == "default":
+        user_clocks.set_work_hours(user_id, None, None)
+        clock = user_clocks.get(user_id)
+    elif match and 0 <= int(match.group(1)) < int(match.group(2)) <= 24:
+        user_clocks.set_work_hours(user_id, int(match.group(1)), int(match.group(2)))
+        clock = user_clocks.get(user_id)
+    elif text:
+        client.chat_postMessage(
+            channel=user_id,
+            text="⚠️ Usage: `/workhours 9-18` (24-hour clock, your local time) or `/workhours default`"
+        )
+        return
+
+    client.chat_postMessage(
+        channel=user_id,
+        text=f"🕘 Your working hours: *{clock.work_start:02d}:00–{clock.work_end:02d}:00* ({clock.tz.zone}, "
+             f"from your Slack profile). Daily reminders arrive at the start of your day."
+    )
+
 @slack_app.command("/mytasks")
 def mytasks(ack, body, client):
     ack()
@@ -133,12 +313,7 @@ def mytasks(ack, body, client):
     expiration_time = time.time() + 3600
 
     # 2. Save to DB (One-time use)
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("INSERT INTO login_tokens (token_id, user_id, expires_at) VALUES (%s, %s, %s)", 
-              (token_unique_id, user_id, expiration_time))
-    conn.commit()
-    conn.close()
+    create_login_token(token_unique_id, user_id, expiration_time)
 
     # 3. Create JWT
     payload = {
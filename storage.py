@@ -0,0 +1,997 @@
+import re
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+
+# psycopg2 is only needed by the Postgres backend; SQLite deployments and the
+# conformance suite run without it
+try:
+    import psycopg2
+    import psycopg2.pool
+    import psycopg2.extensions
+    from psycopg2.extras import execute_values
+except ImportError:
+    psycopg2 = None
+
+PARAM_RE = re.compile(r"%\((\w+)\)s")
+
+
+class StoreBusy(RuntimeError):
+    """Raised when no pooled connection frees up within the store's acquire timeout."""
+
+
+class TaskStore:
+    """
+    Owns every query of the task lifecycle: tasks, assignments, login tokens
+    and reminder preferences. Subclasses supply connections and the few
+    statements whose SQL differs per dialect.
+
+    Write methods take the cursor of an open transaction() so callers can
+    commit extra work (stats, cache notifications) atomically with them.
+    Read methods open their own connection.
+
+    Queries use %(name)s parameters. Timestamps come back as aware datetimes
+    and booleans as bool on both backends.
+    """
+
+    dialect = None
+    features = frozenset()  # Postgres-only capabilities, see require()
+
+    QUERIES = {
+        "get_task": """
+            SELECT id, user_id, text, created_at, due, file_url, done, completed_at, recurrence
+            FROM tasks WHERE id = %(task_id)s
+        """,
+        "get_task_assignees": """
+            SELECT assigned_to FROM task_assignments WHERE task_id = %(task_id)s ORDER BY id
+        """,
+        "get_assignment": """
+            SELECT id, done FROM task_assignments
+            WHERE task_id = %(task_id)s AND assigned_to = %(user_id)s
+        """,
+        "complete_assignment": """
+            UPDATE task_assignments
+            SET done = TRUE, completed_at = %(completed_at)s, remarks = COALESCE(%(remarks)s, remarks)
+            WHERE id = %(assignment_id)s
+        """,
+        "complete_pending_assignments": """
+            UPDATE task_assignments
+            SET done = TRUE, completed_at = %(completed_at)s, remarks = COALESCE(%(remarks)s, remarks)
+            WHERE task_id = %(task_id)s AND done = FALSE
+            RETURNING id, assigned_to
+        """,
+        # The task itself is done once no assignment is pending
+        "close_task_if_done": """
+            UPDATE tasks SET done = TRUE, completed_at = %(completed_at)s
+            WHERE id = %(task_id)s AND done = FALSE
+              AND NOT EXISTS (SELECT 1 FROM task_assignments
+                              WHERE task_id = %(task_id)s AND done = FALSE)
+            RETURNING recurrence
+        """,
+        "recurring_heads": "SELECT id, recurrence, due, done FROM tasks WHERE recurrence IS NOT NULL",
+        "get_series_head": """
+            SELECT user_id, text, file_url, recurrence, COALESCE(series_id, id), due
+            FROM tasks WHERE id = %(task_id)s AND recurrence IS NOT NULL
+        """,
+        # Taking the rule off the head is what makes it "ours": a concurrent
+        # completion and scheduler pass cannot both spawn the next occurrence
+        "claim_series_head": """
+            UPDATE tasks SET recurrence = NULL
+            WHERE id = %(task_id)s AND recurrence IS NOT NULL
+            RETURNING id
+        """,
+        "insert_occurrence": """
+            INSERT INTO tasks (user_id, text, created_at, due, file_url, recurrence, series_id)
+            VALUES (%(user_id)s, %(text)s, %(created_at)s, %(due)s, %(file_url)s, %(recurrence)s, %(series_id)s)
+            RETURNING id
+        """,
+        "copy_assignments": """
+            INSERT INTO task_assignments (task_id, assigned_to)
+            SELECT %(new_id)s, assigned_to FROM task_assignments WHERE task_id = %(task_id)s ORDER BY id
+            RETURNING assigned_to
+        """,
+        "delete_task": "DELETE FROM tasks WHERE id = %(task_id)s",
+        "delete_task_assignments": "DELETE FROM task_assignments WHERE task_id = %(task_id)s",
+        "insert_login_token": """
+            INSERT INTO login_tokens (token_id, user_id, expires_at)
+            VALUES (%(token_id)s, %(user_id)s, %(expires_at)s)
+        """,
+        "purge_login_tokens": "DELETE FROM login_tokens WHERE expires_at < %(now)s",
+        # Burned in the same statement that checks it, so a link works exactly once
+        "consume_login_token": """
+            DELETE FROM login_tokens
+            WHERE token_id = %(token_id)s AND expires_at >= %(now)s
+            RETURNING user_id
+        """,
+        "set_reminder_mode": """
+            INSERT INTO user_preferences (user_id, reminder_mode) VALUES (%(user_id)s, %(mode)s)
+            ON CONFLICT (user_id) DO UPDATE SET reminder_mode = EXCLUDED.reminder_mode
+        """,
+        "set_work_hours": """
+            INSERT INTO user_preferences (user_id, reminder_mode, work_start, work_end)
+            VALUES (%(user_id)s, %(mode)s, %(start)s, %(end)s)
+            ON CONFLICT (user_id) DO UPDATE SET work_start = EXCLUDED.work_start, work_end = EXCLUDED.work_end
+        """,
+        "work_hours": """
+            SELECT user_id, work_start, work_end FROM user_preferences WHERE work_start IS NOT NULL
+        """,
+        "snooze_assignment": """
+            UPDATE task_assignments SET snoozed_until = %(until)s
+            WHERE task_id = %(task_id)s AND assigned_to = %(user_id)s AND done = FALSE
+            RETURNING id
+        """,
+        # Clearing the snooze is the claim, so each one is re-sent exactly once
+        "take_expired_snoozes": """
+            UPDATE task_assignments SET snoozed_until = NULL
+            WHERE snoozed_until <= %(now)s AND done = FALSE
+            RETURNING task_id, assigned_to, (SELECT text FROM tasks WHERE tasks.id = task_id)
+        """,
+        "release_escalation": """
+            DELETE FROM task_escalations
+            WHERE task_id = %(task_id)s AND recipient = %(recipient)s AND tier = %(tier)s
+        """,
+    }
+
+    # --- Connection handling (backend specific) ---
+
+    @contextmanager
+    def transaction(self, write=True):
+        """Yields a cursor; commits on success, rolls back on error."""
+        raise NotImplementedError
+
+    def _execute(self, c, name, params=None):
+        raise NotImplementedError
+
+    def init_schema(self):
+        with self.transaction() as c:
+            for statement in self.SCHEMA:
+                c.execute(statement)
+
+    def close(self):
+        pass
+
+    def supports(self, feature):
+        return feature in self.features
+
+    def require(self, feature):
+        if feature not in self.features:
+            raise NotImplementedError(f"'{feature}' is not available with the {self.dialect} storage backend")
+
+    def _fetchone(self, name, params=None):
+        with self.transaction(write=False) as c:
+            self._execute(c, name, params)
+            return c.fetchone()
+
+    def _fetchall(self, name, params=None):
+        with self.transaction(write=False) as c:
+            self._execute(c, name, params)
+            return c.fetchall()
+
+    # --- Tasks ---
+
+    def get_task(self, task_id):
+        """(id, user_id, text, created_at, due, file_url, done, completed_at, recurrence) or None."""
+        return self._fetchone("get_task", {"task_id": task_id})
+
+    def get_task_participants(self, task_id):
+        """(creator_id, text, [assignees]) or None, read in one transaction."""
+        with self.transaction(write=False) as c:
+            self._execute(c, "get_task", {"task_id": task_id})
+            row = c.fetchone()
+            if not row:
+                return None
+            self._execute(c, "get_task_assignees", {"task_id": task_id})
+            return row[1], row[2], [r[0] for r in c.fetchall()]
+
+    def insert_tasks(self, c, tasks, created_at):
+        """
+        `tasks` are (creator, assignees, text, due, file_url[, recurrence])
+        tuples. Inserts the tasks and their de-duplicated assignments; returns
+        the new task ids in input order and the (task_id, assignee) rows written.
+        """
+        raise NotImplementedError
+
+    def delete_task(self, c, task_id):
+        self._execute(c, "delete_task", {"task_id": task_id})
+        # Normally covered by ON DELETE CASCADE; kept for databases created without it
+        self._execute(c, "delete_task_assignments", {"task_id": task_id})
+
+    def iter_task_rows_for_user(self, uid, batch_size=500, task_ids=None):
+        """
+        Yields lists of (id, creator, assignee, text, due_str, done, created_str, remarks)
+        rows, newest task first, batch_size rows at a time. Dates are already
+        formatted as DD/MM/YYYY HH:MM. task_ids limits the result to those tasks.
+        """
+        raise NotImplementedError
+
+    # --- Completion ---
+
+    def get_assignment(self, c, task_id, user_id):
+        """(assignment_id, done) of this user's assignment, or None."""
+        self._execute(c, "get_assignment", {"task_id": task_id, "user_id": user_id})
+        return c.fetchone()
+
+    def complete_assignment(self, c, assignment_id, completed_at, remarks=None):
+        """remarks=None keeps the existing remarks."""
+        self._execute(c, "complete_assignment", {
+            "assignment_id": assignment_id, "completed_at": completed_at, "remarks": remarks,
+        })
+
+    def complete_pending_assignments(self, c, task_id, completed_at, remarks=None):
+        """Marks every pending assignment done; returns [(assignment_id, assigned_to), ...]."""
+        self._execute(c, "complete_pending_assignments", {
+            "task_id": task_id, "completed_at": completed_at, "remarks": remarks,
+        })
+        return c.fetchall()
+
+    def close_task_if_done(self, c, task_id, completed_at):
+        """Returns (closed, recurrence rule or None)."""
+        self._execute(c, "close_task_if_done", {"task_id": task_id, "completed_at": completed_at})
+        row = c.fetchone()
+        return (True, row[0]) if row else (False, None)
+
+    # --- Recurrence ---
+
+    def recurring_heads(self):
+        """(task_id, rule, due, done) for every task that still carries a recurrence rule."""
+        return self._fetchall("recurring_heads")
+
+    def claim_series_head(self, c, task_id):
+        """
+        Takes the rule off a series head. Returns (creator, text, file_url,
+        rule, series_id, due), or None if it had no rule (already advanced).
+        """
+        self._execute(c, "get_series_head", {"task_id": task_id})
+        head = c.fetchone()
+        if not head:
+            return None
+        # RETURNING sees the updated row, so the rule was read just above
+        self._execute(c, "claim_series_head", {"task_id": task_id})
+        return head if c.fetchone() else None
+
+    def insert_occurrence(self, c, head_id, creator, text, created_at, due, file_url, recurrence, series_id):
+        """Inserts the next occurrence with the head's assignees; returns (new_id, [assignees])."""
+        self._execute(c, "insert_occurrence", {
+            "user_id": creator, "text": text, "created_at": created_at, "due": due,
+            "file_url": file_url, "recurrence": recurrence, "series_id": series_id,
+        })
+        new_id = c.fetchone()[0]
+        self._execute(c, "copy_assignments", {"new_id": new_id, "task_id": head_id})
+        return new_id, [r[0] for r in c.fetchall()]
+
+    # --- Login tokens ---
+
+    def create_login_token(self, token_id, user_id, expires_at):
+        with self.transaction() as c:
+            self._execute(c, "insert_login_token", {
+                "token_id": token_id, "user_id": user_id, "expires_at": expires_at,
+            })
+
+    def consume_login_token(self, token_id, now):
+        """Returns the token's user_id and deletes it, or None if unknown/expired."""
+        with self.transaction() as c:
+            self._execute(c, "purge_login_tokens", {"now": now})
+            self._execute(c, "consume_login_token", {"token_id": token_id, "now": now})
+            row = c.fetchone()
+        return row[0] if row else None
+
+    # --- Reminders ---
+
+    def set_reminder_mode(self, uid, mode):
+        with self.transaction() as c:
+            self._execute(c, "set_reminder_mode", {"user_id": uid, "mode": mode})
+
+    def pending_tasks_by_assignee(self, default_mode, user_ids=None, known_ids=None):
+        """
+        [(assigned_to, mode, [(task_id, text, due), ...]), ...], tasks sorted by due date.
+        user_ids limits it to those assignees, plus, with known_ids, every
+        assignee not in known_ids.
+        """
+        raise NotImplementedError
+
+    def set_work_hours(self, uid, start, end, default_mode):
+        """
+        start/end are local hours (0-24); None clears the override. A new
+        preferences row gets `default_mode` as its reminder mode.
+        """
+        with self.transaction() as c:
+            self._execute(c, "set_work_hours", {"user_id": uid, "mode": default_mode, "start": start, "end": end})
+
+    def work_hours(self):
+        """(user_id, work_start, work_end) for every user with their own working hours."""
+        return self._fetchall("work_hours")
+
+    def snooze_assignment(self, task_id, user_id, until):
+        """Defers this user's pending assignment until `until`; False if there is none."""
+        with self.transaction() as c:
+            self._execute(c, "snooze_assignment", {"task_id": task_id, "user_id": user_id, "until": until})
+            return c.fetchone() is not None
+
+    def take_expired_snoozes(self, now):
+        """Clears every snooze that has run out; returns their (task_id, assigned_to, text)."""
+        with self.transaction() as c:
+            self._execute(c, "take_expired_snoozes", {"now": now})
+            return c.fetchall()
+
+    # --- Escalations ---
+
+    def claim_escalations(self, tier, notify, since, until, now):
+        """
+        Claims `tier` for every pending task due in (since, until], in one
+        statement over the pending due-time index. notify="assignee" gives a
+        row per pending, unsnoozed assignee; "creator" a row per task whose
+        creator is still waiting on someone else. Returns (task_id, recipient,
+        text, pending) for the rows newly claimed, pending being the
+        comma-separated assignees still on it (creator rows only). Recording
+        the claim is what makes each tier reach each recipient once per task.
+        """
+        with self.transaction() as c:
+            self._execute(c, f"claim_{notify}_escalations", {
+                "tier": tier, "since": since, "until": until, "now": now,
+            })
+            return c.fetchall()
+
+    def release_escalations(self, claims):
+        """Gives back (task_id, recipient, tier) claims whose message was not delivered."""
+        with self.transaction() as c:
+            for task_id, recipient, tier in claims:
+                self._execute(c, "release_escalation", {"task_id": task_id, "recipient": recipient, "tier": tier})
+
+    def overdue_by_creator(self, now):
+        """
+        (creator, task_id, text, due) for every pending task overdue at `now`
+        that waits on someone other than its creator, by creator then due time.
+        """
+        return self._fetchall("overdue_by_creator", {"now": now})
+
+
+class _PreparingConnection(psycopg2.extensions.connection if psycopg2 else object):
+    """Remembers which statements are already PREPAREd on this session."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+class PostgresTaskStore(TaskStore):
+    """
+    Postgres backend. Connections come from a thread-safe pool and named
+    queries are PREPAREd once per pooled session, so repeated calls skip
+    parsing and planning. Sessions run in `timezone`, which is what the
+    formatted dates of iter_task_rows_for_user are rendered in.
+
+    psycopg2's pool raises at once when it is empty, so callers queue on a
+    semaphore instead and get StoreBusy after `acquire_timeout` seconds.
+    No connection is held while a caller consumes a generator (e.g. a
+    streamed HTTP response): task listings are read in short keyset pages.
+    """
+
+    dialect = "postgres"
+    features = frozenset({"archive", "export", "search", "stats"})
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS tasks (
+            id SERIAL PRIMARY KEY,
+            user_id TEXT,
+            text TEXT,
+            created_at TIMESTAMP WITH TIME ZONE,
+            due TIMESTAMP WITH TIME ZONE,
+            file_url TEXT,
+            done BOOLEAN DEFAULT FALSE,
+            completed_at TIMESTAMP WITH TIME ZONE
+        )
+        """,
+        # RRULE of a recurring series, kept on its newest occurrence only (see recurrence.py)
+        "ALTER TABLE tasks ADD COLUMN IF NOT EXISTS recurrence TEXT",
+        "ALTER TABLE tasks ADD COLUMN IF NOT EXISTS series_id INTEGER",
+        """
+        CREATE TABLE IF NOT EXISTS task_assignments (
+            id SERIAL PRIMARY KEY,
+            task_id INTEGER REFERENCES tasks(id) ON DELETE CASCADE,
+            assigned_to TEXT,
+            done BOOLEAN DEFAULT FALSE,
+            completed_at TIMESTAMP WITH TIME ZONE,
+            remarks TEXT
+        )
+        """,
+        "ALTER TABLE task_assignments ADD COLUMN IF NOT EXISTS snoozed_until TIMESTAMP WITH TIME ZONE",
+        """
+        CREATE TABLE IF NOT EXISTS login_tokens (
+            token_id TEXT PRIMARY KEY,
+            user_id TEXT,
+            expires_at DOUBLE PRECISION
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_preferences (
+            user_id TEXT PRIMARY KEY,
+            reminder_mode TEXT NOT NULL DEFAULT 'digest'
+        )
+        """,
+        # Local working hours; NULL means the configured default
+        "ALTER TABLE user_preferences ADD COLUMN IF NOT EXISTS work_start SMALLINT",
+        "ALTER TABLE user_preferences ADD COLUMN IF NOT EXISTS work_end SMALLINT",
+        # Pending-only partial indexes keep the reminder scan and active-task
+        # lookups proportional to open work, not to total history.
+        "CREATE INDEX IF NOT EXISTS idx_tasks_user_id ON tasks (user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_task_assignments_task_id ON task_assignments (task_id)",
+        "CREATE INDEX IF NOT EXISTS idx_task_assignments_assigned_to ON task_assignments (assigned_to)",
+        """
+        CREATE INDEX IF NOT EXISTS idx_task_assignments_pending
+        ON task_assignments (task_id) WHERE done = FALSE
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_task_assignments_pending_assignee
+        ON task_assignments (assigned_to) WHERE done = FALSE
+        """,
+        # The recurrence scheduler only ever looks at series heads
+        "CREATE INDEX IF NOT EXISTS idx_tasks_recurring ON tasks (due) WHERE recurrence IS NOT NULL",
+        """
+        CREATE INDEX IF NOT EXISTS idx_task_assignments_snoozed
+        ON task_assignments (snoozed_until) WHERE snoozed_until IS NOT NULL
+        """,
+        # Escalation tiers already sent; the escalation pass only reads pending
+        # tasks whose due time it has just passed
+        """
+        CREATE TABLE IF NOT EXISTS task_escalations (
+            task_id INTEGER REFERENCES tasks(id) ON DELETE CASCADE,
+            recipient TEXT,
+            tier TEXT,
+            sent_at TIMESTAMP WITH TIME ZONE,
+            PRIMARY KEY (task_id, recipient, tier)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_tasks_pending_due ON tasks (due) WHERE done = FALSE",
+        # Tasks whose assignments were all completed before tasks.done was kept
+        # in step (close_task_if_done) are closed once; a no-op afterwards
+        """
+        UPDATE tasks
+        SET done = TRUE,
+            completed_at = COALESCE(completed_at, (SELECT MAX(ta.completed_at) FROM task_assignments ta
+                                                   WHERE ta.task_id = tasks.id))
+        WHERE done = FALSE
+          AND EXISTS (SELECT 1 FROM task_assignments ta WHERE ta.task_id = tasks.id)
+          AND NOT EXISTS (SELECT 1 FROM task_assignments ta WHERE ta.task_id = tasks.id AND ta.done = FALSE)
+        """,
+    )
+
+    QUERIES = dict(
+        TaskStore.QUERIES,
+        # Prepared statements need the parameter types spelled out
+        close_task_if_done="""
+            UPDATE tasks SET done = TRUE, completed_at = %(completed_at)s::timestamptz
+            WHERE id = %(task_id)s::int AND done = FALSE
+              AND NOT EXISTS (SELECT 1 FROM task_assignments
+                              WHERE task_id = %(task_id)s::int AND done = FALSE)
+            RETURNING recurrence
+        """,
+        copy_assignments="""
+            INSERT INTO task_assignments (task_id, assigned_to)
+            SELECT %(new_id)s::int, assigned_to FROM task_assignments WHERE task_id = %(task_id)s::int ORDER BY id
+            RETURNING assigned_to
+        """,
+        complete_assignment="""
+            UPDATE task_assignments
+            SET done = TRUE, completed_at = %(completed_at)s::timestamptz,
+                remarks = COALESCE(%(remarks)s::text, remarks)
+            WHERE id = %(assignment_id)s::int
+        """,
+        complete_pending_assignments="""
+            UPDATE task_assignments
+            SET done = TRUE, completed_at = %(completed_at)s::timestamptz,
+                remarks = COALESCE(%(remarks)s::text, remarks)
+            WHERE task_id = %(task_id)s::int AND done = FALSE
+            RETURNING id, assigned_to
+        """,
+        pending_tasks_by_assignee="""
+            SELECT ta.assigned_to,
+                   COALESCE(p.reminder_mode, %(default_mode)s::text),
+                   array_agg(t.id ORDER BY t.due NULLS LAST, t.id),
+                   array_agg(t.text ORDER BY t.due NULLS LAST, t.id),
+                   array_agg(t.due ORDER BY t.due NULLS LAST, t.id)
+            FROM task_assignments ta
+            JOIN tasks t ON t.id = ta.task_id
+            LEFT JOIN user_preferences p ON p.user_id = ta.assigned_to
+            WHERE ta.done = FALSE AND ta.assigned_to IS NOT NULL
+              AND (%(user_ids)s::text[] IS NULL OR ta.assigned_to = ANY(%(user_ids)s::text[])
+                   OR (%(known_ids)s::text[] IS NOT NULL AND NOT ta.assigned_to = ANY(%(known_ids)s::text[])))
+            GROUP BY ta.assigned_to, p.reminder_mode
+        """,
+        claim_assignee_escalations="""
+            INSERT INTO task_escalations (task_id, recipient, tier, sent_at)
+            SELECT t.id, ta.assigned_to, %(tier)s::text, %(now)s::timestamptz
+            FROM tasks t
+            JOIN task_assignments ta ON ta.task_id = t.id
+            WHERE t.done = FALSE
+              AND t.due > %(since)s::timestamptz AND t.due <= %(until)s::timestamptz
+              AND ta.done = FALSE AND ta.assigned_to IS NOT NULL
+              AND (ta.snoozed_until IS NULL OR ta.snoozed_until <= %(now)s::timestamptz)
+            ON CONFLICT DO NOTHING
+            RETURNING task_id, recipient, (SELECT text FROM tasks WHERE tasks.id = task_id), NULL::text
+        """,
+        claim_creator_escalations="""
+            INSERT INTO task_escalations (task_id, recipient, tier, sent_at)
+            SELECT t.id, t.user_id, %(tier)s::text, %(now)s::timestamptz
+            FROM tasks t
+            WHERE t.done = FALSE
+              AND t.due > %(since)s::timestamptz AND t.due <= %(until)s::timestamptz
+              AND t.user_id IS NOT NULL
+              AND EXISTS (SELECT 1 FROM task_assignments ta
+                          WHERE ta.task_id = t.id AND ta.done = FALSE AND ta.assigned_to <> t.user_id)
+            ON CONFLICT DO NOTHING
+            RETURNING task_id, recipient, (SELECT text FROM tasks WHERE tasks.id = task_id),
+                      (SELECT string_agg(ta.assigned_to, ',' ORDER BY ta.id) FROM task_assignments ta
+                       WHERE ta.task_id = task_escalations.task_id AND ta.done = FALSE)
+        """,
+        overdue_by_creator="""
+            SELECT t.user_id, t.id, t.text, t.due
+            FROM tasks t
+            WHERE t.done = FALSE AND t.due <= %(now)s::timestamptz AND t.user_id IS NOT NULL
+              AND EXISTS (SELECT 1 FROM task_assignments ta
+                          WHERE ta.task_id = t.id AND ta.done = FALSE AND ta.assigned_to <> t.user_id)
+            ORDER BY t.user_id, t.due, t.id
+        """,
+        release_escalation="""
+            DELETE FROM task_escalations
+            WHERE task_id = %(task_id)s::int AND recipient = %(recipient)s::text AND tier = %(tier)s::text
+        """,
+        # One keyset page of iter_task_rows_for_user; the trailing ta.id is the page cursor
+        tasks_for_user_page="""
+            SELECT t.id, t.user_id, ta.assigned_to, t.text,
+                   to_char(t.due, 'DD/MM/YYYY HH24:MI'), ta.done,
+                   to_char(t.created_at, 'DD/MM/YYYY HH24:MI'), ta.remarks, ta.id
+            FROM (
+                -- UNION instead of OR so each branch can use its own index
+                SELECT ta.id FROM task_assignments ta
+                WHERE ta.assigned_to = %(uid)s::text
+                  AND (%(ids)s::int[] IS NULL OR ta.task_id = ANY(%(ids)s::int[]))
+                UNION
+                SELECT ta.id FROM task_assignments ta JOIN tasks t ON t.id = ta.task_id
+                WHERE t.user_id = %(uid)s::text
+                  AND (%(ids)s::int[] IS NULL OR t.id = ANY(%(ids)s::int[]))
+            ) mine
+            JOIN task_assignments ta ON ta.id = mine.id
+            JOIN tasks t ON t.id = ta.task_id
+            WHERE %(after_task)s::int IS NULL
+               OR t.id < %(after_task)s::int
+               OR (t.id = %(after_task)s::int AND ta.id > %(after_assignment)s::int)
+            ORDER BY t.id DESC, ta.id
+            LIMIT %(limit)s::int
+        """,
+    )
+
+    def __init__(self, dsn, pool_size=10, timezone="Asia/Kolkata", acquire_timeout=5.0):
+        if psycopg2 is None:
+            raise RuntimeError("The postgres storage backend needs psycopg2 installed")
+        self.dsn = dsn
+        self.pool_size = pool_size
+        self.timezone = timezone
+        self.acquire_timeout = acquire_timeout
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        # name -> (SQL with $n placeholders, parameter names in $n order)
+        self._statements = {name: self._to_positional(sql) for name, sql in self.QUERIES.items()}
+
+    @staticmethod
+    def _to_positional(sql):
+        order = []
+
+        def replace(match):
+            if match.group(1) not in order:
+                order.append(match.group(1))
+            return f"${order.index(match.group(1)) + 1}"
+
+        return PARAM_RE.sub(replace, sql), order
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = psycopg2.pool.ThreadedConnectionPool(
+                        1, self.pool_size, self.dsn, connection_factory=_PreparingConnection,
+                        options=f"-c timezone={self.timezone}"
+                    )
+        return self._pool
+
+    @contextmanager
+    def _connection(self):
+        pool = self._get_pool()
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise StoreBusy(f"No database connection free within {self.acquire_timeout:g}s")
+        try:
+            conn = pool.getconn()
+        except BaseException:
+            self._slots.release()
+            raise
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            if not broken and not conn.closed:
+                try:
+                    conn.rollback()  # never hand back a connection mid-transaction
+                except psycopg2.Error:
+                    broken = True
+            pool.putconn(conn, close=broken or bool(conn.closed))
+            self._slots.release()
+
+    @contextmanager
+    def transaction(self, write=True):
+        with self._connection() as conn:
+            c = conn.cursor()
+            yield c
+            conn.commit()
+
+    def _execute(self, c, name, params=None):
+        sql, order = self._statements[name]
+        conn = c.connection
+        if name not in conn.prepared:
+            c.execute(f"PREPARE {name} AS {sql}")
+            conn.prepared.add(name)
+        if order:
+            c.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(order))})", [params[k] for k in order])
+        else:
+            c.execute(f"EXECUTE {name}")
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+
+    def insert_tasks(self, c, tasks, created_at):
+        # Multi-row inserts; SERIAL ids are handed out in VALUES order within one statement
+        returned = execute_values(c, """
+            INSERT INTO tasks (user_id, text, created_at, due, file_url, recurrence)
+            VALUES %s
+            RETURNING id
+        """, [(creator, text, created_at, due, file_url, rest[0] if rest else None)
+              for creator, _, text, due, file_url, *rest in tasks],
+            page_size=len(tasks), fetch=True)
+        ids = sorted(r[0] for r in returned)
+
+        assignment_rows = [
+            (task_id, user)
+            for task_id, (_, assignees, *_) in zip(ids, tasks)
+            for user in dict.fromkeys(assignees)  # de-duplicate repeated mentions
+        ]
+        execute_values(c, "INSERT INTO task_assignments (task_id, assigned_to) VALUES %s",
+                       assignment_rows, page_size=1000)
+        return ids, assignment_rows
+
+    def iter_task_rows_for_user(self, uid, batch_size=500, task_ids=None):
+        # Each page is its own short read; the connection is back in the pool
+        # before the page is yielded, however slowly the caller consumes it
+        params = {"uid": uid, "ids": list(task_ids) if task_ids is not None else None,
+                  "after_task": None, "after_assignment": None, "limit": batch_size}
+        while True:
+            rows = self._fetchall("tasks_for_user_page", params)
+            if not rows:
+                break
+            params["after_task"], params["after_assignment"] = rows[-1][0], rows[-1][-1]
+            yield [row[:-1] for row in rows]
+            if len(rows) < batch_size:
+                break
+
+    def pending_tasks_by_assignee(self, default_mode, user_ids=None, known_ids=None):
+        rows = self._fetchall("pending_tasks_by_assignee", {
+            "default_mode": default_mode,
+            "user_ids": list(user_ids) if user_ids is not None else None,
+            "known_ids": list(known_ids) if known_ids is not None else None,
+        })
+        return [
+            (assigned_to, mode, list(zip(ids, texts, dues)))
+            for assigned_to, mode, ids, texts, dues in rows
+        ]
+
+
+def _adapt_timestamp(value):
+    return value.isoformat()
+
+
+def _convert_timestamp(raw):
+    return datetime.fromisoformat(raw.decode())
+
+
+sqlite3.register_adapter(datetime, _adapt_timestamp)
+sqlite3.register_converter("TIMESTAMPTZ", _convert_timestamp)
+sqlite3.register_converter("BOOLEAN", lambda raw: raw not in (b"0", b""))
+
+
+class SQLiteTaskStore(TaskStore):
+    """
+    SQLite backend for single-node deployments and hermetic tests.
+
+    Runs in WAL mode so readers never block the writer; each thread keeps its
+    own connection and write transactions take the lock up front
+    (BEGIN IMMEDIATE) instead of failing on upgrade. Timestamps are stored as
+    ISO-8601 text with their offset, so wall-clock values round-trip exactly.
+    Full-text search, archival, COPY export and the stats aggregates are
+    Postgres-only (see `features`).
+    """
+
+    dialect = "sqlite"
+
+    PRAGMAS = (
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",  # durable at checkpoints; safe with WAL
+        "PRAGMA foreign_keys = ON",
+        "PRAGMA busy_timeout = 5000",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA cache_size = -16000",  # 16 MB page cache per connection
+        "PRAGMA mmap_size = 268435456",
+    )
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT,
+            text TEXT,
+            created_at TIMESTAMPTZ,
+            due TIMESTAMPTZ,
+            file_url TEXT,
+            done BOOLEAN DEFAULT FALSE,
+            completed_at TIMESTAMPTZ,
+            recurrence TEXT,
+            series_id INTEGER
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS task_assignments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER REFERENCES tasks(id) ON DELETE CASCADE,
+            assigned_to TEXT,
+            done BOOLEAN DEFAULT FALSE,
+            completed_at TIMESTAMPTZ,
+            remarks TEXT,
+            snoozed_until TIMESTAMPTZ
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS login_tokens (
+            token_id TEXT PRIMARY KEY,
+            user_id TEXT,
+            expires_at REAL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_preferences (
+            user_id TEXT PRIMARY KEY,
+            reminder_mode TEXT NOT NULL DEFAULT 'digest',
+            work_start INTEGER,
+            work_end INTEGER
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_tasks_user_id ON tasks (user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_task_assignments_task_id ON task_assignments (task_id)",
+        "CREATE INDEX IF NOT EXISTS idx_task_assignments_assigned_to ON task_assignments (assigned_to)",
+        """
+        CREATE INDEX IF NOT EXISTS idx_task_assignments_pending
+        ON task_assignments (task_id) WHERE done = FALSE
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_task_assignments_pending_assignee
+        ON task_assignments (assigned_to) WHERE done = FALSE
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_tasks_recurring ON tasks (due) WHERE recurrence IS NOT NULL",
+        """
+        CREATE INDEX IF NOT EXISTS idx_task_assignments_snoozed
+        ON task_assignments (snoozed_until) WHERE snoozed_until IS NOT NULL
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS task_escalations (
+            task_id INTEGER REFERENCES tasks(id) ON DELETE CASCADE,
+            recipient TEXT,
+            tier TEXT,
+            sent_at TIMESTAMPTZ,
+            PRIMARY KEY (task_id, recipient, tier)
+        )
+        """,
+        # Due times keep their creator's offset, so they only order correctly
+        # as julianday(); the escalation queries compare that same expression
+        "CREATE INDEX IF NOT EXISTS idx_tasks_pending_due ON tasks (julianday(due)) WHERE done = FALSE",
+        # Tasks whose assignments were all completed before tasks.done was kept
+        # in step (close_task_if_done) are closed once; a no-op afterwards
+        """
+        UPDATE tasks
+        SET done = TRUE,
+            completed_at = COALESCE(completed_at, (SELECT MAX(ta.completed_at) FROM task_assignments ta
+                                                   WHERE ta.task_id = tasks.id))
+        WHERE done = FALSE
+          AND EXISTS (SELECT 1 FROM task_assignments ta WHERE ta.task_id = tasks.id)
+          AND NOT EXISTS (SELECT 1 FROM task_assignments ta WHERE ta.task_id = tasks.id AND ta.done = FALSE)
+        """,
+    )
+
+    # Columns added after the first release, for files created before them
+    # (SQLite has no ADD COLUMN IF NOT EXISTS)
+    MIGRATIONS = {
+        "tasks": (("recurrence", "TEXT"), ("series_id", "INTEGER")),
+        "task_assignments": (("snoozed_until", "TIMESTAMPTZ"),),
+        "user_preferences": (("work_start", "INTEGER"), ("work_end", "INTEGER")),
+    }
+
+    # ISO text -> DD/MM/YYYY HH:MM without converting away from the stored offset
+    _DISPLAY = "substr({0}, 9, 2) || '/' || substr({0}, 6, 2) || '/' || substr({0}, 1, 4) || ' ' || substr({0}, 12, 5)"
+
+    QUERIES = dict(
+        TaskStore.QUERIES,
+        tasks_for_user=f"""
+            SELECT t.id, t.user_id, ta.assigned_to, t.text,
+                   {_DISPLAY.format("t.due")}, ta.done,
+                   {_DISPLAY.format("t.created_at")}, ta.remarks
+            FROM (
+                SELECT ta.id FROM task_assignments ta
+                WHERE ta.assigned_to = %(uid)s
+                  AND (%(ids)s IS NULL OR ta.task_id IN (SELECT value FROM json_each(%(ids)s)))
+                UNION
+                SELECT ta.id FROM task_assignments ta JOIN tasks t ON t.id = ta.task_id
+                WHERE t.user_id = %(uid)s
+                  AND (%(ids)s IS NULL OR t.id IN (SELECT value FROM json_each(%(ids)s)))
+            ) mine
+            JOIN task_assignments ta ON ta.id = mine.id
+            JOIN tasks t ON t.id = ta.task_id
+            ORDER BY t.id DESC, ta.id
+        """,
+        insert_task="""
+            INSERT INTO tasks (user_id, text, created_at, due, file_url, recurrence)
+            VALUES (%(user_id)s, %(text)s, %(created_at)s, %(due)s, %(file_url)s, %(recurrence)s)
+        """,
+        insert_assignment="INSERT INTO task_assignments (task_id, assigned_to) VALUES (%(task_id)s, %(assigned_to)s)",
+        pending_tasks_by_assignee="""
+            SELECT ta.assigned_to, COALESCE(p.reminder_mode, %(default_mode)s), t.id, t.text, t.due
+            FROM task_assignments ta
+            JOIN tasks t ON t.id = ta.task_id
+            LEFT JOIN user_preferences p ON p.user_id = ta.assigned_to
+            WHERE ta.done = FALSE AND ta.assigned_to IS NOT NULL
+              AND (%(user_ids)s IS NULL OR ta.assigned_to IN (SELECT value FROM json_each(%(user_ids)s))
+                   OR (%(known_ids)s IS NOT NULL
+                       AND ta.assigned_to NOT IN (SELECT value FROM json_each(%(known_ids)s))))
+            ORDER BY ta.assigned_to, t.due IS NULL, t.due, t.id
+        """,
+        # INSERT ... SELECT needs its WHERE clause for ON CONFLICT to parse
+        claim_assignee_escalations="""
+            INSERT INTO task_escalations (task_id, recipient, tier, sent_at)
+            SELECT t.id, ta.assigned_to, %(tier)s, %(now)s
+            FROM tasks t
+            JOIN task_assignments ta ON ta.task_id = t.id
+            WHERE t.done = FALSE
+              AND julianday(t.due) > julianday(%(since)s) AND julianday(t.due) <= julianday(%(until)s)
+              AND ta.done = FALSE AND ta.assigned_to IS NOT NULL
+              AND (ta.snoozed_until IS NULL OR julianday(ta.snoozed_until) <= julianday(%(now)s))
+            ON CONFLICT DO NOTHING
+            RETURNING task_id, recipient, (SELECT text FROM tasks WHERE tasks.id = task_id), NULL
+        """,
+        claim_creator_escalations="""
+            INSERT INTO task_escalations (task_id, recipient, tier, sent_at)
+            SELECT t.id, t.user_id, %(tier)s, %(now)s
+            FROM tasks t
+            WHERE t.done = FALSE
+              AND julianday(t.due) > julianday(%(since)s) AND julianday(t.due) <= julianday(%(until)s)
+              AND t.user_id IS NOT NULL
+              AND EXISTS (SELECT 1 FROM task_assignments ta
+                          WHERE ta.task_id = t.id AND ta.done = FALSE AND ta.assigned_to <> t.user_id)
+            ON CONFLICT DO NOTHING
+            RETURNING task_id, recipient, (SELECT text FROM tasks WHERE tasks.id = task_id),
+                      (SELECT group_concat(ta.assigned_to, ',') FROM task_assignments ta
+                       WHERE ta.task_id = task_escalations.task_id AND ta.done = FALSE)
+        """,
+        overdue_by_creator="""
+            SELECT t.user_id, t.id, t.text, t.due
+            FROM tasks t
+            WHERE t.done = FALSE AND julianday(t.due) <= julianday(%(now)s) AND t.user_id IS NOT NULL
+              AND EXISTS (SELECT 1 FROM task_assignments ta
+                          WHERE ta.task_id = t.id AND ta.done = FALSE AND ta.assigned_to <> t.user_id)
+            ORDER BY t.user_id, julianday(t.due), t.id
+        """,
+    )
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._statements = {name: PARAM_RE.sub(r":\1", sql) for name, sql in self.QUERIES.items()}
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode: transactions are opened explicitly in transaction()
+            conn = sqlite3.connect(self.path, isolation_level=None, detect_types=sqlite3.PARSE_DECLTYPES)
+            for pragma in self.PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self, write=True):
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        try:
+            yield c
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    def _execute(self, c, name, params=None):
+        params = {
+            k: json.dumps(v) if isinstance(v, (list, tuple, set)) else v
+            for k, v in (params or {}).items()
+        }
+        c.execute(self._statements[name], params)
+
+    def init_schema(self):
+        with self.transaction() as c:
+            for statement in self.SCHEMA:
+                if "CREATE INDEX" in statement:
+                    continue  # may reference migrated columns; created below
+                c.execute(statement)
+            for table, columns in self.MIGRATIONS.items():
+                existing = {row[1] for row in c.execute(f"PRAGMA table_info({table})")}
+                for name, decl in columns:
+                    if name not in existing:
+                        c.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+            for statement in self.SCHEMA:
+                if "CREATE INDEX" in statement:
+                    c.execute(statement)
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.execute("PRAGMA optimize")
+            conn.close()
+            self._local.conn = None
+
+    def insert_tasks(self, c, tasks, created_at):
+        # In-process inserts are cheap; one transaction covers the whole batch
+        ids, assignment_rows = [], []
+        for creator, assignees, text, due, file_url, *rest in tasks:
+            self._execute(c, "insert_task", {
+                "user_id": creator, "text": text, "created_at": created_at, "due": due, "file_url": file_url,
+                "recurrence": rest[0] if rest else None,
+            })
+            ids.append(c.lastrowid)
+            for user in dict.fromkeys(assignees):
+                self._execute(c, "insert_assignment", {"task_id": ids[-1], "assigned_to": user})
+                assignment_rows.append((ids[-1], user))
+        return ids, assignment_rows
+
+    def iter_task_rows_for_user(self, uid, batch_size=500, task_ids=None):
+        # Reads run outside transaction(): WAL gives them a consistent snapshot
+        # without holding the write lock
+        c = self._connect().cursor()
+        try:
+            self._execute(c, "tasks_for_user", {"uid": uid, "ids": list(task_ids) if task_ids is not None else None})
+            while True:
+                rows = c.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            c.close()
+
+    def pending_tasks_by_assignee(self, default_mode, user_ids=None, known_ids=None):
+        grouped = []
+        params = {"default_mode": default_mode,
+                  "user_ids": list(user_ids) if user_ids is not None else None,
+                  "known_ids": list(known_ids) if known_ids is not None else None}
+        for assigned_to, mode, task_id, text, due in self._fetchall("pending_tasks_by_assignee", params):
+            if not grouped or grouped[-1][0] != assigned_to:
+                grouped.append((assigned_to, mode, []))
+            grouped[-1][2].append((task_id, text, due))
+        return grouped
+
+
+def create_store(backend, database_url=None, sqlite_path=None, pool_size=10, acquire_timeout=5.0):
+    if backend == "postgres":
+        return PostgresTaskStore(database_url, pool_size=pool_size, acquire_timeout=acquire_timeout)
+    if backend == "sqlite":
+        return SQLiteTaskStore(sqlite_path)
+    raise ValueError(f"Unknown storage backend '{backend}' (expected 'postgres' or 'sqlite')")
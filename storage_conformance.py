@@ -0,0 +1,317 @@
+"""
+Behavioural conformance checks for the storage backends in storage.py.
+
+Every backend must pass the same checks. SQLite always runs (on a throwaway
+file); Postgres runs when a DSN is given. Checks use fresh random user IDs, so
+they can run against a database that already holds data.
+
+  python storage_conformance.py                      # SQLite only
+  python storage_conformance.py --postgres "$DATABASE_URL"
+"""
+import os
+import sys
+import time
+import uuid
+import argparse
+import tempfile
+import traceback
+from datetime import datetime, timedelta, timezone
+from storage import SQLiteTaskStore, PostgresTaskStore
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+
+def new_users(n):
+    tag = uuid.uuid4().hex[:8]
+    return [f"U{tag}{i}" for i in range(n)]
+
+
+def create(store, tasks, created_at=None):
+    with store.transaction() as c:
+        ids, _ = store.insert_tasks(c, tasks, created_at or datetime.now(IST))
+    return ids
+
+
+def check_insert_and_read(store):
+    creator, a, b = new_users(3)
+    due = datetime(2030, 1, 2, 18, 30, tzinfo=IST)
+    ids = create(store, [
+        (creator, [a, b, a], "first", due, "https://files/x"),
+        (creator, [creator], "second", None, None),
+    ])
+    assert len(ids) == 2 and ids[0] < ids[1], ids
+
+    row = store.get_task(ids[0])
+    assert row[0] == ids[0] and row[1] == creator and row[2] == "first", row
+    assert row[4] == due, f"due did not round-trip: {row[4]!r}"
+    assert row[5] == "https://files/x" and row[6] is False, row
+
+    # Repeated mentions are stored once, in mention order
+    assert store.get_task_participants(ids[0]) == (creator, "first", [a, b])
+    assert store.get_task(-1) is None
+    assert store.get_task_participants(-1) is None
+
+
+def check_tasks_for_user(store):
+    creator, a, b = new_users(3)
+    created = datetime(2030, 3, 4, 9, 5, tzinfo=IST)
+    ids = create(store, [
+        (creator, [a], "one", datetime(2030, 3, 5, 10, 0, tzinfo=IST), None),
+        (creator, [a, b], "two", None, None),
+        (b, [b], "three", None, None),
+    ], created_at=created)
+
+    batches = list(store.iter_task_rows_for_user(a, batch_size=1))
+    assert all(len(batch) == 1 for batch in batches), "batch_size not honoured"
+    rows = [r for batch in batches for r in batch]
+    assert [r[0] for r in rows] == [ids[1], ids[0]], "assignee view must be newest first"
+    assert rows[1][4] == "05/03/2030 10:00" and rows[1][6] == "04/03/2030 09:05", rows[1]
+    assert rows[0][4] is None and rows[0][5] is False and rows[0][7] is None, rows[0]
+
+    # The creator sees every assignment of their tasks, not just their own
+    rows = [r for batch in store.iter_task_rows_for_user(creator) for r in batch]
+    assert sorted((r[0], r[2]) for r in rows) == sorted([(ids[0], a), (ids[1], a), (ids[1], b)]), rows
+
+    rows = [r for batch in store.iter_task_rows_for_user(b, task_ids=[ids[2]]) for r in batch]
+    assert [r[0] for r in rows] == [ids[2]], "task_ids filter"
+    assert list(store.iter_task_rows_for_user(b, task_ids=[])) == [], "empty task_ids means no rows"
+
+
+def check_completion(store):
+    creator, a, b = new_users(3)
+    (task_id,) = create(store, [(creator, [a, b], "work", None, None)])
+    done_at = datetime(2030, 5, 6, 12, 0, tzinfo=IST)
+
+    with store.transaction() as c:
+        assignment_id, done = store.get_assignment(c, task_id, a)
+        assert done is False
+        store.complete_assignment(c, assignment_id, done_at, "note from a")
+        store.close_task_if_done(c, task_id, done_at)
+        assert store.get_assignment(c, task_id, creator) is None
+    assert store.get_task(task_id)[6] is False, "task closed while b is still pending"
+
+    with store.transaction() as c:
+        completed = store.complete_pending_assignments(c, task_id, done_at, None)
+        store.close_task_if_done(c, task_id, done_at)
+    assert [user for _, user in completed] == [b], "only pending assignments are completed"
+
+    task = store.get_task(task_id)
+    assert task[6] is True and task[7] == done_at, task
+    rows = {r[2]: r for batch in store.iter_task_rows_for_user(creator) for r in batch}
+    assert rows[a][7] == "note from a", "completing others must not overwrite remarks"
+    assert rows[b][5] is True
+
+    with store.transaction() as c:
+        assert store.complete_pending_assignments(c, task_id, done_at) == []
+
+
+def check_delete(store):
+    creator, a = new_users(2)
+    (task_id,) = create(store, [(creator, [a], "gone", None, None)])
+    with store.transaction() as c:
+        store.delete_task(c, task_id)
+    assert store.get_task(task_id) is None
+    assert list(store.iter_task_rows_for_user(a)) == []
+
+
+def check_rollback(store):
+    (creator,) = new_users(1)
+    try:
+        with store.transaction() as c:
+            store.insert_tasks(c, [(creator, [creator], "never", None, None)], datetime.now(IST))
+            raise RuntimeError("abort")
+    except RuntimeError:
+        pass
+    assert list(store.iter_task_rows_for_user(creator)) == [], "rolled back insert is visible"
+
+
+def check_login_tokens(store):
+    (user,) = new_users(1)
+    token, stale = uuid.uuid4().hex, uuid.uuid4().hex
+    now = time.time()
+    store.create_login_token(token, user, now + 3600)
+    store.create_login_token(stale, user, now - 1)
+
+    assert store.consume_login_token(stale, now) is None, "expired token accepted"
+    assert store.consume_login_token(token, now) == user
+    assert store.consume_login_token(token, now) is None, "token usable twice"
+
+
+def check_reminders(store):
+    creator, a, b = new_users(3)
+    early = datetime(2030, 7, 1, 10, 0, tzinfo=IST)
+    late = datetime(2030, 7, 2, 10, 0, tzinfo=IST)
+    ids = create(store, [
+        (creator, [a], "late", late, None),
+        (creator, [a], "undated", None, None),
+        (creator, [a, b], "early", early, None),
+    ])
+    store.set_reminder_mode(b, "digest")
+    store.set_reminder_mode(b, "individual")
+
+    grouped = {user: (mode, tasks) for user, mode, tasks in store.pending_tasks_by_assignee("digest")}
+    assert grouped[a] == ("digest", [(ids[2], "early", early), (ids[0], "late", late), (ids[1], "undated", None)]), grouped[a]
+    assert grouped[b] == ("individual", [(ids[2], "early", early)]), grouped[b]
+
+    # Narrowed to the users whose reminder is due, plus users outside known_ids
+    users = {user for user, *_ in store.pending_tasks_by_assignee("digest", user_ids=[b])}
+    assert users == {b}, users
+    users = {user for user, *_ in store.pending_tasks_by_assignee("digest", user_ids=[], known_ids=[creator, b])}
+    assert a in users and b not in users, users
+    assert store.pending_tasks_by_assignee("digest", user_ids=[]) == [], "empty user_ids means no rows"
+
+
+def check_work_hours(store):
+    a, b = new_users(2)
+    store.set_reminder_mode(a, "individual")
+    store.set_work_hours(a, 8, 16, "digest")
+    store.set_work_hours(b, 9, 17, "individual")
+    hours = {uid: (start, end) for uid, start, end in store.work_hours() if uid in (a, b)}
+    assert hours == {a: (8, 16), b: (9, 17)}, hours
+
+    # Setting hours must neither reset nor invent a reminder mode
+    store.set_work_hours(b, None, None, "digest")
+    assert b not in {uid for uid, *_ in store.work_hours()}
+    (creator,) = new_users(1)
+    create(store, [(creator, [a, b], "x", None, None)])
+    modes = {user: mode for user, mode, _ in store.pending_tasks_by_assignee("digest") if user in (a, b)}
+    assert modes == {a: "individual", b: "individual"}, modes
+
+
+def check_recurrence(store):
+    creator, a, b = new_users(3)
+    due = datetime(2030, 8, 5, 10, 0, tzinfo=IST)
+    (head,) = create(store, [(creator, [a, b], "standup", due, None, "FREQ=WEEKLY;BYDAY=MO")])
+    assert store.get_task(head)[8] == "FREQ=WEEKLY;BYDAY=MO"
+    assert (head, "FREQ=WEEKLY;BYDAY=MO", due, False) in store.recurring_heads()
+
+    with store.transaction() as c:
+        store.complete_pending_assignments(c, head, due, None)
+        assert store.close_task_if_done(c, head, due) == (True, "FREQ=WEEKLY;BYDAY=MO")
+        claimed = store.claim_series_head(c, head)
+        assert claimed == (creator, "standup", None, "FREQ=WEEKLY;BYDAY=MO", head, due), claimed
+        assert store.claim_series_head(c, head) is None, "a head can only be advanced once"
+        next_due = due + timedelta(days=7)
+        new_id, assignees = store.insert_occurrence(c, head, creator, "standup", due, next_due, None,
+                                                    "FREQ=WEEKLY;BYDAY=MO", head)
+    assert assignees == [a, b], assignees
+    assert store.get_task(head)[8] is None
+    heads = [r for r in store.recurring_heads() if r[0] in (head, new_id)]
+    assert heads == [(new_id, "FREQ=WEEKLY;BYDAY=MO", next_due, False)], heads
+
+    with store.transaction() as c:
+        assert store.close_task_if_done(c, new_id, due) == (False, None), "closed with pending assignments"
+
+
+def check_snooze(store):
+    creator, a = new_users(2)
+    (task_id,) = create(store, [(creator, [a], "call back", None, None)])
+    now = datetime(2030, 9, 1, 12, 0, tzinfo=IST)
+    assert store.snooze_assignment(task_id, a, now + timedelta(hours=1))
+    assert not store.snooze_assignment(task_id, creator, now), "snoozed someone else's assignment"
+
+    taken = lambda at: [r for r in store.take_expired_snoozes(at) if r[0] == task_id]
+    assert taken(now) == [], "snooze expired early"
+    assert taken(now + timedelta(hours=1)) == [(task_id, a, "call back")]
+    assert taken(now + timedelta(hours=2)) == [], "an expired snooze is returned once"
+
+    with store.transaction() as c:
+        store.complete_pending_assignments(c, task_id, now)
+    assert not store.snooze_assignment(task_id, a, now), "completed work cannot be snoozed"
+
+
+def check_escalations(store):
+    creator, a, b = new_users(3)
+    due = datetime(2030, 10, 1, 12, 0, tzinfo=IST)
+    elsewhere = timezone(timedelta(hours=-4))
+    ids = create(store, [
+        (creator, [a, b], "ship it", due, None),
+        # Same instant, stored with another offset: must still fall in the window
+        (creator, [a], "sync", due.astimezone(elsewhere), None),
+        (creator, [creator], "own", due, None),
+        (creator, [a], "later", due + timedelta(hours=2), None),
+    ])
+    assert store.snooze_assignment(ids[0], b, due + timedelta(hours=1))
+
+    def claim(tier, notify, since, until):
+        rows = store.claim_escalations(tier, notify, since, until, until)
+        return sorted(r for r in rows if r[0] in ids)
+
+    before = due - timedelta(minutes=1)
+    assert claim("due", "assignee", due - timedelta(hours=1), before) == [], "claimed before the due time"
+    got = claim("due", "assignee", before, due)
+    assert got == sorted([(ids[0], a, "ship it", None), (ids[1], a, "sync", None), (ids[2], creator, "own", None)]), got
+    assert claim("due", "assignee", before, due) == [], "a tier is claimed once"
+
+    # A released claim (its DM failed) is handed out again; the others stay claimed
+    store.release_escalations([(ids[0], a, "due")])
+    assert claim("due", "assignee", before, due) == [(ids[0], a, "ship it", None)], "released claim not retried"
+
+    # The creator hears about work that waits on others, with who it waits on
+    got = claim("creator:1h", "creator", before, due)
+    assert [(r[0], r[1], r[2]) for r in got] == [(ids[0], creator, "ship it"), (ids[1], creator, "sync")], got
+    assert sorted(got[0][3].split(",")) == sorted([a, b]), got[0]
+
+    overdue = [r for r in store.overdue_by_creator(due + timedelta(hours=3)) if r[1] in ids]
+    assert [r[1] for r in overdue] == [ids[0], ids[1], ids[3]], overdue
+
+    with store.transaction() as c:
+        store.complete_pending_assignments(c, ids[3], due)
+        store.close_task_if_done(c, ids[3], due)
+        store.delete_task(c, ids[1])
+    assert claim("due", "assignee", due, due + timedelta(hours=3)) == [], "completed work escalated"
+    assert [r[1] for r in store.overdue_by_creator(due + timedelta(hours=3)) if r[1] in ids] == [ids[0]]
+
+
+CHECKS = [
+    check_insert_and_read,
+    check_tasks_for_user,
+    check_completion,
+    check_delete,
+    check_rollback,
+    check_login_tokens,
+    check_reminders,
+    check_work_hours,
+    check_recurrence,
+    check_snooze,
+    check_escalations,
+]
+
+
+def run(store):
+    store.init_schema()
+    failures = 0
+    for check in CHECKS:
+        try:
+            check(store)
+            print(f"  ✅ {check.__name__}")
+        except Exception:
+            failures += 1
+            print(f"  ❌ {check.__name__}")
+            traceback.print_exc()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the storage conformance checks.")
+    parser.add_argument("--postgres", metavar="DSN", help="also run against this Postgres database")
+    args = parser.parse_args()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteTaskStore(os.path.join(tmp, "conformance.db"))
+        print("sqlite:")
+        failures += run(store)
+        store.close()
+
+    if args.postgres:
+        store = PostgresTaskStore(args.postgres, pool_size=4)
+        print("postgres:")
+        failures += run(store)
+        store.close()
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import json
+import zlib
+
+# orjson is optional: several times faster than json for the row dicts we emit
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps_bytes(obj):
+    """Compact JSON encoding of one object as UTF-8 bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def json_array_stream(rows, chunk_rows=200):
+    """
+    Encodes an iterable of dicts as one JSON array, yielding it in chunks of
+    `chunk_rows` rows so the response starts before the last row is read.
+    """
+    yield b"["
+    buffer = []
+    first = True
+    for row in rows:
+        buffer.append(dumps_bytes(row))
+        if len(buffer) >= chunk_rows:
+            yield (b"" if first else b",") + b",".join(buffer)
+            first = False
+            buffer = []
+    if buffer:
+        yield (b"" if first else b",") + b",".join(buffer)
+    yield b"]"
+
+
+def gzip_stream(chunks, level=6):
+    """Gzip-compresses a stream of byte chunks on the fly."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
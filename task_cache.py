@@ -0,0 +1,149 @@
+import time
+import select
+import logging
+import threading
+from collections import OrderedDict
+import psycopg2
+from config import DATABASE_URL, TASK_CACHE_MAX_USERS, TASK_CACHE_TTL_SECONDS, TASK_CACHE_MAX_BYTES, TASK_CACHE_NOTIFY
+
+INVALIDATION_CHANNEL = "task_cache_invalidate"
+
+
+class TaskListCache:
+    """
+    Bounded LRU of each user's serialized /api/tasks payload.
+
+    Entries are dropped by the write paths for exactly the creator/assignee IDs
+    they touch; the TTL is only a safety net. Every invalidation bumps the
+    user's generation, and a fill that started before it is discarded, so a
+    slow read can never re-insert data that was stale by the time it finished.
+    """
+
+    def __init__(self, max_users=1000, ttl=60, max_bytes=2_000_000):
+        self.max_users = max_users
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # uid -> (expires_at, payload bytes)
+        self._generations = {}
+        self._epoch = 0  # bumped by clear(), invalidates every in-flight fill
+        self._lock = threading.Lock()
+        self._metrics = {"hits": 0, "misses": 0, "fills": 0, "invalidations": 0, "evictions": 0, "oversize": 0}
+
+    def get(self, uid):
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(uid)
+                self._metrics["hits"] += 1
+                return entry[1]
+            if entry:
+                del self._entries[uid]
+            self._metrics["misses"] += 1
+            return None
+
+    def generation(self, uid):
+        with self._lock:
+            return self._epoch, self._generations.get(uid, 0)
+
+    def put(self, uid, payload, generation):
+        with self._lock:
+            if (self._epoch, self._generations.get(uid, 0)) != generation:
+                return  # invalidated while we were reading
+            self._entries[uid] = (time.monotonic() + self.ttl, payload)
+            self._entries.move_to_end(uid)
+            self._metrics["fills"] += 1
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+                self._metrics["evictions"] += 1
+
+    def invalidate(self, user_ids):
+        with self._lock:
+            for uid in user_ids:
+                if not uid:
+                    continue
+                self._generations[uid] = self._generations.get(uid, 0) + 1
+                if self._entries.pop(uid, None) is not None:
+                    self._metrics["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._metrics["invalidations"] += len(self._entries)
+            self._entries.clear()
+            self._generations.clear()
+
+    def read_through(self, uid, chunks):
+        """
+        Streams `chunks` (the encoded payload) to the caller while keeping a
+        copy; stores it once the stream completes if it fits in max_bytes.
+        """
+        generation = self.generation(uid)
+        kept, size = [], 0
+        for chunk in chunks:
+            if kept is not None:
+                size += len(chunk)
+                if size > self.max_bytes:
+                    kept = None
+                    with self._lock:
+                        self._metrics["oversize"] += 1
+                else:
+                    kept.append(chunk)
+            yield chunk
+        if kept is not None:
+            self.put(uid, b"".join(kept), generation)
+
+    def metrics(self):
+        with self._lock:
+            m = dict(self._metrics)
+            m["entries"] = len(self._entries)
+        lookups = m["hits"] + m["misses"]
+        m["hit_rate"] = round(m["hits"] / lookups, 4) if lookups else 0
+        return m
+
+
+task_list_cache = TaskListCache(
+    max_users=TASK_CACHE_MAX_USERS,
+    ttl=TASK_CACHE_TTL_SECONDS,
+    max_bytes=TASK_CACHE_MAX_BYTES,
+)
+
+
+# --- Cross-process invalidation ---
+# Write paths NOTIFY inside their own transaction (delivered only on commit);
+# every process LISTENs and drops the named users from its local cache.
+
+def publish_invalidation(c, user_ids):
+    """Queues a cross-process invalidation on the writer's cursor (sent at commit)."""
+    if not TASK_CACHE_NOTIFY:
+        return
+    ids = sorted({u for u in user_ids if u})
+    # NOTIFY payloads are capped at 8000 bytes
+    while ids:
+        batch, size = [], 0
+        while ids and size + len(ids[0]) + 1 < 7900:
+            size += len(ids[0]) + 1
+            batch.append(ids.pop(0))
+        c.execute("SELECT pg_notify(%s, %s)", (INVALIDATION_CHANNEL, ",".join(batch)))
+
+
+def invalidation_listener():
+    """Background thread: applies invalidations published by other processes."""
+    while True:
+        try:
+            conn = psycopg2.connect(DATABASE_URL)
+            conn.autocommit = True
+            c = conn.cursor()
+            c.execute(f"LISTEN {INVALIDATION_CHANNEL}")
+            # Anything missed while disconnected is unknown: start clean
+            task_list_cache.clear()
+
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    task_list_cache.invalidate(notify.payload.split(","))
+        except Exception:
+            logging.exception("Task cache invalidation listener error; reconnecting")
+            time.sleep(5)
@@ -0,0 +1,212 @@
+"""
+Bulk task import from CSV or NDJSON.
+
+Each row / object has:
+  text       (required) task description
+  assignees  Slack IDs, <@U..> mentions, @handles, names or emails separated
+             by ";", "," or "|" (empty -> the importing user)
+  due        optional: "YYYY-MM-DD HH:MM", "YYYY-MM-DD", "DD/MM/YYYY HH:MM" or "DD/MM/YYYY",
+             in the creator's timezone
+  file_url   optional
+
+CLI:
+  python task_import.py tasks.csv --creator U123ABC [--format ndjson] [--dry-run] [--no-notify]
+"""
+import io
+import re
+import csv
+import json
+import logging
+import argparse
+from datetime import datetime
+from collections import defaultdict
+from config import client
+from database import add_tasks_bulk, get_user_directory, emit_task_update
+from rate_limit import limiter
+from user_clock import user_clocks
+
+MAX_IMPORT_ROWS = 100000
+DUE_FORMATS = ("%Y-%m-%d %H:%M", "%Y-%m-%d", "%d/%m/%Y %H:%M", "%d/%m/%Y")
+DM_MAX_LINES = 15
+
+
+def parse_rows(data, fmt):
+    """Yields (line_number, dict) from CSV (with header) or NDJSON text."""
+    if fmt == "ndjson":
+        for line_no, line in enumerate(io.StringIO(data), start=1):
+            if not line.strip():
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError as e:
+                yield line_no, {"_error": f"invalid JSON: {e}"}
+                continue
+            yield line_no, obj if isinstance(obj, dict) else {"_error": "expected a JSON object"}
+    else:
+        reader = csv.DictReader(io.StringIO(data))
+        for line_no, row in enumerate(reader, start=2):  # line 1 is the header
+            yield line_no, {(k or "").strip().lower(): (v or "") for k, v in row.items()}
+
+
+def build_assignee_resolver():
+    """Maps IDs, mentions, @handles, names and emails to Slack user IDs via the cached directory."""
+    lookup = {}
+    for user in get_user_directory():
+        lookup[user["id"].lower()] = user["id"]
+        for key in ("name", "display_name", "handle", "email"):
+            if user.get(key):
+                lookup.setdefault(user[key].strip().lower(), user["id"])
+
+    def resolve(token):
+        token = token.strip()
+        mention = re.fullmatch(r"<@([A-Z0-9]+)(?:\|[^>]+)?>", token)
+        if mention:
+            token = mention.group(1)
+        return lookup.get(token.lstrip("@").lower())
+
+    return resolve
+
+
+def parse_due(value, tz):
+    """An aware ISO timestamp for a due cell read as local time in `tz`; None when empty."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    for fmt in DUE_FORMATS:
+        try:
+            due = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+            due = due.replace(hour=23, minute=59)
+        return tz.localize(due).isoformat()
+    raise ValueError(f"unrecognised due date '{value}'")
+
+
+def validate_rows(rows, creator):
+    """
+    Returns (tasks, errors): tasks as add_tasks_bulk tuples,
+    errors as [{"line": n, "error": "..."}].
+    """
+    resolve = build_assignee_resolver()
+    creator_tz = user_clocks.get(creator).tz
+    tasks, errors = [], []
+
+    for line_no, row in rows:
+        if len(tasks) >= MAX_IMPORT_ROWS:
+            errors.append({"line": line_no, "error": f"import is limited to {MAX_IMPORT_ROWS} tasks"})
+            break
+        if "_error" in row:
+            errors.append({"line": line_no, "error": row["_error"]})
+            continue
+
+        text = str(row.get("text") or "").strip()
+        if not text:
+            errors.append({"line": line_no, "error": "missing text"})
+            continue
+
+        raw_assignees = row.get("assignees") or ""
+        if isinstance(raw_assignees, list):
+            tokens = [str(t) for t in raw_assignees]
+        else:
+            tokens = [t for t in re.split(r"[;,|]", str(raw_assignees)) if t.strip()]
+        assignees = []
+        unknown = []
+        for token in tokens:
+            user_id = resolve(token)
+            (assignees if user_id else unknown).append(user_id or token.strip())
+        if unknown:
+            errors.append({"line": line_no, "error": f"unknown assignee(s): {', '.join(unknown)}"})
+            continue
+
+        try:
+            due = parse_due(row.get("due"), creator_tz)
+        except ValueError as e:
+            errors.append({"line": line_no, "error": str(e)})
+            continue
+
+        tasks.append((creator, assignees or [creator], text, due, (row.get("file_url") or None)))
+
+    return tasks, errors
+
+
+def notify_assignees(creator, tasks, task_ids):
+    """One summary DM per assignee instead of one DM per imported task, dues in their own timezone."""
+    per_user = defaultdict(list)
+    for task_id, (_, assignees, text, due, _) in zip(task_ids, tasks):
+        for user in dict.fromkeys(assignees):
+            if user != creator:
+                per_user[user].append((task_id, text, due))
+
+    messages = []
+    for clock, users in user_clocks.by_zone(per_user).items():
+        for user in users:
+            items = per_user[user]
+            lines = []
+            for task_id, text, due in items[:DM_MAX_LINES]:
+                due_str = (datetime.fromisoformat(due).astimezone(clock.tz).strftime("%a, %b %d at %I:%M %p")
+                           if due else "No due time")
+                lines.append(f"• *{text}* (ID: {task_id}) — {due_str}")
+            if len(items) > DM_MAX_LINES:
+                lines.append(f"…and {len(items) - DM_MAX_LINES} more. Run `/mytasks` to see everything.")
+            messages.append({
+                "channel": user,
+                "text": f"🔔 *{len(items)} New Task{'s' if len(items) != 1 else ''} Assigned!*\n"
+                        f"<@{creator}> assigned you:\n" + "\n".join(lines),
+            })
+
+    for message, e in client.post_many(messages):
+        logging.error(f"Import summary DM failed for {message['channel']}: {e}")
+
+
+def import_tasks(creator, data, fmt="csv", notify=True, dry_run=False, rate_limit=True):
+    """
+    Validates and inserts every valid row. Invalid rows are reported, not inserted.
+    With notify, the summary DMs are charged to the creator's fan-out budget
+    up front; RateLimited is raised (and nothing inserted) when it is spent,
+    OverCapacity (a ValueError) when there are more recipients than it can hold.
+    """
+    if fmt not in ("csv", "ndjson"):
+        raise ValueError("format must be 'csv' or 'ndjson'")
+
+    tasks, errors = validate_rows(parse_rows(data, fmt), creator)
+    if dry_run or not tasks:
+        return {"imported": 0, "valid": len(tasks), "errors": errors, "task_ids": []}
+
+    if notify and rate_limit:
+        recipients = {user for _, assignees, _, _, _ in tasks for user in assignees if user != creator}
+        if recipients:
+            limiter.require("fanout", creator, "import", cost=len(recipients))
+
+    task_ids = add_tasks_bulk(tasks)
+    # Too many ids to patch: the affected dashboards reload their list
+    emit_task_update({creator} | {user for _, assignees, *_ in tasks for user in assignees})
+    if notify:
+        notify_assignees(creator, tasks, task_ids)  # post_many sends in the background lane
+
+    return {"imported": len(task_ids), "valid": len(tasks), "errors": errors, "task_ids": task_ids}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import tasks from CSV or NDJSON.")
+    parser.add_argument("path", help="CSV (with header) or NDJSON file")
+    parser.add_argument("--creator", required=True, help="Slack user ID recorded as the task creator")
+    parser.add_argument("--format", choices=("csv", "ndjson"), help="defaults to the file extension")
+    parser.add_argument("--dry-run", action="store_true", help="validate only, insert nothing")
+    parser.add_argument("--no-notify", action="store_true", help="skip the assignee summary DMs")
+    args = parser.parse_args()
+
+    fmt = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    with open(args.path, encoding="utf-8-sig") as f:
+        result = import_tasks(args.creator, f.read(), fmt=fmt,
+                              notify=not args.no_notify, dry_run=args.dry_run, rate_limit=False)
+
+    for err in result["errors"]:
+        print(f"⚠️ line {err['line']}: {err['error']}")
+    verb = "Validated" if args.dry_run else "Imported"
+    print(f"✅ {verb} {result['valid'] if args.dry_run else result['imported']} tasks "
+          f"({len(result['errors'])} rows rejected)")
+
+
+if __name__ == "__main__":
+    main()
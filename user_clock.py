@@ -0,0 +1,128 @@
+"""
+Per-user timezone and working hours.
+
+The timezone is the `tz` of the user's Slack profile, read from the cached
+users.list directory (database.get_user_directory) or, for users not in it
+yet, from users.info. Working hours are the ones set with /workhours, else
+DEFAULT_WORK_START / DEFAULT_WORK_END. Both are cached, so a clock can be
+looked up per message or per reminder without touching Slack or the database.
+"""
+import time
+import logging
+import threading
+from collections import namedtuple, defaultdict
+import pytz
+from config import client, DEFAULT_TIMEZONE, DEFAULT_WORK_START, DEFAULT_WORK_END, USER_CLOCK_TTL_SECONDS
+from database import get_user_directory, get_work_hours, set_work_hours
+
+UserClock = namedtuple("UserClock", "tz work_start work_end")
+
+
+class UserClocks:
+    """user_id -> UserClock, with every source cached for `ttl` seconds."""
+
+    def __init__(self, default_tz, work_start, work_end, ttl=600):
+        self.default = UserClock(pytz.timezone(default_tz), work_start, work_end)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._directory = None  # the get_user_directory() list the zones were read from
+        self._directory_zones = {}
+        self._looked_up = {}  # user_id -> (loaded_at, tz name) for users outside the directory
+        self._hours = {}
+        self._hours_loaded_at = 0.0
+
+    def _zone(self, name):
+        if not name:
+            return self.default.tz
+        try:
+            return pytz.timezone(name)
+        except pytz.UnknownTimeZoneError:
+            return self.default.tz
+
+    def _zones_from_directory(self):
+        try:
+            directory = get_user_directory()
+        except Exception:
+            logging.exception("User directory unavailable; using cached timezones")
+            return self._directory_zones
+        with self._lock:
+            if directory is not self._directory:
+                self._directory_zones = {u["id"]: u.get("tz") for u in directory}
+                self._directory = directory
+            return self._directory_zones
+
+    def _zone_name(self, uid, directory_zones):
+        if uid in directory_zones:
+            return directory_zones[uid]
+        with self._lock:
+            entry = self._looked_up.get(uid)
+        if entry and time.time() - entry[0] < self.ttl:
+            return entry[1]
+        try:
+            name = client.users_info(user=uid)["user"].get("tz")
+        except Exception:
+            logging.warning(f"users.info failed for {uid}; using the default timezone")
+            name = None
+        with self._lock:
+            self._looked_up[uid] = (time.time(), name)
+        return name
+
+    def _work_hours(self):
+        with self._lock:
+            if time.time() - self._hours_loaded_at < self.ttl:
+                return self._hours
+        hours = get_work_hours()
+        with self._lock:
+            self._hours, self._hours_loaded_at = hours, time.time()
+        return hours
+
+    def get_many(self, uids):
+        directory_zones = self._zones_from_directory()
+        hours = self._work_hours()
+        clocks = {}
+        for uid in uids:
+            start, end = hours.get(uid, (self.default.work_start, self.default.work_end))
+            clocks[uid] = UserClock(self._zone(self._zone_name(uid, directory_zones)), start, end)
+        return clocks
+
+    def get(self, uid):
+        return self.get_many([uid])[uid]
+
+    def by_zone(self, uids):
+        """Groups users by identical clock: {UserClock: [user_id, ...]}."""
+        groups = defaultdict(list)
+        for uid, clock in self.get_many(uids).items():
+            groups[clock].append(uid)
+        return groups
+
+    def starting_work(self, now):
+        """
+        (due, known): the users whose working day starts in the hour of `now`,
+        and every user whose clock is known, both from the cached directory,
+        looked-up zones and working hours only (no Slack calls). Users
+        outside `known` have to go through get_many() to be placed.
+        """
+        directory_zones = self._zones_from_directory()
+        hours = self._work_hours()
+        with self._lock:
+            zones = {uid: name for uid, (_, name) in self._looked_up.items()}
+        zones.update(directory_zones)
+
+        starts = {}  # (zone name, work_start) -> is it that hour there now
+        due = []
+        for uid, name in zones.items():
+            start = hours.get(uid, (self.default.work_start,))[0]
+            key = (name, start)
+            if key not in starts:
+                starts[key] = now.astimezone(self._zone(name)).hour == start
+            if starts[key]:
+                due.append(uid)
+        return due, set(zones)
+
+    def set_work_hours(self, uid, start, end):
+        set_work_hours(uid, start, end)
+        with self._lock:
+            self._hours_loaded_at = 0.0  # reload on next use
+
+
+user_clocks = UserClocks(DEFAULT_TIMEZONE, DEFAULT_WORK_START, DEFAULT_WORK_END, ttl=USER_CLOCK_TTL_SECONDS)
@@ -1,13 +1,22 @@
 import os
 import logging
-import requests
 import jwt
-import time
+from datetime import datetime, timedelta
 from functools import wraps
-from flask import jsonify, send_from_directory, render_template_string, request, session, redirect, url_for
-from config import flask_app, socketio, client, SLACK_BOT_TOKEN, WEB_STYLE_PATH, WEB_DASH_PATH, DATABASE_URL, SECRET_KEY
-from database import get_tasks_for_user, delete_task_internal,get_db_connection
-from helpers import edit_task, complete_task_logic
+from itertools import chain
+from flask import Response, jsonify, send_from_directory, render_template_string, request, session, redirect, url_for
+from flask_socketio import join_room
+from config import flask_app, socketio, client, WEB_STYLE_PATH, WEB_DASH_PATH, DATABASE_URL, SECRET_KEY, ADMIN_USER_IDS
+from database import get_user_directory, iter_tasks_for_user, export_task_pages, get_archived_tasks_for_user, delete_task_internal, get_task_creator, consume_login_token, store, get_username, get_user_stats, get_stats_series, search_tasks
+from helpers import edit_task, complete_task_logic, llm_metrics
+from streaming import json_array_stream, gzip_stream
+from task_import import import_tasks
+from task_cache import task_list_cache
+from rate_limit import limiter, RateLimited
+from storage import StoreBusy
+from action_queue import action_queue
+from membership import membership_index
+from user_clock import user_clocks
 
 # --- HELPER: Decorator to require login ---
 def login_required(f):
@@ -18,6 +27,44 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# --- HELPER: Decorator for endpoints that need a Postgres-only feature ---
+def requires_feature(feature):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not store.supports(feature):
+                return jsonify({"error": f"'{feature}' is not available on this deployment."}), 501
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+# --- Admission control for every signed-in API call ---
+@flask_app.before_request
+def admit_api_request():
+    if request.path.startswith("/api/") and 'user_id' in session:
+        limiter.require("api", session['user_id'], request.endpoint)
+
+@flask_app.errorhandler(RateLimited)
+def rate_limited(e):
+    response = jsonify({"error": "Too many requests. Please slow down.", "retry_after": e.retry_after})
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response, 429
+
+@flask_app.errorhandler(StoreBusy)
+def store_busy(e):
+    response = jsonify({"error": "The server is busy. Please try again in a moment."})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+# --- Dashboard sockets ---
+# Each socket joins the room of its session user; task_update events are sent
+# only to the affected users' rooms (database.emit_task_update)
+@socketio.on("connect")
+def join_user_room(auth=None):
+    if 'user_id' not in session:
+        return False
+    join_room(session['user_id'])
+
 # --- ROUTE: Serve Styles ---
 @flask_app.route("/style/<path:filename>")
 def serve_style(filename):
@@ -36,25 +83,10 @@ def login():
         token_unique_id = data["jti"]
         user_id = data["user_id"]
 
-        # 2. Check Database (Is token valid and unused?)
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        # Optional: cleanup old tokens
-        c.execute("DELETE FROM login_tokens WHERE expires_at < %s", (time.time(),))
-
-        c.execute("SELECT * FROM login_tokens WHERE token_id = %s", (token_unique_id,))
-        row = c.fetchone()
-        
-        if not row:
-            conn.close()
+        # 2. Check and burn the token in one step (valid, unused, not expired)
+        if not consume_login_token(token_unique_id):
             return "<h3>Link Invalid or Expired</h3><p>This link has already been used. Please run <code>/mytasks</code> again.</p>"
 
-        # 3. Burn the Token (Delete it)
-        c.execute("DELETE FROM login_tokens WHERE token_id = %s", (token_unique_id,))
-        conn.commit()
-        conn.close()
-
         # 4. Set Secure Session
         session['user_id'] = user_id
         
@@ -87,24 +119,235 @@ def api_tasks(user_id):
     # Ensure the session user matches the requested user data
     if session['user_id'] != user_id:
         return jsonify({"error": "Unauthorized access to another user's data"}), 403
-    return jsonify(get_tasks_for_user(user_id))
+    # ?ids=1,2,3 returns only those tasks (dashboard patches after a task_update)
+    task_ids = None
+    if request.args.get("ids"):
+        try:
+            task_ids = [int(i) for i in request.args["ids"].split(",") if i.strip()][:500]
+        except ValueError:
+            return jsonify({"error": "ids must be comma-separated integers"}), 400
 
-# --- API: Get Slack Users (Secured) ---
-@flask_app.route("/api/slack_users")
+    if task_ids is not None:
+        # At most 500 tasks: read in one short query, nothing left to stream
+        return jsonify(list(iter_tasks_for_user(user_id, task_ids=task_ids)))
+
+    # Full list: served from the per-user cache, or streamed page by page
+    # (constant memory) while the cache keeps a copy
+    cached = task_list_cache.get(user_id)
+    if cached is not None:
+        return Response(cached, mimetype="application/json")
+    rows = iter_tasks_for_user(user_id)
+    # The first page is read before the response starts, so a busy pool is still a 503
+    first = next(rows, None)
+    rows = chain([first], rows) if first is not None else iter(())
+    chunks = task_list_cache.read_through(user_id, json_array_stream(rows))
+    return Response(chunks, mimetype="application/json")
+
+# --- API: Get Archived Tasks (Secured) ---
+@flask_app.route("/api/tasks/<user_id>/history")
 @login_required
-def get_slack_users():
-    url = "https://slack.com/api/users.list"
-    headers = {"Authorization": f"Bearer {SLACK_BOT_TOKEN}"}
-    resp = requests.get(url, headers=headers).json()
+@requires_feature("archive")
+def api_task_history(user_id):
+    if session['user_id'] != user_id:
+        return jsonify({"error": "Unauthorized access to another user's data"}), 403
+
+    try:
+        limit = min(max(int(request.args.get("limit", 200)), 1), 1000)
+        before_id = request.args.get("before_id")
+        before_id = int(before_id) if before_id else None
+    except ValueError:
+        return jsonify({"error": "Invalid pagination parameters"}), 400
+
+    return jsonify(get_archived_tasks_for_user(user_id, limit=limit, before_id=before_id))
+
+# --- API: Full-Text Search (Secured) ---
+@flask_app.route("/api/search")
+@login_required
+@requires_feature("search")
+def api_search():
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "Missing search query (?q=...)"}), 400
+
+    try:
+        limit = min(max(int(request.args.get("limit", 20)), 1), 100)
+    except ValueError:
+        return jsonify({"error": "Invalid limit"}), 400
+    include_archived = request.args.get("archived", "1") != "0"
+
+    return jsonify(search_tasks(session['user_id'], query, limit=limit, include_archived=include_archived))
+
+# --- API: Productivity Stats (Secured) ---
+@flask_app.route("/api/stats")
+@login_required
+@requires_feature("stats")
+def api_stats():
+    """
+    ?scope=me|team  (team is admin only)
+    ?bucket=day|week  ?days=30  -> time series for charts
+    """
+    user_id = session['user_id']
+    scope = request.args.get("scope", "me")
+    bucket = request.args.get("bucket", "day")
+
+    if bucket not in ("day", "week"):
+        return jsonify({"error": "bucket must be 'day' or 'week'"}), 400
+    try:
+        days = min(max(int(request.args.get("days", 30)), 1), 365)
+    except ValueError:
+        return jsonify({"error": "Invalid days"}), 400
+
+    if scope == "team":
+        if user_id not in ADMIN_USER_IDS:
+            return jsonify({"error": "Team stats are only available to admins"}), 403
+        user_ids = None
+    elif scope == "me":
+        user_ids = [user_id]
+    else:
+        return jsonify({"error": "scope must be 'me' or 'team'"}), 400
 
     users = []
-    for member in resp.get("members", []):
-        if member.get("deleted") or member.get("is_bot") or member.get("id") == "USLACKBOT":
-            continue
+    totals = {"assigned": 0, "open": 0, "completed": 0, "completed_on_time": 0, "overdue": 0}
+    completion_seconds = 0.0
+
+    for uid, assigned, open_count, completed, on_time, seconds, overdue in get_user_stats(user_ids):
         users.append({
-            "id": member["id"],
-            "name": member["profile"].get("real_name") or member.get("name")
+            "user_id": uid,
+            "name": get_username(uid),
+            "assigned": assigned,
+            "open": open_count,
+            "completed": completed,
+            "overdue": overdue,
+            "completion_rate": round(completed / assigned, 4) if assigned else 0,
+            "on_time_rate": round(on_time / completed, 4) if completed else 0,
+            "avg_hours_to_complete": round(seconds / completed / 3600, 2) if completed else None,
         })
+        totals["assigned"] += assigned
+        totals["open"] += open_count
+        totals["completed"] += completed
+        totals["completed_on_time"] += on_time
+        totals["overdue"] += overdue
+        completion_seconds += seconds
+
+    totals["completion_rate"] = round(totals["completed"] / totals["assigned"], 4) if totals["assigned"] else 0
+    totals["avg_hours_to_complete"] = (
+        round(completion_seconds / totals["completed"] / 3600, 2) if totals["completed"] else None
+    )
+
+    series = [
+        {"bucket": b.isoformat(), "assigned": int(a or 0), "completed": int(d or 0)}
+        for b, a, d in get_stats_series(user_ids, days=days, bucket=bucket)
+    ]
+
+    return jsonify({"users": users, "totals": totals, "series": series})
+
+# --- API: Bulk Import (Secured) ---
+@flask_app.route("/api/import", methods=["POST"])
+@login_required
+def api_import():
+    """
+    Upload a CSV or NDJSON file (multipart field "file") or send it as the raw body.
+    ?format=csv|ndjson (defaults to the file extension)  ?dry_run=1  ?notify=0
+    """
+    user_id = session['user_id']
+    upload = request.files.get("file")
+    if upload:
+        data = upload.read().decode("utf-8-sig")
+        filename = upload.filename or ""
+    else:
+        data = request.get_data(as_text=True)
+        filename = ""
+
+    if not data.strip():
+        return jsonify({"success": False, "error": "Empty import"}), 400
+
+    fmt = request.args.get("format") or ("ndjson" if filename.endswith((".ndjson", ".jsonl")) else "csv")
+    try:
+        result = import_tasks(
+            user_id,
+            data,
+            fmt=fmt,
+            notify=request.args.get("notify", "1") != "0",
+            dry_run=request.args.get("dry_run") == "1",
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    return jsonify({"success": True, **result})
+
+# --- API: Export Task History (Secured) ---
+@flask_app.route("/api/export")
+@login_required
+@requires_feature("export")
+def api_export():
+    """
+    ?format=csv|ndjson  ?scope=me|team (team is admin only)
+    ?from=YYYY-MM-DD&to=YYYY-MM-DD (created date in the user's timezone, inclusive)
+    ?status=all|pending|done  ?archived=1|0  ?gzip=1
+    """
+    user_id = session['user_id']
+    fmt = request.args.get("format", "csv")
+    scope = request.args.get("scope", "me")
+    status = request.args.get("status", "all")
+
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({"error": "format must be 'csv' or 'ndjson'"}), 400
+    if status not in ("all", "pending", "done"):
+        return jsonify({"error": "status must be 'all', 'pending' or 'done'"}), 400
+    if scope == "team":
+        if user_id not in ADMIN_USER_IDS:
+            return jsonify({"error": "Team export is only available to admins"}), 403
+        export_uid = None
+    elif scope == "me":
+        export_uid = user_id
+    else:
+        return jsonify({"error": "scope must be 'me' or 'team'"}), 400
+
+    # Dates are days in the exporting user's timezone, and so are the exported timestamps
+    tz = user_clocks.get(user_id).tz
+    try:
+        date_from = tz.localize(datetime.strptime(request.args["from"], "%Y-%m-%d")) if request.args.get("from") else None
+        date_to = (tz.localize(datetime.strptime(request.args["to"], "%Y-%m-%d") + timedelta(days=1))
+                   if request.args.get("to") else None)
+    except ValueError:
+        return jsonify({"error": "Dates must be YYYY-MM-DD"}), 400
+
+    chunks = export_task_pages(
+        export_uid,
+        fmt=fmt,
+        date_from=date_from,
+        date_to=date_to,
+        status=None if status == "all" else status,
+        include_archived=request.args.get("archived", "1") != "0",
+        timezone=tz.zone,
+    )
+
+    filename = f"tasks_{scope}_{datetime.now().strftime('%Y%m%d')}.{fmt}"
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    if request.args.get("gzip") == "1":
+        # Served as a .gz file (not Content-Encoding) so clients keep it compressed
+        chunks = gzip_stream(chunks)
+        filename += ".gz"
+        mimetype = "application/gzip"
+
+    return Response(chunks, mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+# --- API: Runtime Metrics (Admins) ---
+@flask_app.route("/api/metrics")
+@login_required
+def api_metrics():
+    if session['user_id'] not in ADMIN_USER_IDS:
+        return jsonify({"error": "Metrics are only available to admins"}), 403
+    return jsonify({"llm": llm_metrics(), "task_cache": task_list_cache.metrics(),
+                    "rate_limits": limiter.metrics(), "slack": client.metrics(),
+                    "slack_actions": action_queue.metrics(), "membership": membership_index.metrics()})
+
+# --- API: Get Slack Users (Secured) ---
+@flask_app.route("/api/slack_users")
+@login_required
+def get_slack_users():
+    users = [{"id": u["id"], "name": u["name"]} for u in get_user_directory()]
     return jsonify(users)
 
 # --- API: Edit Task (Secured) ---
@@ -169,11 +412,7 @@ def api_delete_task():
     except ValueError:
         return jsonify({"success": False, "error": "Invalid task_id"}), 400
 
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT user_id, text FROM tasks WHERE id=%s", (task_id,))
-    row = c.fetchone()
-    conn.close()
+    row = get_task_creator(task_id)
 
     if not row:
         return jsonify({"success": False, "error": "Task not found"}), 404
@@ -187,7 +426,6 @@ def api_delete_task():
     try:
         deleted = delete_task_internal(task_id, user_id, client, logger)
         if deleted:
-            socketio.emit("task_update", {})
             return jsonify({"success": True})
         else:
             return jsonify({"success": False, "error": "Internal deletion logic failed"}), 500